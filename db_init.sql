@@ -1,6 +1,33 @@
 CREATE TABLE battles (
     id INT AUTO_INCREMENT PRIMARY KEY,
     winner VARCHAR(255) NOT NULL,
+    -- Battles are replayed from the seed, the pokemon and the data version, the log is only kept by older battles
+    pokemon1 VARCHAR(64),
+    pokemon2 VARCHAR(64),
+    seed BIGINT UNSIGNED,
+    data_version CHAR(16),
+    -- Turn events packed by battle_events.encode_events, a few bytes per turn
+    events VARBINARY(255),
+    remaining_hp1 SMALLINT,
+    remaining_hp2 SMALLINT,
     battle_log JSON,
     battle_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+-- Support the filters of /show_previous_battles, the primary key serves the pages by id
+CREATE INDEX battles_winner ON battles (winner, id);
+CREATE INDEX battles_battle_date ON battles (battle_date, id);
+
+-- Results of each species, updated with every battle written, see species_stats.py to rebuild it
+CREATE TABLE species_stats (
+    species VARCHAR(64) PRIMARY KEY,
+    battles INT NOT NULL DEFAULT 0,
+    wins INT NOT NULL DEFAULT 0,
+    losses INT NOT NULL DEFAULT 0,
+    draws INT NOT NULL DEFAULT 0,
+    remaining_hp_total BIGINT NOT NULL DEFAULT 0,
+    remaining_hp_count INT NOT NULL DEFAULT 0
+);
+
+-- Serves /leaderboard in wins order without sorting
+CREATE INDEX species_stats_wins ON species_stats (wins, species);
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""Async Pokemon Battle Server
+
+This module serves the battle and history routes from a single asyncio event loop with aiohttp
+While a battle waits for PokeAPI or the database the worker serves other requests, so one worker holds hundreds
+of battles in flight instead of one per thread. Pokemon are loaded by async_pokemon.py and battles are read and
+written by async_database.py, the battles themselves are simulated by the same code as battle.py
+Responses keep the json contract and the status codes of battle.py
+
+    python async_battle.py
+
+Functions:
+    create_app: creates the async application
+    battle: routes localhost:5000/battle
+    show_previous_battles: routes localhost:5000/show_previous_battles
+    ready: routes localhost:5000/ready
+    metrics: routes localhost:5000/metrics
+    json_response: returns a json response serialized like flask does
+    store_battle: queues a battle to be written
+"""
+
+import asyncio
+import random
+import time
+from aiohttp import web
+import config
+import metrics as app_metrics
+from async_database import AsyncBattleWriter, create_database
+from async_pokemon import AsyncPokeAPIClient, AsyncSpeciesLoader
+from battle import app as flask_app
+from battle import (
+    battle_result, battle_row, battle_values, battles_query, create_combatants, parse_date, parse_int,
+    parse_log_format, parse_seed, simulate_battle,
+)
+from metrics import PHASE_SECONDS, REQUEST_SECONDS
+from pokeapi_client import endpoint_counters
+from pokemon import connection_error, data_version, http_error
+from warmup import Warmup
+
+DATABASE = web.AppKey('database', object)
+LOADER = web.AppKey('loader', AsyncSpeciesLoader)
+WRITER = web.AppKey('writer', AsyncBattleWriter)
+WARMUP = web.AppKey('warmup', Warmup)
+
+def create_app(database=None, warm_names=None, warm_up=True):
+    """Creates the async application, its services start with the application
+
+    Args:
+        database (AsyncDatabase): the battles database, the aiomysql pool configured in config.py when None
+        warm_names (list<str>): names of the pokemon warmed up at start, see warmup.warm_species_names when None
+        warm_up (bool): whether the warm-up starts with the application, without it the caches start empty
+
+    Returns:
+        web.Application: the application
+    """
+
+    application = web.Application(middlewares=[record_latency])
+    application[DATABASE] = database
+    application[LOADER] = AsyncSpeciesLoader(AsyncPokeAPIClient(
+        pool_size=config.HTTP_POOL_SIZE,
+        retries=config.HTTP_RETRIES,
+        backoff=config.HTTP_RETRY_BACKOFF,
+        timeout=config.HTTP_TIMEOUT,
+        cache_size=config.HTTP_CACHE_SIZE,
+        counters=endpoint_counters,
+    ))
+    application[WARMUP] = Warmup(warm_names)
+    application.router.add_get('/battle', battle)
+    application.router.add_get('/show_previous_battles', show_previous_battles)
+    application.router.add_get('/ready', ready)
+    application.router.add_get('/metrics', metrics)
+    application.on_startup.append(start_services)
+    if warm_up:
+        application.on_startup.append(start_warmup)
+    application.on_cleanup.append(stop_services)
+    return application
+
+async def start_services(application):
+    """Opens the database and starts the battle writer"""
+
+    if application[DATABASE] is None:
+        application[DATABASE] = await create_database()
+    application[WRITER] = AsyncBattleWriter(
+        application[DATABASE],
+        max_queue=config.BATTLE_WRITER_QUEUE_SIZE,
+        batch_size=config.BATTLE_WRITER_BATCH_SIZE,
+        flush_interval=config.BATTLE_WRITER_FLUSH_INTERVAL,
+        retries=config.BATTLE_WRITER_RETRIES,
+        retry_backoff=config.BATTLE_WRITER_RETRY_BACKOFF,
+    ).start()
+
+    # The warm-up thread loads the pokemon on the event loop, into the cache the requests use
+    loop = asyncio.get_running_loop()
+    loader = application[LOADER]
+    application[WARMUP].load = lambda name: asyncio.run_coroutine_threadsafe(loader.get_species(name), loop).result()
+
+async def start_warmup(application):
+    """Starts the warm-up of the caches"""
+    application[WARMUP].start()
+
+async def stop_services(application):
+    """Writes the queued battles and closes the connections"""
+
+    await application[WRITER].close()
+    await application[LOADER].client.close()
+    await application[DATABASE].close()
+
+@web.middleware
+async def record_latency(request, handler):
+    start = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        # Streamed responses are timed until their last byte
+        resource = request.match_info.route.resource
+        if resource is not None:
+            REQUEST_SECONDS.labels(resource.canonical).observe(time.perf_counter() - start)
+
+async def battle(request):
+    """Simulates the battle between two pokemon, see battle.battle
+
+    routes localhost:5000/battle?<pokemon1>&<pokemon2>&<seed>&<format>
+
+    Responses:
+        200: Returns a json with the battle logs, the winner, the seed and the data version
+        400: Returns a json with bad request
+        404: Return a json being unable to find the pokemon in pokeapi
+    """
+
+    try:
+        pokemon1_name = request.query.get('pokemon1')
+        pokemon2_name = request.query.get('pokemon2')
+        if not pokemon1_name or not pokemon2_name:
+            raise ValueError("/battle requires two pokemon names")
+
+        seed = parse_seed(request.query.get('seed'))
+        log_format = parse_log_format(request.query.get('format'))
+
+        # Both pokemon are loaded at the same time, the error of the first one is reported like in battle.py
+        loader = request.app[LOADER]
+        results = await asyncio.gather(
+            loader.get_species(pokemon1_name), loader.get_species(pokemon2_name), return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        species1, species2 = results
+        pokemon1, pokemon2 = create_combatants(species1, species2, species1.name == species2.name)
+
+    except ValueError as e:
+        return json_response({"Error": str(e)}, 400)
+    except (connection_error, http_error) as e:
+        return json_response({"Error": str(e)}, 404)
+
+    version = data_version(species1, species2)
+    winner, events = simulate_battle(pokemon1, pokemon2, random.Random(seed))
+
+    await store_battle(request.app, battle_values(winner, pokemon1_name, pokemon2_name, seed, version, events, pokemon1, pokemon2))
+
+    result = battle_result(pokemon1, pokemon2, winner, events, log_format)
+    result.update({"seed": seed, "data_version": version})
+    return json_response(result)
+
+async def show_previous_battles(request):
+    """Shows previous battles, a page at a time, see battle.show_previous_battles
+
+    routes localhost:5000/show_previous_battles?<after_id>&<limit>&<winner>&<since>&<until>&<format>
+
+    Returns:
+        json: A json with a page of the database logs, or one json per line with format=ndjson
+    """
+
+    database = request.app[DATABASE]
+    try:
+        stream = request.query.get('format', 'json') == 'ndjson'
+        limit = parse_int('limit', request.query.get('limit'), None if stream else config.BATTLES_PAGE_SIZE)
+        if limit is not None and not 0 < limit <= config.BATTLES_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {config.BATTLES_MAX_PAGE_SIZE}")
+        query, parameters = battles_query(
+            database.placeholder,
+            after_id=parse_int('after_id', request.query.get('after_id'), 0),
+            limit=limit,
+            winner=request.query.get('winner'),
+            since=parse_date(request.query.get('since')),
+            until=parse_date(request.query.get('until')),
+        )
+
+    except ValueError as e:
+        return json_response({"Error": str(e)}, 400)
+
+    if stream:
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        batches = database.stream(query, parameters, config.BATTLES_STREAM_BATCH_SIZE)
+        try:
+            async for rows in batches:
+                await response.write(''.join(flask_app.json.dumps(battle_row(row)) + '\n' for row in rows).encode())
+        finally:
+            # A client leaving mid-stream makes write raise, the connection is released now rather than by the gc
+            await batches.aclose()
+        await response.write_eof()
+        return response
+
+    try:
+        data = await database.fetch_all(query, parameters)
+        headers = {'X-Next-After-Id': str(data[-1][0])} if len(data) == limit else None
+        return json_response([battle_row(row) for row in data], headers=headers)
+
+    except Exception as e:
+        return web.Response(text=f"An error occurred: {str(e)}", content_type='text/html')
+
+async def ready(request):
+    """Tells whether this worker finished warming up its caches, see battle.ready
+
+    routes localhost:5000/ready
+    """
+
+    status = request.app[WARMUP].status()
+    return json_response(status, 200 if status['ready'] else 503)
+
+async def metrics(request):
+    """Shows the metrics of this process in the Prometheus text format
+
+    routes localhost:5000/metrics
+    """
+
+    return web.Response(body=app_metrics.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+def json_response(value, status=200, headers=None):
+    """Returns a json response serialized like flask does, so both servers answer the same bytes
+
+    Args:
+        value (object): the json value
+        status (int): the status code
+        headers (dict): extra headers
+
+    Returns:
+        web.Response: the response
+    """
+
+    body = flask_app.json.dumps(value, separators=(',', ':')) + '\n'
+    return web.Response(text=body, status=status, content_type='application/json', headers=headers)
+
+async def store_battle(application, row):
+    """Queues a battle to be written by the battle writer, the request does not wait for the database
+
+    Args:
+        application (web.Application): the application
+        row (tuple): the values of the battle, see battle.battle_values
+    """
+
+    start = time.perf_counter()
+    try:
+        await application[WRITER].submit(row)
+
+    except Exception as e:
+        raise ValueError("Could not store in database") from e
+    finally:
+        PHASE_SECONDS.labels('store_battle').observe(time.perf_counter() - start)
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host='0.0.0.0', port=5000)
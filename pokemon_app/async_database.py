@@ -0,0 +1,287 @@
+"""Async battle database
+
+This module gives the async server non-blocking access to the battles database
+MySQL is reached through a pool of aiomysql connections, databases without an async driver (SQLite in the tests and
+the benchmark) run their queries in the default thread pool. Both take the statements of database.py,
+so the sync and async servers write the same rows
+Battles are queued and written in batches by a background task, like database.BattleLogWriter does with a thread
+
+Classes:
+    AsyncDatabase: A pool of aiomysql connections to the battles database
+    ThreadedDatabase: A blocking database used from the event loop through the default thread pool
+    AsyncBattleWriter: A background task storing queued battles in batches
+
+Functions:
+    create_database: opens the aiomysql pool configured in config.py
+"""
+
+import asyncio
+import logging
+import time
+import aiomysql
+import config
+from database import record_battles_statements
+from metrics import BATTLES_DROPPED, DB_CONNECTION_SECONDS, PHASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class AsyncDatabase:
+    """A pool of aiomysql connections to the battles database
+
+    The connections are in autocommit mode, so a connection only read from goes back to the pool without a transaction
+    left open, the pool would close it otherwise
+
+    Args:
+        pool (aiomysql.Pool): the pool of autocommit connections
+
+    Functions:
+        fetch_all(str, list) -> list<tuple>
+        stream(str, list, int) -> async iterator of list<tuple>
+        execute(list<tuple>)
+        close()
+    """
+
+    placeholder = '%s'
+    dialect = 'mysql'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def _acquire(self):
+        start = time.perf_counter()
+        conn = await self.pool.acquire()
+        DB_CONNECTION_SECONDS.observe(time.perf_counter() - start)
+        return conn
+
+    async def fetch_all(self, query, parameters):
+        """Runs a query and returns every row it selects"""
+
+        conn = await self._acquire()
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(query, parameters)
+                return await cursor.fetchall()
+        finally:
+            self.pool.release(conn)
+
+    async def stream(self, query, parameters, batch_size):
+        """Runs a query and yields the rows it selects a batch at a time, from a server side cursor
+
+        The connection is released when the iteration ends or the iterator is closed with aclose
+        """
+
+        conn = await self._acquire()
+        try:
+            async with conn.cursor(aiomysql.SSCursor) as cursor:
+                await cursor.execute(query, parameters)
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+        finally:
+            self.pool.release(conn)
+
+    async def execute(self, statements):
+        """Runs statements in a single transaction and commits them
+
+        Args:
+            statements (list<tuple>): the statements and their parameters
+        """
+
+        conn = await self._acquire()
+        try:
+            await conn.begin()
+            async with conn.cursor() as cursor:
+                for statement in statements:
+                    await cursor.execute(*statement)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+
+    async def close(self):
+        """Closes every connection of the pool"""
+
+        self.pool.close()
+        await self.pool.wait_closed()
+
+class ThreadedDatabase:
+    """A blocking database used from the event loop through the default thread pool
+
+    Args:
+        database (database.Database): the blocking database
+
+    Functions:
+        fetch_all(str, list) -> list<tuple>
+        stream(str, list, int) -> async iterator of list<tuple>
+        execute(list<tuple>)
+        close()
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.placeholder = database.placeholder
+        self.dialect = database.dialect
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _fetch_all(self, query, parameters):
+        with self.database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, parameters)
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+
+    async def fetch_all(self, query, parameters):
+        """Runs a query and returns every row it selects"""
+        return await self._run(self._fetch_all, query, parameters)
+
+    async def stream(self, query, parameters, batch_size):
+        """Runs a query and yields the rows it selects a batch at a time"""
+
+        rows = await self.fetch_all(query, parameters)
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    def _execute(self, statements):
+        with self.database.connection() as conn:
+            cursor = conn.cursor()
+            for statement in statements:
+                cursor.execute(*statement)
+            cursor.close()
+            conn.commit()
+
+    async def execute(self, statements):
+        """Runs statements in a single transaction and commits them"""
+        await self._run(self._execute, statements)
+
+    async def close(self):
+        """Nothing to close, the blocking database closes its connections after each use"""
+
+class AsyncBattleWriter:
+    """A background task storing queued battles in batches
+
+    Battles are written when batch_size of them are queued or flush_interval seconds after the first one was queued,
+    together with the results of their species
+    The queue is bounded, when it is full submit waits for room and fails after put_timeout seconds
+    Batches that can not be written are retried and dropped like in database.BattleLogWriter
+
+    Atribues:
+        database(AsyncDatabase): the database battles are written to
+        batch_size(int): maximum number of battles written by one insert
+        flush_interval(float): maximum seconds a battle waits in the queue
+        put_timeout(float): maximum seconds submit waits for room in the queue
+        retries(int): number of times a batch is retried
+        retry_backoff(float): seconds waited before the first retry, doubled on every retry
+
+    Functions:
+        start() -> AsyncBattleWriter
+        submit(tuple)
+        close()
+    """
+
+    _STOP = object()
+
+    def __init__(self, database, max_queue=10000, batch_size=100, flush_interval=1.0, put_timeout=5.0, retries=5, retry_backoff=0.5):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+
+    def start(self):
+        """Starts the writer task on the running event loop"""
+
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def submit(self, row):
+        """Queues a battle to be written
+
+        Args:
+            row (tuple): values of database.BATTLE_COLUMNS for the battle
+
+        Raises:
+            asyncio.TimeoutError: when the queue stays full for put_timeout seconds
+        """
+
+        await asyncio.wait_for(self._queue.put(row), self.put_timeout)
+
+    async def close(self):
+        """Writes the queued battles and stops the writer task"""
+
+        if self._task is None:
+            return
+        await self._queue.put(self._STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is self._STOP:
+                break
+
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is self._STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                await self._write(batch)
+                return
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("Could not store %d battles in database, they are dropped", len(batch))
+                    BATTLES_DROPPED.inc(len(batch))
+                    return
+                logger.warning("Could not store %d battles in database, retrying", len(batch), exc_info=True)
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            await self.database.execute(record_battles_statements(self.database, batch))
+        finally:
+            PHASE_SECONDS.labels('db_write').observe(time.perf_counter() - start)
+
+async def create_database():
+    """Opens the aiomysql pool configured in config.py
+
+    Returns:
+        AsyncDatabase: the database with a pool of aiomysql connections
+    """
+
+    pool = await aiomysql.create_pool(
+        host=config.MYSQL_HOST,
+        user=config.MYSQL_USER,
+        password=config.MYSQL_PASSWORD,
+        db=config.MYSQL_DB,
+        maxsize=config.DB_POOL_SIZE,
+        autocommit=True,
+    )
+    return AsyncDatabase(pool)
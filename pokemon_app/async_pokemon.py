@@ -0,0 +1,309 @@
+"""Async pokemon loading
+
+This module loads pokemon species for the async server without blocking its event loop
+PokeAPI is called through a non-blocking aiohttp client keeping connections alive, with the retries and the ETag and
+Last-Modified revalidation of the sync client, its requests go to the same per-endpoint counters
+Species and moves are coalesced like in the sync path: concurrent requests of a name wait for a single load,
+the moves of a new pokemon are fetched concurrently and go to the same process wide move index, through moves.find_move and
+moves.index_move
+Types need no request, they come from the in memory type chart
+
+The name index, the persistent species cache and the data pack are read in the default thread pool,
+they are local and only the first name index load calls PokeAPI
+
+Classes:
+    AsyncPokeAPIClient: A non-blocking pooled http client for PokeAPI
+    AsyncSpeciesLoader: Loads and caches species without blocking the event loop
+"""
+
+import asyncio
+import random
+import time
+from collections import OrderedDict
+import aiohttp
+import config
+import moves
+from datapack import get_data_pack
+from metrics import CACHE_LOOKUPS, PHASE_SECONDS
+from pokeapi_client import RETRY_STATUS, EndpointCounters, ResponseCache, endpoint_name
+from pokemon import (
+    STRUGGLE, Species, connection_error, http_error, load_species, not_found_message,
+    parse_types_and_stats, species_not_found,
+)
+from species_cache import get_species_cache
+from species_names import get_name_index, negative_cache
+
+class AsyncPokeAPIClient:
+    """A non-blocking pooled http client for PokeAPI
+
+    Args:
+        pool_size (int): maximum number of connections open at the same time
+        retries (int): number of times a failed request is retried
+        backoff (float): seconds waited before the first retry, doubled on every retry and randomly jittered
+        timeout (float): seconds before a request times out
+        cache_size (int): maximum number of responses kept for revalidation
+        counters (EndpointCounters): the counters of the requests, counters of the client alone when None
+
+    Functions:
+        get_json(str) -> dict
+        stats() -> dict
+        close()
+    """
+
+    def __init__(self, pool_size=20, retries=3, backoff=0.2, timeout=10.0, cache_size=5000, counters=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_size)
+        self.counters = counters if counters is not None else EndpointCounters()
+        # The session is bound to the running event loop, it is opened by the first request
+        self._session = None
+
+    async def get_json(self, url):
+        """Fetches the json data of an url, retrying connection errors and transient statuses
+
+        Args:
+            url (str): the url to fetch
+
+        Raises:
+            aiohttp.ClientResponseError: when PokeAPI answers with an error
+            aiohttp.ClientError: when PokeAPI can not be reached
+            asyncio.TimeoutError: when PokeAPI does not answer in time
+
+        Returns:
+            dict: the json data of the response
+        """
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size), timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        endpoint = endpoint_name(url)
+        cached = self.cache.get(url)
+        headers = cached[0] if cached is not None else {}
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                async with self._session.get(url, headers=headers) as response:
+                    body = await response.read()
+                    self.counters.count(endpoint, requests=1, bytes=len(body))
+                    if response.status == 304 and cached is not None:
+                        self.counters.count(endpoint, cache_hits=1)
+                        self.cache.revalidated(url)
+                        return cached[1]
+                    if response.status not in RETRY_STATUS or last_attempt:
+                        response.raise_for_status()
+                        data = await response.json(content_type=None)
+                        self.cache.put(url, response.headers, data)
+                        return data
+                    self.counters.count(endpoint, errors=1)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.counters.count(endpoint, requests=1, errors=1)
+                if last_attempt:
+                    raise
+
+            self.counters.count(endpoint, retries=1)
+            # Exponential backoff with full jitter
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def stats(self):
+        """Returns the counters of each endpoint, see pokeapi_client.EndpointCounters.stats
+
+        Returns:
+            dict: dict with endpoint names as keys and dicts with the requests, cache hits, retries, errors and bytes as values
+        """
+
+        return self.counters.stats()
+
+    async def close(self):
+        """Closes the connections"""
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+class AsyncSpeciesLoader:
+    """Loads and caches species without blocking the event loop
+
+    Species are kept in memory, the least recently used ones are dropped past cache_size
+    Unknown names are rejected with the shared name index and negative cache before calling PokeAPI
+
+    Atribues:
+        client(AsyncPokeAPIClient): the client calling PokeAPI
+        cache_size(int): maximum number of species kept in memory
+
+    Functions:
+        get_species(str) -> Species
+        load_species(str) -> Species
+        resolve_moves(list<tuple>, int) -> dict
+    """
+
+    def __init__(self, client, cache_size=None):
+        self.client = client
+        self.cache_size = cache_size or config.SPECIES_MEMORY_CACHE_SIZE
+        self._species = OrderedDict()
+        # Loads in flight, concurrent requests of the same name or move wait for the same task
+        self._species_tasks = {}
+        self._move_tasks = {}
+
+    async def get_species(self, name):
+        """Returns the species of a pokemon name, loading it the first time it is requested
+
+        Args:
+            name (str): name of the pokemon
+
+        Raises:
+            connection_error: when PokeAPI can not be reached
+            species_not_found: when the pokemon does not exist
+            http_error: when PokeAPI returns an error
+
+        Returns:
+            Species: the shared species of the pokemon
+        """
+
+        # Names are matched without case like pokemon.get_species does
+        name = name.lower()
+        species = self._species.get(name)
+        if species is not None:
+            self._species.move_to_end(name)
+            return species
+
+        message = negative_cache.get(name)
+        if message is not None:
+            CACHE_LOOKUPS.labels('negative_names', 'hit').inc()
+            raise species_not_found(message)
+        name_index = await asyncio.get_running_loop().run_in_executor(None, get_name_index)
+        if name_index is not None and name_index.rejects(name):
+            message = not_found_message(name)
+            negative_cache.add(name, message)
+            raise species_not_found(message)
+
+        task = self._species_tasks.get(name)
+        if task is None:
+            task = self._species_tasks[name] = asyncio.ensure_future(self.load_species(name))
+            task.add_done_callback(lambda task: _forget(self._species_tasks, name, task))
+        try:
+            # A request giving up does not cancel the load the others wait for
+            species = await asyncio.shield(task)
+        except species_not_found as e:
+            negative_cache.add(name, str(e))
+            raise
+
+        self._species[name] = species
+        if len(self._species) > self.cache_size:
+            self._species.popitem(last=False)
+        return species
+
+    async def load_species(self, name):
+        """Loads the species of a pokemon name from the data pack, the persistent cache or PokeAPI
+
+        Args:
+            name (str): name of the pokemon
+
+        Returns:
+            Species: the species of the pokemon
+        """
+
+        loop = asyncio.get_running_loop()
+        if get_data_pack() is not None:
+            return await loop.run_in_executor(None, load_species, name)
+
+        species_cache = get_species_cache()
+        cached = await loop.run_in_executor(None, species_cache.get, name) if species_cache else None
+        if cached is not None:
+            CACHE_LOOKUPS.labels('species_disk', 'hit').inc()
+            return Species(name, cached['types'], cached['stats'], cached['moves'])
+
+        if species_cache:
+            CACHE_LOOKUPS.labels('species_disk', 'miss').inc()
+        data = await self._fetch_data(name)
+        types, stats = parse_types_and_stats(data)
+
+        start = time.perf_counter()
+        try:
+            species_moves = await self.resolve_moves([(move['move']['name'], move['move']['url']) for move in data['moves']])
+        except aiohttp.ClientResponseError as e:
+            raise http_error(f'HTTP error when searching for pokemon moves: {e}') from e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise connection_error(f'Connection error when searching for pokemon moves: {e}') from e
+        PHASE_SECONDS.labels('parse_moves').observe(time.perf_counter() - start)
+        if not species_moves:
+            species_moves = {'struggle': STRUGGLE}
+
+        if species_cache:
+            value = {'types': types, 'stats': stats, 'moves': species_moves}
+            await loop.run_in_executor(None, species_cache.put, name, value)
+        return Species(name, types, stats, species_moves)
+
+    async def _fetch_data(self, name):
+        """Fetches the PokeAPI data of a pokemon, raising the errors of Pokemon.fetch_data"""
+
+        start = time.perf_counter()
+        try:
+            return await self.client.get_json(f"{config.POKEAPI_URL}/pokemon/{name.lower()}")
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                raise species_not_found(not_found_message(name)) from e
+            raise http_error(f'Pokemon {name} was not found. Probably the name is written incorectly') from e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise connection_error(f'Connection error when requesting data for pokemon {name}: {e}') from e
+        finally:
+            PHASE_SECONDS.labels('fetch_data').observe(time.perf_counter() - start)
+
+    async def resolve_moves(self, move_refs, limit=4):
+        """Finds the first moves with attacking power in the listed order of the moves, like moves.resolve_moves
+
+        Missing moves are fetched concurrently, at most MOVE_FETCH_WORKERS at a time,
+        the fetches not needed once the first limit moves with power are known are cancelled
+
+        Args:
+            move_refs (list<tuple>): list with the (name, url) of every move in the listed order
+            limit (int): maximum number of moves to return
+
+        Returns:
+            dict: dict with up to limit move names and their info
+        """
+
+        slots = asyncio.Semaphore(max(1, config.MOVE_FETCH_WORKERS))
+
+        async def fetch(name, url):
+            async with slots:
+                return await self._get_move(name, url)
+
+        picker = moves.MovePicker(limit)
+        pending = {name: asyncio.ensure_future(fetch(name, url)) for name, url in moves.missing_moves(move_refs)}
+        try:
+            for name, _ in move_refs:
+                if picker.add(name, await pending[name] if name in pending else moves.find_move(name)):
+                    break
+        finally:
+            for task in pending.values():
+                task.cancel()
+        return picker.moves()
+
+    async def _get_move(self, name, url):
+        """Returns a move from the shared move index, fetching it once if it is missing"""
+
+        move = moves.find_move(name)
+        if move is not None:
+            CACHE_LOOKUPS.labels('moves', 'hit').inc()
+            return move
+        CACHE_LOOKUPS.labels('moves', 'miss').inc()
+
+        task = self._move_tasks.get(name)
+        if task is None:
+            task = self._move_tasks[name] = asyncio.ensure_future(self._fetch_move(name, url))
+            task.add_done_callback(lambda task: _forget(self._move_tasks, name, task))
+        return await asyncio.shield(task)
+
+    async def _fetch_move(self, name, url):
+        return moves.index_move(name, moves.move_info(await self.client.get_json(url)))
+
+def _forget(tasks, name, task):
+    """Removes a finished load from the loads in flight, its error was raised to the requests waiting for it"""
+
+    if tasks.get(name) is task:
+        del tasks[name]
+    if not task.cancelled():
+        task.exception()
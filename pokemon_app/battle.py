@@ -2,39 +2,88 @@
 
 This module simulates a battle between two pokenon, given their names
 It uses flask to create a local server and routes localhost:5000/battle and localhost:5000/show_previous_battles
-It save all battle logs to a mysql database
+It save all battles to a mysql database, through a pool of connections and a background writer
+Each battle runs from its own random seed and is stored as its seed, pokemon, data version and packed turn events,
+the battle log is regenerated on demand by localhost:5000/battle/<id>/replay
+Battles produce structured turn events, rendered as sentences or as json objects only in the responses
+The latency of each route and phase, the cache hits and the PokeAPI calls are exposed at localhost:5000/metrics
+The caches are warmed up in the background at start, localhost:5000/ready tells when they are
 
 Functions:
     battle: routes localhost:5000/battle
-    show_previous_battles
+    battles: routes localhost:5000/battles
+    replay_battle: routes localhost:5000/battle/<id>/replay
+    leaderboard: routes localhost:5000/leaderboard
+    species_stats: routes localhost:5000/stats/<pokemon>
+    species_stats_result: returns the json stats of a species
+    battle_odds: routes localhost:5000/battle/odds
+    tournament: routes localhost:5000/tournament
+    show_previous_battles: routes localhost:5000/show_previous_battles
+    metrics: routes localhost:5000/metrics
+    ready: routes localhost:5000/ready
+    battles_query: builds the query of a page of battles
+    stream_battles: streams battles from a server side cursor
+    parse_date: parses an ISO 8601 date
+    parse_int: parses an integer request parameter
+    parse_seed: parses the random seed of a battle
+    parse_log_format: parses the requested format of the battle log
+    battle_row: converts a stored battle to json values
+    create_combatants: creates the combatants of a battle
+    simulate_battle: simulates a battle between two combatants
+    battle_result: returns the json result of a battle
+    battle_values: returns the values stored for a battle
     store_battle_to_db
+    store_battles_to_db
 
 """
 
-from flask import Flask, request, jsonify
-import mysql.connector
-import copy
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from datetime import datetime
 import json
-from pokemon import Pokemon, connection_error, http_error
+import random
+import time
+import metrics as app_metrics
+from metrics import REQUEST_SECONDS, timed
+from battle_events import TurnEvent, decode_events, encode_events, render_events, render_text
+from database import SPECIES_STATS_COLUMNS, get_battle_writer, get_database, record_battles
+from odds import simulate_odds
+from tournament import run_tournament
+from warmup import get_warmup
+import config
+from pokemon import BATTLE_TURNS, Combatant, data_version, get_species, connection_error, http_error
+
+# Seeds are stored in a BIGINT UNSIGNED column, kept below 2**63 so they also fit the signed integers of SQLite
+MAX_SEED = 2 ** 63 - 1
 
 app = Flask(__name__)
 
-# MySQL connection configuration
-db_config = {
-    "host": "mysql_db",  # Docker container name for mysql
-    "user": "battle_user",
-    "password": "battle_password",
-    "database": "battle_db",
-}
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.before_request
+def start_warmup():
+    # Every process serving the application warms up with its first request, a load balancer probing /ready included,
+    # whether it runs under gunicorn or app.run. The watching process of the debug reloader serves nothing
+    if config.WARMUP_ON_START:
+        get_warmup().start()
+
+@app.after_request
+def record_latency(response):
+    # Streamed responses are timed until their first byte
+    if request.url_rule is not None and 'start_time' in g:
+        REQUEST_SECONDS.labels(request.url_rule.rule).observe(time.perf_counter() - g.start_time)
+    return response
 
 @app.route('/battle')
 def battle():
     """Simulates the battle between two pokemon.
     
-    routes localhost:5000/battle?<pokemon1>&<pokemon2>
+    routes localhost:5000/battle?<pokemon1>&<pokemon2>&<seed>&<format>
     Pokemon attack in sequence. A pokemon wins if the other pokemon's hitpoint reach 0.
     After 6 turns (3 attacks from each pokemon) if no pokemon has reach 0 hitpoint, 
     the pokemon with highest remaining hitpoints wins.
+    The same pokemon fighting with the same seed always fight the same battle
 
     Parameters:
         - pokemon1: Name of the first Pokemon
@@ -45,9 +94,17 @@ def battle():
         in: path
         type:str
         required:true
+        - seed: Seed of the random generator of the battle, random if not given
+        in: path
+        type:int
+        required:false
+        - format: text (default) for a battle log of sentences, events for a log of turn events
+        in: path
+        type:str
+        required:false
 
     Responses:
-        200: Returns a json with the battle logs and the winner
+        200: Returns a json with the battle logs, the winner, the seed and the data version
         400: Returns a json with bad request
         404: Return a json being unable to find the pokemon in pokeapi
     """
@@ -61,14 +118,13 @@ def battle():
         if not pokemon1_name or not pokemon2_name:
             raise ValueError("/battle requires two pokemon names")
 
-        # Create Pokemon instances
-        pokemon1 = Pokemon(pokemon1_name)
-        pokemon2 = Pokemon(pokemon2_name)
+        seed = parse_seed(request.args.get('seed'))
+        log_format = parse_log_format(request.args.get('format'))
 
-        # Create a non memory shared instance if the two pokemons are the same
-        if pokemon1_name == pokemon2_name:
-            pokemon2 = copy.deepcopy(pokemon1)
-            pokemon2.name = f'{pokemon2.name}2'
+        # Create the combatants of this battle from the shared species
+        species1 = get_species(pokemon1_name)
+        species2 = get_species(pokemon2_name)
+        pokemon1, pokemon2 = create_combatants(species1, species2, species1.name == species2.name)
 
     except ValueError as e:
         return jsonify({"Error": str(e)}) , 400
@@ -76,13 +132,643 @@ def battle():
         return jsonify({"Error": str(e)}), 404
 
     # Perform battle simulation
-    battle_log = []
-    attacker, defender = Pokemon.select_attacker_defender(pokemon1, pokemon2)
-    attacker.current_hp = attacker.stats['hp']
-    defender.current_hp = defender.stats['hp']
-    for turn in range(6):
-        attack_info = attacker.attack(defender)
-        battle_log.append(attack_info)
+    version = data_version(species1, species2)
+    winner, events = simulate_battle(pokemon1, pokemon2, random.Random(seed))
+
+    store_battle_to_db(battle_values(winner, pokemon1_name, pokemon2_name, seed, version, events, pokemon1, pokemon2))
+
+    # Return battle result as JSON response
+    result = battle_result(pokemon1, pokemon2, winner, events, log_format)
+    result.update({"seed": seed, "data_version": version})
+    return jsonify(result)
+
+@app.route('/battles', methods=['POST'])
+def battles():
+    """Simulates many battles in one request
+
+    routes localhost:5000/battles?<format> with a json body [{"pokemon1": <name>, "pokemon2": <name>, "seed": <seed>}, ...]
+    Each battle follows the same rules as /battle. Every distinct pokemon is loaded once for the whole batch
+    and all the battles are stored with a single insert
+    A matchup that can not be fought gets an error in its place without failing the others
+
+    Parameters:
+        - matchups: List of the pairs of pokemon to fight, each with an optional seed like /battle
+        in: body
+        type:list<dict>
+        required:true
+        - format: format of the battle logs like /battle
+        in: path
+        type:str
+        required:false
+
+    Responses:
+        200: Returns a json list with, in the order of the matchups, the result of each battle
+             like /battle or an Error with the status /battle would have returned
+        400: Returns a json with bad request
+    """
+
+    try:
+        log_format = parse_log_format(request.args.get('format'))
+        matchups = request.get_json(silent=True)
+        if not isinstance(matchups, list) or not matchups:
+            raise ValueError("/battles requires a json list of matchups")
+        if len(matchups) > config.BATTLES_BATCH_MAX_SIZE:
+            raise ValueError(f"/battles accepts at most {config.BATTLES_BATCH_MAX_SIZE} matchups")
+
+    except ValueError as e:
+        return jsonify({"Error": str(e)}) , 400
+
+    # Load every distinct pokemon once, remembering the error of those that can not be loaded
+    species = {}
+    for matchup in matchups:
+        if not isinstance(matchup, dict):
+            continue
+        for name in (matchup.get('pokemon1'), matchup.get('pokemon2')):
+            if isinstance(name, str) and name and name not in species:
+                try:
+                    species[name] = get_species(name)
+                except (connection_error, http_error) as e:
+                    species[name] = e
+
+    results = []
+    rows = []
+    for matchup in matchups:
+        names = (matchup.get('pokemon1'), matchup.get('pokemon2')) if isinstance(matchup, dict) else (None, None)
+        if not all(isinstance(name, str) and name for name in names):
+            results.append({"Error": "Each matchup requires two pokemon names", "status": 400})
+            continue
+        try:
+            seed = parse_seed(matchup.get('seed'))
+        except ValueError as e:
+            results.append({"Error": str(e), "status": 400})
+            continue
+        errors = [species[name] for name in names if isinstance(species[name], Exception)]
+        if errors:
+            results.append({"Error": str(errors[0]), "status": 404})
+            continue
+
+        species1, species2 = species[names[0]], species[names[1]]
+        pokemon1, pokemon2 = create_combatants(species1, species2, species1.name == species2.name)
+        version = data_version(species1, species2)
+        winner, events = simulate_battle(pokemon1, pokemon2, random.Random(seed))
+        rows.append(battle_values(winner, names[0], names[1], seed, version, events, pokemon1, pokemon2))
+        result = battle_result(pokemon1, pokemon2, winner, events, log_format)
+        result.update({"seed": seed, "data_version": version})
+        results.append(result)
+
+    if rows:
+        store_battles_to_db(rows)
+
+    return jsonify(results)
+
+@app.route('/battle/<int:battle_id>/replay')
+def replay_battle(battle_id):
+    """Replays a stored battle from its seed
+
+    routes localhost:5000/battle/<id>/replay?<format>
+    The battle is fought again with the stored seed and pokemon. It repeats the stored one when the data version,
+    the type chart, the pokemon data and the battle rules, did not change since,
+    verified tells if the data version and the turn events match the stored ones
+
+    Parameters:
+        - battle_id: Id of the battle, as shown by /show_previous_battles
+        in: path
+        type:int
+        required:true
+        - format: format of the battle log like /battle
+        in: path
+        type:str
+        required:false
+
+    Responses:
+        200: Returns a json like /battle with the stored data version and whether the replay matches the stored battle
+        404: Returns a json being unable to find the battle or its pokemon
+    """
+
+    try:
+        log_format = parse_log_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({"Error": str(e)}) , 400
+
+    try:
+        database = get_database()
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT winner, pokemon1, pokemon2, seed, data_version, events, battle_log FROM battles WHERE id = {database.placeholder}",
+                [battle_id],
+            )
+            row = cursor.fetchone()
+            cursor.close()
+
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+    if row is None:
+        return jsonify({"Error": f"Battle {battle_id} was not found"}), 404
+
+    stored_winner, pokemon1_name, pokemon2_name, seed, stored_version, stored_events, battle_log = row
+    if seed is None:
+        # Battles stored before seeds were kept can not be replayed, their log was stored instead
+        return jsonify({"id": battle_id, "winner": stored_winner, "battle_log": json.loads(battle_log or 'null')})
+
+    try:
+        species1 = get_species(pokemon1_name)
+        species2 = get_species(pokemon2_name)
+    except (connection_error, http_error) as e:
+        return jsonify({"Error": str(e)}), 404
+
+    pokemon1, pokemon2 = create_combatants(species1, species2, species1.name == species2.name)
+    version = data_version(species1, species2)
+    winner, events = simulate_battle(pokemon1, pokemon2, random.Random(seed))
+    matches = decode_events(stored_events) == events if stored_events is not None else winner == stored_winner
+
+    result = battle_result(pokemon1, pokemon2, winner, events, log_format)
+    result.update({
+        "id": battle_id,
+        "seed": seed,
+        "data_version": version,
+        "stored_data_version": stored_version,
+        "verified": version == stored_version and matches,
+    })
+    return jsonify(result)
+
+@app.route('/leaderboard')
+def leaderboard():
+    """Shows the pokemon with the most wins
+
+    routes localhost:5000/leaderboard?<limit>
+    Answered from the species_stats table, kept up to date with every stored battle
+
+    Parameters:
+        - limit: Number of pokemon shown
+        in: path
+        type:int
+        required:false
+
+    Responses:
+        200: Returns a json list with the battles, wins, losses, draws, win rate and average remaining hp of each pokemon
+        400: Returns a json with bad request
+    """
+
+    try:
+        limit = parse_int('limit', request.args.get('limit'), config.LEADERBOARD_SIZE)
+        if not 0 < limit <= config.LEADERBOARD_MAX_SIZE:
+            raise ValueError(f"limit must be between 1 and {config.LEADERBOARD_MAX_SIZE}")
+
+    except ValueError as e:
+        return jsonify({"Error": str(e)}), 400
+
+    try:
+        database = get_database()
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            # Both columns descending so the wins index is read backwards instead of sorting
+            cursor.execute(
+                f"SELECT {', '.join(SPECIES_STATS_COLUMNS)} FROM species_stats ORDER BY wins DESC, species DESC LIMIT {int(limit)}"
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+
+        return jsonify([species_stats_result(row) for row in rows])
+
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+@app.route('/stats/<pokemon>')
+def species_stats(pokemon):
+    """Shows the results of a pokemon in all the stored battles
+
+    routes localhost:5000/stats/<pokemon>
+
+    Parameters:
+        - pokemon: Name of the pokemon
+        in: path
+        type:str
+        required:true
+
+    Responses:
+        200: Returns a json with the battles, wins, losses, draws, win rate and average remaining hp of the pokemon
+        404: Returns a json when the pokemon has not fought any stored battle
+    """
+
+    try:
+        database = get_database()
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(SPECIES_STATS_COLUMNS)} FROM species_stats WHERE species = {database.placeholder}",
+                [pokemon.lower()],
+            )
+            row = cursor.fetchone()
+            cursor.close()
+
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+    if row is None:
+        return jsonify({"Error": f"Pokemon {pokemon} has not fought any battle"}), 404
+    return jsonify(species_stats_result(row))
+
+@app.route('/battle/odds')
+def battle_odds():
+    """Estimates how likely a pokemon is to beat another by simulating many battles
+
+    routes localhost:5000/battle/odds?<pokemon1>&<pokemon2>&<n>
+    Each battle follows the same rules as /battle. The battles are not stored in the database
+
+    Parameters:
+        - pokemon1: Name of the first Pokemon
+        in: path
+        type:str
+        required:true
+        - pokemon2: Name of the second Pokemon
+        in: path
+        type:str
+        required:true
+        - n: Number of battles to simulate
+        in: path
+        type:int
+        required:false
+
+    Responses:
+        200: Returns a json with the win, loss and draw probabilities and the damage dealt by each pokemon
+        400: Returns a json with bad request
+        404: Return a json being unable to find the pokemon in pokeapi
+    """
+
+    try:
+        pokemon1_name = request.args.get('pokemon1')
+        pokemon2_name = request.args.get('pokemon2')
+        if not pokemon1_name or not pokemon2_name:
+            raise ValueError("/battle/odds requires two pokemon names")
+
+        n = parse_int('n', request.args.get('n'), config.ODDS_DEFAULT_SAMPLES)
+        if not 0 < n <= config.ODDS_MAX_SAMPLES:
+            raise ValueError(f"n must be between 1 and {config.ODDS_MAX_SAMPLES}")
+
+        species1 = get_species(pokemon1_name)
+        species2 = get_species(pokemon2_name)
+
+    except ValueError as e:
+        return jsonify({"Error": str(e)}) , 400
+    except (connection_error, http_error) as e:
+        return jsonify({"Error": str(e)}), 404
+
+    return jsonify(simulate_odds(species1, species2, n))
+
+@app.route('/tournament', methods=['POST'])
+def tournament():
+    """Runs a round robin tournament where every pokemon of a roster fights every other one
+
+    routes localhost:5000/tournament with a json body {"roster": [<pokemon names>], "repetitions": <n>}
+    Each matchup is fought repetitions times with the same rules as /battle, on all cores
+
+    Parameters:
+        - roster: Names of the pokemon taking part
+        in: body
+        type:list<str>
+        required:true
+        - repetitions: Number of battles of each matchup
+        in: body
+        type:int
+        required:false
+        - seed: Seed of the random generators
+        in: body
+        type:int
+        required:false
+
+    Responses:
+        200: Returns a json with the win rate matrix and the ranking of the roster
+        400: Returns a json with bad request
+        404: Return a json being unable to find the pokemon in pokeapi
+    """
+
+    try:
+        body = request.get_json(silent=True) or {}
+        roster_names = body.get('roster')
+        if not isinstance(roster_names, list) or not all(isinstance(name, str) and name for name in roster_names):
+            raise ValueError("/tournament requires a roster with a list of pokemon names")
+
+        # Each pokemon takes part once, names are matched without case like get_species does
+        roster_names = list(dict.fromkeys(name.lower() for name in roster_names))
+        if not 2 <= len(roster_names) <= config.TOURNAMENT_MAX_ROSTER:
+            raise ValueError(f"The roster must have between 2 and {config.TOURNAMENT_MAX_ROSTER} pokemon")
+
+        repetitions = body.get('repetitions', config.TOURNAMENT_DEFAULT_REPETITIONS)
+        if not isinstance(repetitions, int) or not 0 < repetitions <= config.TOURNAMENT_MAX_REPETITIONS:
+            raise ValueError(f"repetitions must be between 1 and {config.TOURNAMENT_MAX_REPETITIONS}")
+
+        seed = body.get('seed')
+        if seed is not None and not isinstance(seed, int):
+            raise ValueError("seed must be an integer")
+
+        roster = [get_species(name) for name in roster_names]
+
+    except ValueError as e:
+        return jsonify({"Error": str(e)}) , 400
+    except (connection_error, http_error) as e:
+        return jsonify({"Error": str(e)}), 404
+
+    return jsonify(run_tournament(roster, repetitions, config.TOURNAMENT_WORKERS, seed))
+
+@app.route('/show_previous_battles')
+def show_previous_battles():
+    """Access mysql database and shows previous battles, a page at a time
+
+    routes localhost:5000/show_previous_battles?<after_id>&<limit>&<winner>&<since>&<until>&<format>
+    Battles are returned in id order. To get the next page pass the id found in the X-Next-After-Id header as after_id
+    With format=ndjson the battles are streamed one json per line from a server side cursor,
+    without limit all the matching battles are streamed
+
+    Parameters:
+        - after_id: Only battles with a higher id are returned
+        in: path
+        type:int
+        required:false
+        - limit: Maximum number of battles returned
+        in: path
+        type:int
+        required:false
+        - winner: Only battles won by this pokemon are returned
+        in: path
+        type:str
+        required:false
+        - since, until: Only battles fought in this date range are returned, in ISO 8601 format
+        in: path
+        type:str
+        required:false
+        - format: json (default) or ndjson
+        in: path
+        type:str
+        required:false
+
+    Returns:
+        json: A json with a page of the database logs
+    """
+    try:
+        stream = request.args.get('format', 'json') == 'ndjson'
+        limit = parse_int('limit', request.args.get('limit'), None if stream else config.BATTLES_PAGE_SIZE)
+        if limit is not None and not 0 < limit <= config.BATTLES_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {config.BATTLES_MAX_PAGE_SIZE}")
+        query, parameters = battles_query(
+            get_database().placeholder,
+            after_id=parse_int('after_id', request.args.get('after_id'), 0),
+            limit=limit,
+            winner=request.args.get('winner'),
+            since=parse_date(request.args.get('since')),
+            until=parse_date(request.args.get('until')),
+        )
+
+    except ValueError as e:
+        return jsonify({"Error": str(e)}) , 400
+
+    if stream:
+        return Response(stream_with_context(stream_battles(query, parameters)), mimetype='application/x-ndjson')
+
+    try:
+        # Borrow a connection from the pool
+        with get_database().connection() as conn:
+            cursor = conn.cursor()
+
+            # Fetch data from the database
+            cursor.execute(query, parameters)
+            data = cursor.fetchall()
+            cursor.close()
+
+        # Render the HTML template and pass the data
+        response = jsonify([battle_row(row) for row in data])
+        if len(data) == limit:
+            response.headers['X-Next-After-Id'] = str(data[-1][0])
+        return response
+
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+@app.route('/metrics')
+def metrics():
+    """Shows the metrics of this process in the Prometheus text format
+
+    routes localhost:5000/metrics
+
+    Returns:
+        text: latency histograms of each route and phase, cache lookups, PokeAPI calls and database connection times
+    """
+
+    return Response(app_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    """Tells whether this worker finished warming up its caches, for load balancers
+
+    routes localhost:5000/ready
+
+    Returns:
+        json: the progress of the warm-up, with status 200 once the type chart and the warm set are loaded, 503 before
+    """
+
+    status = get_warmup().status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+def battles_query(placeholder, after_id=0, limit=None, winner=None, since=None, until=None):
+    """Builds the query of a page of battles using keyset pagination on the id
+
+    Args:
+        placeholder (str): parameter placeholder of the database driver
+        after_id (int): only battles with a higher id are selected
+        limit (int): maximum number of battles selected, None selects all of them
+        winner (str): only battles won by this pokemon are selected
+        since (datetime): only battles fought from this date are selected
+        until (datetime): only battles fought before this date are selected
+
+    Returns:
+        tuple: A tuple with the query and its parameters
+    """
+
+    conditions = [f"id > {placeholder}"]
+    parameters = [after_id]
+    if winner:
+        # Winners are stored as "<pokemon> is the winner by ...", a prefix search uses the winner index
+        conditions.append(f"winner LIKE {placeholder} ESCAPE '!'")
+        escaped = winner.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+        parameters.append(f"{escaped} is the winner%")
+    if since:
+        conditions.append(f"battle_date >= {placeholder}")
+        parameters.append(since)
+    if until:
+        conditions.append(f"battle_date < {placeholder}")
+        parameters.append(until)
+
+    query = f"SELECT * FROM battles WHERE {' AND '.join(conditions)} ORDER BY id"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query, parameters
+
+def stream_battles(query, parameters):
+    """Yields the battles selected by a query as json lines, reading them from a server side cursor
+
+    The stream holds a dedicated connection rather than a pooled one, a slow client does not keep the battle writer
+    and the other routes waiting for a connection
+
+    Args:
+        query (str): the query selecting the battles
+        parameters (list): the parameters of the query
+
+    Yields:
+        str: a json line with a battle
+    """
+
+    with get_database().dedicated_connection() as conn:
+        # Cursors are unbuffered, the rows stay on the server until they are fetched
+        cursor = conn.cursor()
+        cursor.execute(query, parameters)
+        while True:
+            rows = cursor.fetchmany(config.BATTLES_STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield app.json.dumps(battle_row(row)) + '\n'
+        # A client leaving mid-stream leaves rows unread, closing the cursor would fail on them,
+        # the connection is then closed with them
+        cursor.close()
+
+def parse_date(value):
+    """Parses an ISO 8601 date of a request parameter
+
+    Args:
+        value (str): the date or None
+
+    Raises:
+        ValueError: when the date is not in ISO 8601 format
+
+    Returns:
+        datetime: the date or None
+    """
+
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"{value} is not a date in ISO 8601 format") from e
+
+def parse_int(name, value, default):
+    """Parses an integer request parameter
+
+    Args:
+        name (str): name of the parameter
+        value (str): the value or None
+        default (int): value returned when the parameter is missing
+
+    Raises:
+        ValueError: when the value is not an integer
+
+    Returns:
+        int: the value or the default
+    """
+
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError as e:
+        raise ValueError(f"{name} must be an integer") from e
+
+def parse_seed(value):
+    """Parses the random seed of a battle
+
+    Args:
+        value (int or str): the seed, None for a random one
+
+    Raises:
+        ValueError: when the seed is not an integer between 0 and MAX_SEED
+
+    Returns:
+        int: the seed
+    """
+
+    if value is None:
+        return random.randint(0, MAX_SEED)
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= MAX_SEED:
+        raise ValueError(f"seed must be an integer between 0 and {MAX_SEED}")
+    return value
+
+def parse_log_format(value):
+    """Parses the requested format of the battle log
+
+    Args:
+        value (str): text, events or None for text
+
+    Raises:
+        ValueError: when the format is not text or events
+
+    Returns:
+        str: the format
+    """
+
+    if value is None:
+        return 'text'
+    if value not in ('text', 'events'):
+        raise ValueError("format must be text or events")
+    return value
+
+def battle_row(row):
+    """Converts a stored battle to json values, its packed events become lists of their fields
+
+    Args:
+        row (tuple): the battle as read from the database
+
+    Returns:
+        list: the values of the battle
+    """
+
+    return [
+        [list(event) for event in decode_events(value)] if isinstance(value, (bytes, bytearray)) else value
+        for value in row
+    ]
+
+def create_combatants(species1, species2, mirror):
+    """Creates the combatants of a battle from the shared species
+
+    Args:
+        species1 (Species): species of the first pokemon
+        species2 (Species): species of the second pokemon
+        mirror (bool): whether both are the same pokemon, the second one is then renamed to tell them apart
+
+    Returns:
+        tuple: A tuple with the two combatants
+    """
+
+    pokemon1 = Combatant(species1)
+    pokemon2 = Combatant(species2)
+    if mirror:
+        pokemon2.name = f'{pokemon2.name}2'
+    return pokemon1, pokemon2
+
+@timed('simulation')
+def simulate_battle(pokemon1, pokemon2, rng=random):
+    """Simulates a battle between two combatants
+
+    Pokemon attack in sequence. A pokemon wins if the other pokemon's hitpoint reach 0.
+    After 6 turns (3 attacks from each pokemon) if no pokemon has reach 0 hitpoint,
+    the pokemon with highest remaining hitpoints wins.
+
+    Args:
+        pokemon1 (Combatant): the first pokemon
+        pokemon2 (Combatant): the second pokemon
+        rng (random.Random): random generator of the battle, the global one if not given
+
+    Returns:
+        tuple: A tuple with the winner description and the turn events
+    """
+
+    events = []
+    attacker, defender = pokemon1.select_attacker_defender(pokemon2, rng)
+    for turn in range(BATTLE_TURNS):
+        move, damage, multiplier = attacker.strike(defender, rng)
+        events.append(TurnEvent(0 if attacker is pokemon1 else 1, move, damage, multiplier, defender.current_hp))
 
         if defender.current_hp <= 0:
             winner = attacker.name
@@ -98,64 +784,101 @@ def battle():
     else:
         winner= "It's a draw"
 
-    store_battle_to_db(winner, battle_log)
+    return winner, events
+
+def battle_result(pokemon1, pokemon2, winner, events, log_format='text'):
+    """Returns the json result of a battle, rendering its events in the requested format
+
+    Args:
+        pokemon1 (Combatant): the first pokemon
+        pokemon2 (Combatant): the second pokemon
+        winner (str): the winner description
+        events (list<TurnEvent>): the turns of the battle
+        log_format (str): text for a battle log of sentences, events for a log of turn events with the move names of each pokemon
 
-    battle_result = {
-        "pokemon1": Pokemon.get_pokemon_info(pokemon1),
-        "pokemon2": Pokemon.get_pokemon_info(pokemon2),
+    Returns:
+        dict: dict with the info of both pokemon, the winner and the battle log
+    """
+
+    move_names = (list(pokemon1.moves), list(pokemon2.moves))
+    result = {
+        "pokemon1": pokemon1.get_pokemon_info(),
+        "pokemon2": pokemon2.get_pokemon_info(),
         "winner": winner,
-        "battle_log": battle_log
     }
+    if log_format == 'events':
+        result["battle_log"] = render_events(events)
+        result["moves"] = move_names
+    else:
+        result["battle_log"] = render_text(events, (pokemon1.name, pokemon2.name), move_names)
+    return result
 
-    # Return battle result as JSON response
-    return jsonify(battle_result)
+def species_stats_result(row):
+    """Returns the json stats of a species
 
-@app.route('/show_previous_battles')
-def show_previous_battles():
-    """Access mysql database and shows all previous battles
+    Args:
+        row (tuple): the values of database.SPECIES_STATS_COLUMNS
 
     Returns:
-        json: A json with all the database logs
+        dict: dict with the name, battles, wins, losses, draws, win rate and average remaining hp of the species
     """
-    try:
-        # Connect to the MySQL database
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
 
-        # Fetch data from the database
-        cursor.execute("SELECT * FROM battles")
-        data = cursor.fetchall()
+    stats = dict(zip(SPECIES_STATS_COLUMNS, row))
+    remaining_hp_total = stats.pop('remaining_hp_total')
+    remaining_hp_count = stats.pop('remaining_hp_count')
+    stats['win_rate'] = stats['wins'] / stats['battles'] if stats['battles'] else None
+    stats['average_remaining_hp'] = remaining_hp_total / remaining_hp_count if remaining_hp_count else None
+    return stats
 
-        # Close the database connection
-        cursor.close()
-        conn.close()
+def battle_values(winner, pokemon1_name, pokemon2_name, seed, version, events, pokemon1, pokemon2):
+    """Returns the values stored for a battle, what it takes to replay it and its outcome
 
-        # Render the HTML template and pass the data
-        return jsonify(data)
+    Args:
+        winner (str): name of the pokemon that won the battle
+        pokemon1_name (str): name of the first pokemon as requested
+        pokemon2_name (str): name of the second pokemon as requested
+        seed (int): seed of the random generator of the battle
+        version (str): data version of the battle
+        events (list<TurnEvent>): the turns of the battle, stored packed
+        pokemon1 (Combatant): the first pokemon after the battle
+        pokemon2 (Combatant): the second pokemon after the battle
 
-    except Exception as e:
-        return f"An error occurred: {str(e)}"
+    Returns:
+        tuple: the values of database.BATTLE_COLUMNS
+    """
 
-def store_battle_to_db(winner, battle_log):
-    """Stores battle logs to mysql database
+    return (winner, pokemon1_name, pokemon2_name, seed, version, encode_events(events),
+            pokemon1.current_hp, pokemon2.current_hp)
+
+@timed('store_battle')
+def store_battle_to_db(row):
+    """Stores a battle to mysql database as what it takes to replay it
+
+    The battle is queued and written in a batch by the background writer, the request does not wait for the database
 
     Args:
-        winner (str): name of the pokemon that won the battle
-        battle_log (dict): battle log with all attacks made during the battle
+        row (tuple): the values of the battle, see battle_values
     """
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
+        get_battle_writer().submit(row)
 
-        # Assuming you have a table named "battles"
-        cursor.execute(
-            "INSERT INTO battles (winner, battle_log) VALUES (%s, %s)",
-            (winner, json.dumps(battle_log)),
-        )
+    except Exception as e:
+        raise ValueError("Could not store in database") from e
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+@timed('store_battles')
+def store_battles_to_db(rows):
+    """Stores many battles to mysql database with a single multi-row insert
+
+    The battles are written straight away, the request waits for the database
+
+    Args:
+        rows (list<tuple>): the values of each battle, see battle_values
+    """
+    try:
+        database = get_database()
+        with database.connection() as conn:
+            record_battles(database, conn, rows)
+            conn.commit()
 
     except Exception as e:
         raise ValueError("Could not store in database") from e
@@ -0,0 +1,105 @@
+"""Battle events
+
+This module describes the turns of a battle as structured events instead of sentences
+An event holds which pokemon attacked, the index of its move, the damage, the type multiplier
+and the hitpoints left to the defender. Events are packed in a few bytes each to be stored,
+and rendered as text or json only when a response asks for it
+
+Classes:
+    TurnEvent: A turn of a battle
+
+Functions:
+    encode_events: packs the events of a battle in bytes
+    decode_events: unpacks the events of a battle
+    render_text: renders events as the sentences of the battle log
+    render_events: renders events as json objects
+"""
+
+import struct
+from collections import namedtuple
+
+VERSION = 1
+# attacker index, move index, damage, type multiplier * MULTIPLIER_SCALE, remaining hitpoints of the defender
+EVENT_RECORD = struct.Struct('<BBIBi')
+# Type multipliers are products of 0, 0.5, 1 and 2 so multiplier * 4 is a small integer
+MULTIPLIER_SCALE = 4
+
+TurnEvent = namedtuple('TurnEvent', ['attacker', 'move', 'damage', 'multiplier', 'remaining_hp'])
+TurnEvent.__doc__ = """A turn of a battle
+
+Atribues:
+    attacker(int): 0 if the first pokemon attacked, 1 if the second one did, the other one defended
+    move(int): index of the move used in the moves of the attacker
+    damage(int): damage done to the defender
+    multiplier(float): type advantage multiplier of the move against the defender
+    remaining_hp(int): hitpoints left to the defender
+"""
+
+def encode_events(events):
+    """Packs the events of a battle in bytes
+
+    Args:
+        events (list<TurnEvent>): the events of the battle
+
+    Returns:
+        bytes: a version byte followed by one fixed size record per event
+    """
+
+    return bytes([VERSION]) + b''.join(
+        EVENT_RECORD.pack(
+            event.attacker, event.move, event.damage,
+            round(event.multiplier * MULTIPLIER_SCALE), event.remaining_hp,
+        )
+        for event in events
+    )
+
+def decode_events(data):
+    """Unpacks the events of a battle
+
+    Args:
+        data (bytes): the events packed by encode_events
+
+    Raises:
+        ValueError: when the data was not packed by this version of encode_events
+
+    Returns:
+        list<TurnEvent>: the events of the battle
+    """
+
+    data = bytes(data)
+    if not data or data[0] != VERSION or (len(data) - 1) % EVENT_RECORD.size:
+        raise ValueError(f"Not a version {VERSION} battle event encoding")
+    return [
+        TurnEvent(attacker, move, damage, multiplier / MULTIPLIER_SCALE, remaining_hp)
+        for attacker, move, damage, multiplier, remaining_hp in EVENT_RECORD.iter_unpack(data[1:])
+    ]
+
+def render_text(events, names, move_names):
+    """Renders events as the sentences of the battle log
+
+    Args:
+        events (list<TurnEvent>): the events of the battle
+        names (tuple<str>): names of the first and second pokemon
+        move_names (tuple<list<str>>): move names of the first and second pokemon, in the order of their moves
+
+    Returns:
+        list<str>: one sentence per turn
+    """
+
+    return [
+        f"{names[event.attacker]} attacks {names[1 - event.attacker]} with {move_names[event.attacker][event.move]}. "
+        f"It does {event.damage} damage and {names[1 - event.attacker]} has {event.remaining_hp} hitpoints remaining"
+        for event in events
+    ]
+
+def render_events(events):
+    """Renders events as json objects
+
+    Args:
+        events (list<TurnEvent>): the events of the battle
+
+    Returns:
+        list<dict>: one dict per turn with the fields of the event
+    """
+
+    return [event._asdict() for event in events]
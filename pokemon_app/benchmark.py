@@ -0,0 +1,404 @@
+"""Benchmark
+
+This module measures the latency and throughput of /battle and /show_previous_battles end to end
+The application is served on a local port against a stub PokeAPI answering with the recorded responses of
+pokeapi_fixtures.json and a SQLite file standing in for the mysql database, so runs repeat and compare between commits
+Requests are sent by concurrent clients and each route reports its p50, p95 and p99 latencies in milliseconds,
+its throughput and its errors, along with the requests made to PokeAPI, in two scenarios:
+    cold: every cache is empty like after a deploy, the battles load their pokemon from the stub PokeAPI
+    warm: every recorded pokemon was loaded by the warm-up before the requests
+
+The flask server of battle.py (sync) or the aiohttp server of async_battle.py (async) is measured
+The persistent species cache is not used, so the cold scenario always fetches from the stub
+
+    python benchmark.py [--server sync] [--requests 500] [--concurrency 8] [--upstream-delay 0.02] [--output benchmark_results.json]
+
+Classes:
+    SyncServer: The flask application served by a thread per request
+    AsyncServer: The aiohttp application served by an event loop
+
+Functions:
+    percentile: returns a percentile of some values
+    summarize: summarizes the timings of the requests to a route
+    run_requests: sends requests from concurrent clients
+    serve: serves the flask application on a free local port
+    stub_database: creates a SQLite database with the battles schema
+    reset_caches: empties every cache of the process
+    run_scenario: measures both routes in one scenario
+    run_benchmark: runs the cold and warm scenarios
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest import mock
+import requests
+from aiohttp import web
+from werkzeug.serving import make_server
+import config
+import moves
+from async_battle import WARMUP, WRITER, create_app
+from async_database import ThreadedDatabase
+from battle import app
+from database import Database, get_battle_writer
+from pokeapi_client import endpoint_name, get_client
+from pokemon import get_species
+from species_cache import get_species_cache
+from species_names import negative_cache, reset_name_index
+from stub_pokeapi import NAMES_PATH, StubPokeAPI
+from warmup import Warmup
+
+DB_INIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_init.sql')
+PERCENTILES = (50, 95, 99)
+
+def percentile(values, percent):
+    """Returns a percentile of some values with the nearest rank method
+
+    Args:
+        values (list<float>): the values, sorted
+        percent (float): the percentile, between 0 and 100
+
+    Returns:
+        float: the smallest value with at least percent of the values lower or equal, None without values
+    """
+
+    if not values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+def summarize(latencies, errors, seconds):
+    """Summarizes the timings of the requests to a route
+
+    Args:
+        latencies (list<float>): seconds taken by each request
+        errors (int): number of requests that did not answer 200
+        seconds (float): seconds taken by all the requests
+
+    Returns:
+        dict: dict with the number of requests and errors, the throughput in requests per second
+            and the percentiles and maximum of the latency in milliseconds
+    """
+
+    latencies = sorted(latency * 1000 for latency in latencies)
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'throughput': round(len(latencies) / seconds, 1) if seconds else None,
+    }
+    for percent in PERCENTILES:
+        value = percentile(latencies, percent)
+        summary[f'p{percent}_ms'] = round(value, 3) if value is not None else None
+    summary['max_ms'] = round(latencies[-1], 3) if latencies else None
+    return summary
+
+def run_requests(urls, concurrency):
+    """Sends GET requests from concurrent clients, each client keeping its connection alive
+
+    Args:
+        urls (list<str>): the urls requested, in order
+        concurrency (int): number of clients
+
+    Returns:
+        dict: the summary of the requests, see summarize
+    """
+
+    sessions = threading.local()
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def get(url):
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = session.get(url).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        latency = time.perf_counter() - start
+        with lock:
+            latencies.append(latency)
+            errors[0] += not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(get, urls))
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+def serve(application):
+    """Serves an application on a free local port from a background thread, one thread per request
+
+    Args:
+        application (Flask): the application
+
+    Returns:
+        BaseWSGIServer: the server, shutdown stops it
+    """
+
+    server = make_server('127.0.0.1', 0, application, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class SyncServer:
+    """The flask application served by a thread per request, storing battles in a database
+
+    Atribues:
+        url(str): base url of the server
+
+    Functions:
+        warm_up(list<str>)
+        flush()
+        stop()
+    """
+
+    def __init__(self, database):
+        self._patches = [
+            mock.patch('battle.get_database', return_value=database),
+            mock.patch('database.get_database', return_value=database),
+            # The warm scenario warms up explicitly, the cold one stays cold
+            mock.patch.object(config, 'WARMUP_ON_START', False),
+        ]
+        for patch in self._patches:
+            patch.start()
+        get_battle_writer.cache_clear()
+        self._server = serve(app)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def warm_up(self, names):
+        """Loads pokemon in the caches of the server"""
+        Warmup(names).run()
+
+    def flush(self):
+        """Writes the queued battles"""
+        get_battle_writer().close()
+
+    def stop(self):
+        """Stops the server"""
+
+        self._server.shutdown()
+        get_battle_writer.cache_clear()
+        for patch in self._patches:
+            patch.stop()
+
+class AsyncServer:
+    """The aiohttp application served by an event loop in a background thread, storing battles in a database
+
+    Atribues:
+        url(str): base url of the server
+
+    Functions:
+        warm_up(list<str>)
+        flush()
+        stop()
+    """
+
+    def __init__(self, database):
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        # Like the flask server no warm-up runs at start, the cold scenario loads the names with the first battles
+        self.application = create_app(ThreadedDatabase(database), warm_up=False)
+        self._runner = web.AppRunner(self.application, access_log=None)
+        self._call(self._runner.setup())
+        self._call(web.TCPSite(self._runner, '127.0.0.1', 0).start())
+        self.url = f"http://127.0.0.1:{self._runner.addresses[0][1]}"
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def warm_up(self, names):
+        """Loads pokemon in the caches of the server"""
+        Warmup(names, load=self.application[WARMUP].load).run()
+
+    def flush(self):
+        """Writes the queued battles"""
+        self._call(self.application[WRITER].close())
+
+    def stop(self):
+        """Stops the server and its event loop"""
+
+        self._call(self._runner.cleanup())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+SERVERS = {'sync': SyncServer, 'async': AsyncServer}
+
+def stub_database(path):
+    """Creates a SQLite database with the battles schema of db_init.sql
+
+    Args:
+        path (str): path of the SQLite file
+
+    Returns:
+        Database: the database
+    """
+
+    conn = sqlite3.connect(path)
+    # Readers do not wait for the battle writer
+    conn.execute("PRAGMA journal_mode=WAL")
+    with open(DB_INIT) as file:
+        conn.executescript(file.read().replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT'))
+    conn.close()
+    return Database(
+        lambda: sqlite3.connect(path, check_same_thread=False, timeout=30),
+        config.DB_POOL_SIZE, placeholder='?', dialect='sqlite',
+    )
+
+def reset_caches():
+    """Empties every cache of the process, like a new worker"""
+
+    moves._move_index.clear()
+    get_species.cache_clear()
+    negative_cache.clear()
+    reset_name_index()
+    get_client.cache_clear()
+    get_species_cache.cache_clear()
+
+def run_scenario(stub, names, settings, warm):
+    """Measures /battle then /show_previous_battles of a new server with a new database
+
+    Args:
+        stub (StubPokeAPI): the stub PokeAPI
+        names (list<str>): names of the pokemon fought
+        settings (dict): the server, requests, concurrency, history_limit and seed of the run
+        warm (bool): whether every pokemon is loaded before the requests
+
+    Returns:
+        dict: dict with the summary of each route, the PokeAPI requests made during the requests
+            and the seconds taken by the warm-up
+    """
+
+    reset_caches()
+    rng = random.Random(settings['seed'])
+    with tempfile.TemporaryDirectory() as directory:
+        database = stub_database(os.path.join(directory, 'battles.sqlite3'))
+        server = SERVERS[settings['server']](database)
+        try:
+            result = {}
+            if warm:
+                start = time.perf_counter()
+                server.warm_up(names)
+                result['warmup_seconds'] = round(time.perf_counter() - start, 3)
+            upstream = Counter(stub.requests)
+
+            battle_urls = [
+                f"{server.url}/battle?pokemon1={rng.choice(names)}&pokemon2={rng.choice(names)}&seed={index}"
+                for index in range(settings['requests'])
+            ]
+            result['battle'] = run_requests(battle_urls, settings['concurrency'])
+            # The history is read once every battle is written
+            server.flush()
+
+            history_url = f"{server.url}/show_previous_battles?limit={settings['history_limit']}"
+            result['show_previous_battles'] = run_requests([history_url] * settings['requests'], settings['concurrency'])
+        finally:
+            server.stop()
+
+    made = Counter()
+    for path, count in (Counter(stub.requests) - upstream).items():
+        made[endpoint_name(path)] += count
+    result['upstream_requests'] = dict(sorted(made.items()))
+    return result
+
+def run_benchmark(requests_count=500, concurrency=8, upstream_delay=0.02, history_limit=100, seed=0, server='sync'):
+    """Runs the cold and warm scenarios against a stub PokeAPI and a SQLite database
+
+    Args:
+        requests_count (int): number of requests sent to each route in each scenario
+        concurrency (int): number of concurrent clients
+        upstream_delay (float): seconds the stub PokeAPI waits before answering, like the network would
+        history_limit (int): number of battles returned by each /show_previous_battles request
+        seed (int): seed choosing the pokemon of the battles
+        server (str): sync for the flask server, async for the aiohttp server
+
+    Returns:
+        dict: dict with the commit, the settings and the results of each scenario
+    """
+
+    settings = {
+        'server': server,
+        'requests': requests_count,
+        'concurrency': concurrency,
+        'upstream_delay': upstream_delay,
+        'history_limit': history_limit,
+        'seed': seed,
+    }
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    stub = StubPokeAPI(delay=upstream_delay).start().load_recording()
+    names = [result['name'] for result in stub.fixtures[f"/api/v2{NAMES_PATH}"]['results']]
+    patches = [
+        mock.patch.object(config, 'POKEAPI_URL', stub.url),
+        # Disables the persistent species cache of both servers
+        mock.patch.object(config, 'SPECIES_CACHE_PATH', ''),
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        scenarios = {
+            scenario: run_scenario(stub, names, settings, warm=scenario == 'warm')
+            for scenario in ('cold', 'warm')
+        }
+    finally:
+        for patch in patches:
+            patch.stop()
+        reset_caches()
+        stub.stop()
+
+    return {
+        'commit': _commit(),
+        'date': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'settings': settings,
+        'scenarios': scenarios,
+    }
+
+def _commit():
+    """Returns the git commit of the code benchmarked, None outside of a git checkout"""
+
+    try:
+        process = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+        )
+    except OSError:
+        return None
+    return process.stdout.strip() or None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks /battle and /show_previous_battles against a stub PokeAPI")
+    parser.add_argument('--server', choices=sorted(SERVERS), default='sync', help="server measured")
+    parser.add_argument('--requests', type=int, default=500, help="requests sent to each route in each scenario")
+    parser.add_argument('--concurrency', type=int, default=8, help="number of concurrent clients")
+    parser.add_argument('--upstream-delay', type=float, default=0.02, help="seconds the stub PokeAPI waits before answering")
+    parser.add_argument('--history-limit', type=int, default=100, help="battles returned by each /show_previous_battles request")
+    parser.add_argument('--seed', type=int, default=0, help="seed choosing the pokemon of the battles")
+    parser.add_argument('--output', default='benchmark_results.json', help="path of the json results file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.requests, args.concurrency, args.upstream_delay, args.history_limit, args.seed, args.server)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+
+    for scenario, result in results['scenarios'].items():
+        for route in ('battle', 'show_previous_battles'):
+            summary = result[route]
+            print(
+                f"{scenario:5} {route:22} {summary['throughput']:>8} req/s  p50 {summary['p50_ms']} ms  "
+                f"p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  errors {summary['errors']}"
+            )
+        print(f"{scenario:5} PokeAPI requests {result['upstream_requests']}")
+    print(f"Results written to {args.output}")
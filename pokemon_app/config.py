@@ -0,0 +1,96 @@
+"""Application settings
+
+This module gathers the settings of the application
+Every setting can be overridden with an environment variable of the same name
+
+Variables:
+    POKEAPI_URL: base url of PokeAPI
+    MOVE_FETCH_WORKERS: number of moves fetched in parallel when loading a new pokemon, 1 fetches them one by one
+    SPECIES_MEMORY_CACHE_SIZE: maximum number of pokemon species kept in memory by each worker
+    SPECIES_CACHE_PATH: path of the SQLite file caching pokemon data, empty disables the cache
+    SPECIES_CACHE_TTL: seconds before a cached pokemon is fetched again
+    SPECIES_CACHE_SIZE: maximum number of pokemon kept in the cache
+    ODDS_DEFAULT_SAMPLES: number of battles simulated by /battle/odds when n is not given
+    ODDS_MAX_SAMPLES: maximum number of battles /battle/odds simulates in one request
+    TOURNAMENT_WORKERS: number of processes simulating a tournament, defaults to the number of cores
+    TOURNAMENT_MAX_ROSTER: maximum number of pokemon in a tournament
+    TOURNAMENT_DEFAULT_REPETITIONS: number of battles of each matchup when repetitions is not given
+    TOURNAMENT_MAX_REPETITIONS: maximum number of battles of each matchup
+    MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB: mysql connection settings
+    DB_POOL_SIZE: number of pooled mysql connections
+    BATTLE_WRITER_QUEUE_SIZE: maximum number of battles waiting to be written, /battle waits when it is full
+    BATTLE_WRITER_BATCH_SIZE: maximum number of battles written by one insert
+    BATTLE_WRITER_FLUSH_INTERVAL: maximum seconds a battle waits before being written
+    BATTLE_WRITER_RETRIES: number of times a batch of battles that could not be written is retried before being dropped
+    BATTLE_WRITER_RETRY_BACKOFF: seconds waited before retrying a batch the first time, doubled on every retry
+    BATTLES_PAGE_SIZE: number of battles returned by /show_previous_battles when limit is not given
+    BATTLES_MAX_PAGE_SIZE: maximum number of battles returned by /show_previous_battles
+    BATTLES_STREAM_BATCH_SIZE: number of rows fetched at a time when streaming battles
+    BATTLES_BATCH_MAX_SIZE: maximum number of matchups fought by one /battles request
+    LEADERBOARD_SIZE: number of pokemon shown by /leaderboard when limit is not given
+    LEADERBOARD_MAX_SIZE: maximum number of pokemon shown by /leaderboard
+    HTTP_POOL_SIZE: number of connections to PokeAPI kept alive
+    HTTP_RETRIES: number of times a failed PokeAPI request is retried
+    HTTP_RETRY_BACKOFF: seconds waited before the first retry, doubled on every retry
+    HTTP_TIMEOUT: seconds before a PokeAPI request times out
+    HTTP_CACHE_SIZE: number of PokeAPI responses kept for revalidation
+    DATA_PACK_PATH: path of a data pack built with datapack.py, when set pokemon are loaded from it instead of PokeAPI
+    SPECIES_NAMES_PATH: path of a file listing the valid pokemon names one per line, empty fetches them from PokeAPI
+    NAME_INDEX_TTL: seconds before the list of valid pokemon names is loaded again
+    NAME_INDEX_RETRY: seconds before loading the list of valid pokemon names is retried after a failure
+    NEGATIVE_CACHE_TTL: seconds an unknown pokemon name is rejected without asking PokeAPI again
+    NEGATIVE_CACHE_SIZE: maximum number of unknown pokemon names remembered
+    WARMUP_ON_START: 0 disables the warm-up each worker starts with its first request
+    WARMUP_SPECIES: comma separated names of pokemon loaded when the application starts
+    WARMUP_TOP_N: number of pokemon that fought the most battles loaded when the application starts
+    WARMUP_WORKERS: maximum number of pokemon loaded at once when the application starts
+"""
+
+import os
+
+POKEAPI_URL = os.environ.get('POKEAPI_URL', 'https://pokeapi.co/api/v2').rstrip('/')
+MOVE_FETCH_WORKERS = int(os.environ.get('MOVE_FETCH_WORKERS', 8))
+SPECIES_MEMORY_CACHE_SIZE = int(os.environ.get('SPECIES_MEMORY_CACHE_SIZE', 1024))
+SPECIES_CACHE_PATH = os.environ.get(
+    'SPECIES_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'species_cache.sqlite3'),
+)
+SPECIES_CACHE_TTL = float(os.environ.get('SPECIES_CACHE_TTL', 7 * 24 * 3600))
+SPECIES_CACHE_SIZE = int(os.environ.get('SPECIES_CACHE_SIZE', 2000))
+ODDS_DEFAULT_SAMPLES = int(os.environ.get('ODDS_DEFAULT_SAMPLES', 10000))
+ODDS_MAX_SAMPLES = int(os.environ.get('ODDS_MAX_SAMPLES', 1000000))
+TOURNAMENT_WORKERS = int(os.environ.get('TOURNAMENT_WORKERS', os.cpu_count() or 1))
+TOURNAMENT_MAX_ROSTER = int(os.environ.get('TOURNAMENT_MAX_ROSTER', 400))
+TOURNAMENT_DEFAULT_REPETITIONS = int(os.environ.get('TOURNAMENT_DEFAULT_REPETITIONS', 100))
+TOURNAMENT_MAX_REPETITIONS = int(os.environ.get('TOURNAMENT_MAX_REPETITIONS', 10000))
+MYSQL_HOST = os.environ.get('MYSQL_HOST', 'mysql_db')  # Docker container name for mysql
+MYSQL_USER = os.environ.get('MYSQL_USER', 'battle_user')
+MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD', 'battle_password')
+MYSQL_DB = os.environ.get('MYSQL_DB', 'battle_db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+BATTLE_WRITER_QUEUE_SIZE = int(os.environ.get('BATTLE_WRITER_QUEUE_SIZE', 10000))
+BATTLE_WRITER_BATCH_SIZE = int(os.environ.get('BATTLE_WRITER_BATCH_SIZE', 100))
+BATTLE_WRITER_FLUSH_INTERVAL = float(os.environ.get('BATTLE_WRITER_FLUSH_INTERVAL', 1.0))
+BATTLE_WRITER_RETRIES = int(os.environ.get('BATTLE_WRITER_RETRIES', 5))
+BATTLE_WRITER_RETRY_BACKOFF = float(os.environ.get('BATTLE_WRITER_RETRY_BACKOFF', 0.5))
+BATTLES_PAGE_SIZE = int(os.environ.get('BATTLES_PAGE_SIZE', 100))
+BATTLES_MAX_PAGE_SIZE = int(os.environ.get('BATTLES_MAX_PAGE_SIZE', 1000))
+BATTLES_STREAM_BATCH_SIZE = int(os.environ.get('BATTLES_STREAM_BATCH_SIZE', 500))
+BATTLES_BATCH_MAX_SIZE = int(os.environ.get('BATTLES_BATCH_MAX_SIZE', 1000))
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', 10))
+LEADERBOARD_MAX_SIZE = int(os.environ.get('LEADERBOARD_MAX_SIZE', 100))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.2))
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))
+HTTP_CACHE_SIZE = int(os.environ.get('HTTP_CACHE_SIZE', 5000))
+DATA_PACK_PATH = os.environ.get('DATA_PACK_PATH', '')
+SPECIES_NAMES_PATH = os.environ.get('SPECIES_NAMES_PATH', '')
+NAME_INDEX_TTL = float(os.environ.get('NAME_INDEX_TTL', 24 * 3600))
+NAME_INDEX_RETRY = float(os.environ.get('NAME_INDEX_RETRY', 60))
+NEGATIVE_CACHE_TTL = float(os.environ.get('NEGATIVE_CACHE_TTL', 300))
+NEGATIVE_CACHE_SIZE = int(os.environ.get('NEGATIVE_CACHE_SIZE', 10000))
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', '1') != '0'
+WARMUP_SPECIES = os.environ.get('WARMUP_SPECIES', '')
+WARMUP_TOP_N = int(os.environ.get('WARMUP_TOP_N', 100))
+WARMUP_WORKERS = int(os.environ.get('WARMUP_WORKERS', 4))
@@ -0,0 +1,367 @@
+"""Battle database
+
+This module manages the connections to the battles database and the writing of battle logs
+Connections are taken from a pool instead of being opened for every request
+Battle logs are queued and written by a background thread with multi-row inserts,
+so storing a battle does not wait for the database
+The wins, losses, draws and remaining hitpoints of each species are added to the species_stats table
+in the same transaction as the battles, so the leaderboard never has to scan the battles
+The time waited for a connection and the time spent writing batches are recorded in metrics.py
+
+Classes:
+    Database: A pool of connections to the battles database
+    BattleLogWriter: A background writer storing queued battles in batches
+
+Functions:
+    insert_battles: inserts battles with a single multi-row insert
+    insert_battles_statement: returns the multi-row insert of some battles
+    species_stats_deltas: adds up the results of battles for each species
+    upsert_species_stats: adds results to the species_stats table with a single multi-row upsert
+    upsert_species_stats_statement: returns the multi-row upsert of some species results
+    record_battles: inserts battles and adds their results to the species_stats table
+    record_battles_statements: returns the statements inserting battles and adding their results
+    get_database: returns the database configured in config.py
+    get_battle_writer: returns the running battle writer of the process
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+import mysql.connector
+from mysql.connector import pooling
+import config
+from metrics import BATTLES_DROPPED, DB_CONNECTION_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+# A battle is stored as what it takes to replay it and its packed turn events, the log is rendered from them
+BATTLE_COLUMNS = ('winner', 'pokemon1', 'pokemon2', 'seed', 'data_version', 'events', 'remaining_hp1', 'remaining_hp2')
+# The remaining hitpoints average is remaining_hp_total / remaining_hp_count
+SPECIES_STATS_COLUMNS = ('species', 'battles', 'wins', 'losses', 'draws', 'remaining_hp_total', 'remaining_hp_count')
+
+class Database:
+    """A pool of connections to the battles database
+
+    Args:
+        connect (callable): returns a connection, closing it must give it back to the pool
+        pool_size (int): maximum number of connections used at the same time
+        placeholder (str): parameter placeholder of the database driver, %s for mysql and ? for sqlite
+        dialect (str): sql dialect of the database, mysql or sqlite
+        connect_dedicated (callable): opens a connection outside of the pool, closing it disconnects it.
+            Defaults to connect
+
+    Functions:
+        connection() -> context manager
+        dedicated_connection() -> context manager
+    """
+
+    def __init__(self, connect, pool_size=5, placeholder='%s', dialect='mysql', connect_dedicated=None):
+        self._connect = connect
+        self._connect_dedicated = connect_dedicated or connect
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.placeholder = placeholder
+        self.dialect = dialect
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection, waiting for one to be free if they are all in use"""
+
+        start = time.perf_counter()
+        with self._slots:
+            conn = self._connect()
+            DB_CONNECTION_SECONDS.observe(time.perf_counter() - start)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    @contextmanager
+    def dedicated_connection(self):
+        """Opens a connection outside of the pool for a long read, like a stream a client may leave at any time
+
+        It takes no slot from the pool and is disconnected after use, so rows left unread never reach a pooled connection
+        """
+
+        conn = self._connect_dedicated()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+def insert_battles(database, conn, rows):
+    """Inserts battles with a single multi-row insert
+
+    Args:
+        database (Database): the database of the connection
+        conn (connection): an open connection
+        rows (list<tuple>): values of BATTLE_COLUMNS for each battle
+    """
+
+    cursor = conn.cursor()
+    cursor.execute(*insert_battles_statement(database, rows))
+    cursor.close()
+
+def insert_battles_statement(database, rows):
+    """Returns the multi-row insert of some battles
+
+    Args:
+        database (Database): the database the statement is for
+        rows (list<tuple>): values of BATTLE_COLUMNS for each battle
+
+    Returns:
+        tuple: A tuple with the statement and its parameters
+    """
+
+    row_placeholders = f"({', '.join([database.placeholder] * len(BATTLE_COLUMNS))})"
+    return (
+        f"INSERT INTO battles ({', '.join(BATTLE_COLUMNS)}) VALUES {', '.join([row_placeholders] * len(rows))}",
+        [value for row in rows for value in row],
+    )
+
+def species_stats_deltas(results):
+    """Adds up the results of battles for each species
+
+    Args:
+        results (iterable<tuple>): for each battle the names of both pokemon, the outcome, 1 if the first pokemon won,
+            -1 if the second one did, 0 for a draw or None when unknown, and the remaining hitpoints of both, None when unknown
+
+    Returns:
+        dict: dict with species names as keys and lists with the values of SPECIES_STATS_COLUMNS after species as values
+    """
+
+    deltas = {}
+    for pokemon1, pokemon2, outcome, remaining_hp1, remaining_hp2 in results:
+        outcomes = (outcome, None if outcome is None else -outcome)
+        for name, outcome, remaining_hp in ((pokemon1, outcomes[0], remaining_hp1), (pokemon2, outcomes[1], remaining_hp2)):
+            delta = deltas.setdefault(name.lower(), [0, 0, 0, 0, 0, 0])
+            delta[0] += 1
+            if outcome is not None:
+                # wins, losses or draws
+                delta[{1: 1, -1: 2, 0: 3}[outcome]] += 1
+            if remaining_hp is not None:
+                delta[4] += max(remaining_hp, 0)
+                delta[5] += 1
+    return deltas
+
+def upsert_species_stats(database, conn, deltas):
+    """Adds results to the species_stats table with a single multi-row upsert
+
+    Species are written in name order, so concurrent writers lock their rows in the same order
+
+    Args:
+        database (Database): the database of the connection
+        conn (connection): an open connection
+        deltas (dict): results of each species, see species_stats_deltas
+    """
+
+    if not deltas:
+        return
+    cursor = conn.cursor()
+    cursor.execute(*upsert_species_stats_statement(database, deltas))
+    cursor.close()
+
+def upsert_species_stats_statement(database, deltas):
+    """Returns the multi-row upsert of some species results, in the dialect of the database
+
+    Args:
+        database (Database): the database the statement is for
+        deltas (dict): results of each species, see species_stats_deltas, at least one
+
+    Returns:
+        tuple: A tuple with the statement and its parameters
+    """
+
+    counters = SPECIES_STATS_COLUMNS[1:]
+    if database.dialect == 'mysql':
+        update = ', '.join(f"{column} = {column} + VALUES({column})" for column in counters)
+        conflict = f"ON DUPLICATE KEY UPDATE {update}"
+    else:
+        update = ', '.join(f"{column} = {column} + excluded.{column}" for column in counters)
+        conflict = f"ON CONFLICT (species) DO UPDATE SET {update}"
+
+    row_placeholders = f"({', '.join([database.placeholder] * len(SPECIES_STATS_COLUMNS))})"
+    return (
+        f"INSERT INTO species_stats ({', '.join(SPECIES_STATS_COLUMNS)}) "
+        f"VALUES {', '.join([row_placeholders] * len(deltas))} {conflict}",
+        [value for species in sorted(deltas) for value in [species, *deltas[species]]],
+    )
+
+def record_battles(database, conn, rows):
+    """Inserts battles and adds their results to the species_stats table, the caller commits both
+
+    Args:
+        database (Database): the database of the connection
+        conn (connection): an open connection
+        rows (list<tuple>): values of BATTLE_COLUMNS for each battle
+    """
+
+    cursor = conn.cursor()
+    for statement in record_battles_statements(database, rows):
+        cursor.execute(*statement)
+    cursor.close()
+
+def record_battles_statements(database, rows):
+    """Returns the statements inserting battles and adding their results to the species_stats table
+
+    Args:
+        database (Database): the database the statements are for
+        rows (list<tuple>): values of BATTLE_COLUMNS for each battle
+
+    Returns:
+        list<tuple>: the statements and their parameters, to run in this order in a single transaction
+    """
+
+    columns = [BATTLE_COLUMNS.index(column) for column in ('pokemon1', 'pokemon2', 'remaining_hp1', 'remaining_hp2')]
+    results = []
+    for row in rows:
+        pokemon1, pokemon2, remaining_hp1, remaining_hp2 = (row[index] for index in columns)
+        # The pokemon with the most hitpoints left wins
+        outcome = (remaining_hp1 > remaining_hp2) - (remaining_hp1 < remaining_hp2)
+        results.append((pokemon1, pokemon2, outcome, remaining_hp1, remaining_hp2))
+    return [insert_battles_statement(database, rows), upsert_species_stats_statement(database, species_stats_deltas(results))]
+
+class BattleLogWriter:
+    """A background writer storing queued battles in batches
+
+    Battles are written when batch_size of them are queued or flush_interval seconds after the first one was queued,
+    together with the results of their species
+    The queue is bounded, when it is full submit waits for room and fails after put_timeout seconds
+    A batch that can not be written is retried with exponential backoff while the next battles wait in the queue,
+    it is dropped after the last retry and counted in pokemon_battles_dropped_total
+
+    Atribues:
+        database(Database): the database battles are written to
+        batch_size(int): maximum number of battles written by one insert
+        flush_interval(float): maximum seconds a battle waits in the queue
+        put_timeout(float): maximum seconds submit waits for room in the queue
+        retries(int): number of times a batch is retried
+        retry_backoff(float): seconds waited before the first retry, doubled on every retry
+
+    Functions:
+        start()
+        submit(tuple)
+        close()
+    """
+
+    _STOP = object()
+
+    def __init__(self, database, max_queue=10000, batch_size=100, flush_interval=1.0, put_timeout=5.0, retries=5, retry_backoff=0.5):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+
+    def start(self):
+        """Starts the writer thread"""
+
+        self._thread = threading.Thread(target=self._run, name='battle-log-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, row):
+        """Queues a battle to be written
+
+        Args:
+            row (tuple): values of BATTLE_COLUMNS for the battle
+
+        Raises:
+            queue.Full: when the queue stays full for put_timeout seconds
+        """
+
+        self._queue.put(row, timeout=self.put_timeout)
+
+    def close(self):
+        """Writes the queued battles and stops the writer thread"""
+
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            row = self._queue.get()
+            if row is self._STOP:
+                break
+
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is self._STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                self._write(batch)
+                return
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("Could not store %d battles in database, they are dropped", len(batch))
+                    BATTLES_DROPPED.inc(len(batch))
+                    return
+                logger.warning("Could not store %d battles in database, retrying", len(batch), exc_info=True)
+            time.sleep(self.retry_backoff * 2 ** attempt)
+
+    @timed('db_write')
+    def _write(self, batch):
+        with self.database.connection() as conn:
+            record_battles(self.database, conn, batch)
+            conn.commit()
+
+@lru_cache(maxsize=1)
+def get_database():
+    """Returns the mysql database configured in config.py
+
+    Returns:
+        Database: the database with a pool of mysql connections
+    """
+
+    settings = {
+        'host': config.MYSQL_HOST,
+        'user': config.MYSQL_USER,
+        'password': config.MYSQL_PASSWORD,
+        'database': config.MYSQL_DB,
+    }
+    pool = pooling.MySQLConnectionPool(pool_name='battles', pool_size=config.DB_POOL_SIZE, **settings)
+    return Database(pool.get_connection, config.DB_POOL_SIZE, connect_dedicated=lambda: mysql.connector.connect(**settings))
+
+@lru_cache(maxsize=1)
+def get_battle_writer():
+    """Returns the running battle writer of the process, it is flushed when the process exits
+
+    Returns:
+        BattleLogWriter: the battle writer
+    """
+
+    writer = BattleLogWriter(
+        get_database(),
+        max_queue=config.BATTLE_WRITER_QUEUE_SIZE,
+        batch_size=config.BATTLE_WRITER_BATCH_SIZE,
+        flush_interval=config.BATTLE_WRITER_FLUSH_INTERVAL,
+        retries=config.BATTLE_WRITER_RETRIES,
+        retry_backoff=config.BATTLE_WRITER_RETRY_BACKOFF,
+    ).start()
+    atexit.register(writer.close)
+    return writer
@@ -0,0 +1,322 @@
+"""Offline data pack
+
+This module compiles a local PokeAPI json dump into a single compact binary file and reads it back
+The pack holds the type chart, the move table and the stats, types and damaging move candidates of every pokemon
+in fixed width records, with a sorted name -> offset index to find a pokemon by binary search
+The file is memory mapped, so loading is near instant, lookups only unpack the records they read
+and every worker process on a host shares the same physical pages
+
+Build a pack from a dump laid out like PokeAPI/api-data (<dump>/pokemon/<id>/index.json, move/..., type/...):
+
+    python datapack.py <dump_dir> <output_file>
+
+Classes:
+    DataPack: A memory mapped data pack
+
+Functions:
+    build_data_pack: compiles a PokeAPI json dump into a data pack
+    get_data_pack: returns the data pack configured in config.py
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from functools import lru_cache
+import config
+
+MAGIC = b'PKMNPACK'
+VERSION = 1
+NAME_SIZE = 32
+
+# magic, version, then the offsets and counts of the sections
+HEADER = struct.Struct('<8sI10I')
+# name, PokeAPI id
+TYPE_RECORD = struct.Struct(f'<{NAME_SIZE}sH')
+# name, PokeAPI id, power (0 for moves without power), type index, damage class id
+MOVE_RECORD = struct.Struct(f'<{NAME_SIZE}sHHBB')
+# name, PokeAPI id, height, weight, hp, attack, defense, special-attack, special-defense, speed,
+# first type index, second type index, offset and count of the move candidates
+SPECIES_RECORD = struct.Struct(f'<{NAME_SIZE}sHHH6HBBIH')
+# name, offset of the species record
+INDEX_RECORD = struct.Struct(f'<{NAME_SIZE}sI')
+# move record number
+CANDIDATE_RECORD = struct.Struct('<H')
+
+STATS = ('hp', 'attack', 'defense', 'special-attack', 'special-defense', 'speed')
+DAMAGE_CLASSES = {1: 'status', 2: 'physical', 3: 'special'}
+DAMAGE_CLASSES_IDS = {name: damage_class_id for damage_class_id, name in DAMAGE_CLASSES.items()}
+NO_TYPE = 255
+# Type chart multipliers are stored as multiplier * 4 in one byte
+CHART_SCALE = 4
+
+class DataPack:
+    """A memory mapped data pack
+
+    Atribues:
+        path(str): path of the pack file
+        type_names(tuple<str>): names of the types in the pack, in type index order
+
+    Functions:
+        species_data(str) -> dict
+        species_names() -> list<str>
+        type_chart() -> tuple
+        close()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version,
+         self._types_offset, self._type_count, self._chart_offset,
+         self._moves_offset, self._move_count,
+         self._species_offset, self._species_count,
+         self._index_offset, self._candidates_offset, _) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} data pack')
+
+        self._types = tuple(
+            TYPE_RECORD.unpack_from(self._mmap, self._types_offset + i * TYPE_RECORD.size)
+            for i in range(self._type_count)
+        )
+        self.type_names = tuple(decode_name(name) for name, _ in self._types)
+
+        count = self._type_count
+        chart = self._mmap[self._chart_offset:self._chart_offset + count * count]
+        self._type_chart = (
+            {name: index for index, name in enumerate(self.type_names)},
+            tuple(
+                tuple(value / CHART_SCALE for value in chart[row * count:(row + 1) * count])
+                for row in range(count)
+            ),
+        )
+
+    def close(self):
+        """Unmaps the pack file"""
+        self._mmap.close()
+
+    def _find(self, name):
+        """Finds the offset of a species record by binary search over the name index"""
+
+        key = encode_name(name.lower())
+        low, high = 0, self._species_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_name, offset = INDEX_RECORD.unpack_from(self._mmap, self._index_offset + middle * INDEX_RECORD.size)
+            if entry_name < key:
+                low = middle + 1
+            elif entry_name > key:
+                high = middle
+            else:
+                return offset
+        return None
+
+    def _type(self, index):
+        """Returns the name and url of a type"""
+
+        name, type_id = self._types[index]
+        return {'name': decode_name(name), 'url': f"{config.POKEAPI_URL}/type/{type_id}/"}
+
+    def _move(self, number):
+        """Returns the name and info of a move record"""
+
+        name, _, power, type_index, damage_class = MOVE_RECORD.unpack_from(
+            self._mmap, self._moves_offset + number * MOVE_RECORD.size)
+        return decode_name(name), {
+            'damage_class': {
+                'name': DAMAGE_CLASSES.get(damage_class, 'status'),
+                'url': f"{config.POKEAPI_URL}/move-damage-class/{damage_class}/",
+            },
+            'type': self._type(type_index),
+            'power': power or None,
+        }
+
+    def species_data(self, name, move_limit=4):
+        """Returns the data of a pokemon
+
+        Args:
+            name (str): name of the pokemon
+            move_limit (int): maximum number of moves returned
+
+        Returns:
+            dict: dict with the pokemon types, stats and first damaging moves, like the species cache, or None if the pokemon is not in the pack
+        """
+
+        offset = self._find(name)
+        if offset is None:
+            return None
+
+        record = SPECIES_RECORD.unpack_from(self._mmap, offset)
+        _, _, height, weight = record[:4]
+        base_stats = record[4:10]
+        type1, type2, candidates_offset, candidates_count = record[10:]
+
+        stats = {'Height': height / 10.0, 'Weight': weight / 10.0}
+        stats.update(zip(STATS, base_stats))
+        types = [self._type(index)['name'] for index in (type1, type2) if index != NO_TYPE]
+        moves = dict(
+            self._move(CANDIDATE_RECORD.unpack_from(self._mmap, candidates_offset + i * CANDIDATE_RECORD.size)[0])
+            for i in range(min(candidates_count, move_limit))
+        )
+        return {'types': types, 'stats': stats, 'moves': moves}
+
+    def species_names(self):
+        """Returns the names of every pokemon in the pack
+
+        Returns:
+            list<str>: the names, sorted
+        """
+
+        return [
+            decode_name(INDEX_RECORD.unpack_from(self._mmap, self._index_offset + i * INDEX_RECORD.size)[0])
+            for i in range(self._species_count)
+        ]
+
+    def type_chart(self):
+        """Returns the type chart of the pack
+
+        Returns:
+            tuple: A tuple with a dict mapping each type name to its index and the matrix as a tuple of rows, like type_chart.load_type_chart
+        """
+
+        return self._type_chart
+
+def encode_name(name):
+    """Encodes a name in a fixed width field"""
+
+    encoded = name.encode('utf-8')
+    if len(encoded) > NAME_SIZE:
+        raise ValueError(f'{name} is longer than {NAME_SIZE} bytes')
+    return encoded.ljust(NAME_SIZE, b'\0')
+
+def decode_name(field):
+    """Decodes a name from a fixed width field"""
+    return field.rstrip(b'\0').decode('utf-8')
+
+def read_endpoint(dump_dir, endpoint):
+    """Reads every resource of an endpoint of a PokeAPI json dump
+
+    Args:
+        dump_dir (str): the dump directory, holding one directory per endpoint
+        endpoint (str): name of the endpoint (pokemon, move, type)
+
+    Returns:
+        list<dict>: the resources sorted by id
+    """
+
+    endpoint_dir = os.path.join(dump_dir, endpoint)
+    resources = []
+    for entry in os.listdir(endpoint_dir):
+        path = os.path.join(endpoint_dir, entry, 'index.json')
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as file:
+                resources.append(json.load(file))
+    return sorted(resources, key=lambda resource: resource['id'])
+
+def build_data_pack(dump_dir, output):
+    """Compiles a PokeAPI json dump into a data pack
+
+    Args:
+        dump_dir (str): the dump directory, holding pokemon, move and type directories with one <id>/index.json per resource
+        output (str): path of the pack file to write
+
+    Returns:
+        dict: dict with the number of types, moves and pokemon written
+    """
+
+    types = read_endpoint(dump_dir, 'type')
+    moves = read_endpoint(dump_dir, 'move')
+    species = read_endpoint(dump_dir, 'pokemon')
+    type_index = {type_data['name']: index for index, type_data in enumerate(types)}
+    move_index = {move['name']: index for index, move in enumerate(moves)}
+
+    type_records = b''.join(TYPE_RECORD.pack(encode_name(t['name']), t['id']) for t in types)
+
+    chart = bytearray([CHART_SCALE] * (len(types) * len(types)))
+    for row, type_data in enumerate(types):
+        relations = type_data.get('damage_relations', {})
+        for relation, multiplier in (('double_damage_to', 2.0), ('half_damage_to', 0.5), ('no_damage_to', 0.0)):
+            for defender_type in relations.get(relation, []):
+                if defender_type['name'] in type_index:
+                    chart[row * len(types) + type_index[defender_type['name']]] = int(multiplier * CHART_SCALE)
+
+    move_records = b''.join(
+        MOVE_RECORD.pack(
+            encode_name(move['name']), move['id'], move['power'] or 0,
+            type_index[move['type']['name']], DAMAGE_CLASSES_IDS.get(move['damage_class']['name'], 1),
+        )
+        for move in moves
+    )
+
+    # Moves with power of each pokemon, in its listed order
+    candidates = []
+    species_candidates = []
+    for pokemon in species:
+        start = len(candidates)
+        for move in pokemon['moves']:
+            number = move_index.get(move['move']['name'])
+            if number is not None and moves[number]['power']:
+                candidates.append(number)
+        species_candidates.append((start, len(candidates) - start))
+
+    header_size = HEADER.size
+    types_offset = header_size
+    chart_offset = types_offset + len(type_records)
+    moves_offset = chart_offset + len(chart)
+    species_offset = moves_offset + len(move_records)
+    index_offset = species_offset + len(species) * SPECIES_RECORD.size
+    candidates_offset = index_offset + len(species) * INDEX_RECORD.size
+
+    species_records = []
+    index = []
+    for number, (pokemon, (start, count)) in enumerate(zip(species, species_candidates)):
+        stats = {stat['stat']['name']: stat['base_stat'] for stat in pokemon['stats']}
+        pokemon_types = [type_index[t['type']['name']] for t in sorted(pokemon['types'], key=lambda t: t['slot'])]
+        pokemon_types = (pokemon_types + [NO_TYPE, NO_TYPE])[:2]
+        species_records.append(SPECIES_RECORD.pack(
+            encode_name(pokemon['name']), pokemon['id'], pokemon['height'], pokemon['weight'],
+            *(stats.get(stat, 0) for stat in STATS),
+            *pokemon_types,
+            candidates_offset + start * CANDIDATE_RECORD.size, count,
+        ))
+        index.append((encode_name(pokemon['name']), species_offset + number * SPECIES_RECORD.size))
+    index.sort()
+
+    with open(output, 'wb') as file:
+        file.write(HEADER.pack(
+            MAGIC, VERSION,
+            types_offset, len(types), chart_offset,
+            moves_offset, len(moves),
+            species_offset, len(species),
+            index_offset, candidates_offset, len(candidates),
+        ))
+        file.write(type_records)
+        file.write(chart)
+        file.write(move_records)
+        file.write(b''.join(species_records))
+        file.write(b''.join(INDEX_RECORD.pack(name, offset) for name, offset in index))
+        file.write(b''.join(CANDIDATE_RECORD.pack(number) for number in candidates))
+
+    return {'types': len(types), 'moves': len(moves), 'pokemon': len(species)}
+
+@lru_cache(maxsize=1)
+def get_data_pack():
+    """Returns the data pack configured in config.py
+
+    Returns:
+        DataPack: the memory mapped data pack or None if DATA_PACK_PATH is empty
+    """
+
+    if not config.DATA_PACK_PATH:
+        return None
+    return DataPack(config.DATA_PACK_PATH)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compiles a local PokeAPI json dump into a data pack")
+    parser.add_argument('dump_dir', help="directory holding the pokemon, move and type directories of the dump")
+    parser.add_argument('output', help="path of the data pack to write")
+    arguments = parser.parse_args()
+    print(build_data_pack(arguments.dump_dir, arguments.output))
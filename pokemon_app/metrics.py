@@ -0,0 +1,252 @@
+"""Metrics
+
+This module keeps the counters and latency histograms of the application and renders them in the Prometheus text format
+Updating a metric only takes a lock and an addition, so the instrumentation can stay on in production
+Metrics are kept per process
+
+Classes:
+    Counter: A monotonically increasing count
+    FunctionCounter: A count read from a function when the metrics are rendered
+    Histogram: A distribution of observed values in cumulative buckets
+    Registry: The metrics rendered together
+
+Functions:
+    timed: decorator timing a function as a phase of the requests
+    render: renders every registered metric in the Prometheus text format
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds in seconds of the latency buckets, from half a millisecond to ten seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Registry:
+    """The metrics rendered together
+
+    Functions:
+        register(object)
+        render() -> str
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """Adds a metric to the rendered ones"""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Renders every metric in the Prometheus text format
+
+        Returns:
+            str: the metrics, one sample per line
+        """
+
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+class _Metric:
+    """A metric with children for each combination of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """Returns the child of some label values, callers updating it often should keep it
+
+        Args:
+            *values (str): the label values, in the order of labelnames
+
+        Returns:
+            object: the child metric
+        """
+
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} has labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _label_string(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """A monotonically increasing count
+
+    Functions:
+        labels(*str) -> child with inc(amount)
+        inc(amount)
+    """
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """Increases the count of a metric without labels"""
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [f"{self.name}{self._label_string(values)} {child.value}" for values, child in self._items()]
+
+class FunctionCounter(_Metric):
+    """A count read from a function when the metrics are rendered, for counts another component already keeps
+
+    Args:
+        function (callable): returns a dict mapping tuples of label values to counts
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames, function, registry=REGISTRY):
+        self.function = function
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self):
+        return [f"{self.name}{self._label_string(values)} {value}" for values, value in self.function().items()]
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Histogram(_Metric):
+    """A distribution of observed values in cumulative buckets
+
+    Args:
+        buckets (tuple<float>): sorted upper bounds of the buckets, an infinite bucket is added
+
+    Functions:
+        labels(*str) -> child with observe(value) and time()
+        observe(float)
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Observes a value of a metric without labels"""
+        self.labels().observe(value)
+
+    def samples(self):
+        lines = []
+        for values, child in self._items():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{self._label_string(values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_string(values)} {total}")
+            lines.append(f"{self.name}_count{self._label_string(values)} {cumulative}")
+        return lines
+
+PHASE_SECONDS = Histogram(
+    'pokemon_phase_seconds',
+    "Seconds spent in each phase of the requests, simulation includes the type multiplier lookups",
+    ('phase',),
+)
+REQUEST_SECONDS = Histogram('pokemon_request_seconds', "Seconds spent serving each route", ('route',))
+CACHE_LOOKUPS = Counter('pokemon_cache_lookups_total', "Lookups of each cache by result", ('cache', 'result'))
+DB_CONNECTION_SECONDS = Histogram('pokemon_db_connection_seconds', "Seconds waited to get a database connection")
+BATTLES_DROPPED = Counter('pokemon_battles_dropped_total', "Battles that could not be stored after every retry")
+BATTLES_DROPPED.inc(0)
+
+def timed(phase):
+    """Decorator timing a function as a phase of the requests
+
+    Args:
+        phase (str): label of the phase in pokemon_phase_seconds
+
+    Returns:
+        callable: the decorator
+    """
+
+    child = PHASE_SECONDS.labels(phase)
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def render():
+    """Renders every registered metric in the Prometheus text format
+
+    Returns:
+        str: the metrics
+    """
+
+    return REGISTRY.render()
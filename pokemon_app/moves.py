@@ -0,0 +1,264 @@
+"""Move index
+
+This module keeps a process wide index of pokemon moves keyed by move name
+Each move holds its power, type and damage class and is fetched from PokeAPI at most once,
+the first time any pokemon needs it. Moves can also be added in bulk
+Moves of a new pokemon can be fetched in parallel by a bounded thread pool
+Loaders fetching moves another way, like the async server, go through find_move and index_move
+
+Classes:
+    MovePicker: Picks the first moves with attacking power of a pokemon in the listed order
+
+Functions:
+    get_move: returns a move from the index, fetching it from PokeAPI if it is missing
+    find_move: returns a move from the index without fetching it
+    index_move: adds a fetched move to the index
+    missing_moves: returns the moves missing from the index
+    fetch_move: fetches a move from PokeAPI
+    move_info: keeps the fields of a move used by battles
+    add_moves: adds moves to the index in bulk
+    damaging_moves: filters the moves with attacking power out of a list of move names
+    resolve_moves: finds the first moves with attacking power of a pokemon, fetching missing moves in parallel
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import config
+from pokeapi_client import get_json
+from singleflight import SingleFlight
+from metrics import CACHE_LOOKUPS
+
+# Move name -> {'damage_class': dict, 'type': dict, 'power': int or None}
+_move_index = {}
+_move_flight = SingleFlight()
+_move_hits = CACHE_LOOKUPS.labels('moves', 'hit')
+_move_misses = CACHE_LOOKUPS.labels('moves', 'miss')
+
+def get_move(move_name, move_url):
+    """Returns a move from the index, fetching it from PokeAPI if it is missing
+
+    Args:
+        move_name (str): name of the move
+        move_url (str): PokeAPI url of the move
+
+    Returns:
+        dict: dict with the move damage class, type and power
+    """
+
+    move = _move_index.get(move_name)
+    if move is None:
+        _move_misses.inc()
+        # Concurrent requests of a missing move wait for a single fetch
+        move = _move_flight.do(move_name, _fetch_and_index, move_name, move_url)
+    else:
+        _move_hits.inc()
+    return move
+
+def _fetch_and_index(move_name, move_url):
+    """Fetches a move and adds it to the index"""
+
+    move = _move_index.get(move_name)
+    if move is None:
+        move = index_move(move_name, fetch_move(move_url))
+    return move
+
+def find_move(move_name):
+    """Returns a move from the index without fetching it
+
+    Args:
+        move_name (str): name of the move
+
+    Returns:
+        dict: dict with the move damage class, type and power, None if the move is missing
+    """
+
+    return _move_index.get(move_name)
+
+def index_move(move_name, move):
+    """Adds a fetched move to the index, the move already indexed is kept if another fetch added it first
+
+    Args:
+        move_name (str): name of the move
+        move (dict): dict with the move damage class, type and power, see move_info
+
+    Returns:
+        dict: the indexed move
+    """
+
+    return _move_index.setdefault(move_name, move)
+
+def missing_moves(move_refs):
+    """Returns the moves missing from the index
+
+    Args:
+        move_refs (list<tuple>): list with the (name, url) of moves
+
+    Returns:
+        list<tuple>: the (name, url) of the moves that are not in the index
+    """
+
+    return [(name, url) for name, url in move_refs if name not in _move_index]
+
+def fetch_move(move_url):
+    """Fetches a move from PokeAPI
+
+    Args:
+        move_url (str): PokeAPI url of the move
+
+    Raises:
+        requests.exceptions.RequestException: when PokeAPI can not be reached or returns an error
+
+    Returns:
+        dict: dict with the move damage class, type and power
+    """
+
+    return move_info(get_json(move_url))
+
+def move_info(data):
+    """Keeps the fields of a move used by battles
+
+    Args:
+        data (dict): the PokeAPI data of the move
+
+    Returns:
+        dict: dict with the move damage class, type and power
+    """
+
+    return {
+        'damage_class': data['damage_class'],
+        'type': data['type'],
+        'power': data['power'],
+    }
+
+def add_moves(moves):
+    """Adds moves to the index in bulk
+
+    Args:
+        moves (dict): dict with move names as keys and dicts with the move damage class, type and power as values
+    """
+
+    _move_index.update(moves)
+
+def damaging_moves(move_names, limit=4):
+    """Filters the moves with attacking power out of a list of move names
+
+    Only moves already in the index are considered
+
+    Args:
+        move_names (list<str>): names of the moves in the order they should be picked
+        limit (int): maximum number of moves to return
+
+    Returns:
+        dict: dict with up to limit move names and their info
+    """
+
+    moves = {}
+    for move_name in move_names:
+        move = _move_index.get(move_name)
+        if move is not None and is_damaging(move):
+            moves[move_name] = move
+            if len(moves) == limit:
+                break
+    return moves
+
+def is_damaging(move):
+    """Checks if a move has attacking power
+
+    Args:
+        move (dict): dict with the move damage class, type and power
+
+    Returns:
+        bool: True if the move does damage
+    """
+
+    return move['power'] is not None and move['power'] > 0
+
+class MovePicker:
+    """Picks the first moves with attacking power of a pokemon in the listed order
+
+    Atribues:
+        limit(int): maximum number of moves picked
+
+    Functions:
+        add(str, dict) -> bool
+        moves() -> dict
+    """
+
+    def __init__(self, limit=4):
+        self.limit = limit
+        self._names = []
+        self._damaging = 0
+
+    def add(self, move_name, move):
+        """Adds the next move of the list
+
+        Args:
+            move_name (str): name of the move
+            move (dict): dict with the move damage class, type and power
+
+        Returns:
+            bool: True once limit moves with power are picked, the next moves are not needed
+        """
+
+        self._names.append(move_name)
+        if is_damaging(move):
+            self._damaging += 1
+        return self._damaging == self.limit
+
+    def moves(self):
+        """Returns the moves picked
+
+        Returns:
+            dict: dict with up to limit move names and their info
+        """
+
+        return damaging_moves(self._names, self.limit)
+
+def resolve_moves(move_refs, limit=4, max_workers=None):
+    """Finds the first moves with attacking power in the listed order of the moves
+
+    Moves missing from the index are fetched in parallel by a thread pool of max_workers threads
+    Moves are still picked in the listed order, so the result is the same as fetching them one by one
+    As soon as the first limit moves with power are known the remaining fetches are cancelled
+
+    Args:
+        move_refs (list<tuple>): list with the (name, url) of every move in the listed order
+        limit (int): maximum number of moves to return
+        max_workers (int): number of moves fetched in parallel, defaults to config.MOVE_FETCH_WORKERS
+
+    Raises:
+        requests.exceptions.RequestException: when a move can not be fetched from PokeAPI
+
+    Returns:
+        dict: dict with up to limit move names and their info
+    """
+
+    if max_workers is None:
+        max_workers = config.MOVE_FETCH_WORKERS
+
+    missing = missing_moves(move_refs)
+    if max_workers <= 1 or len(missing) <= 1:
+        return _resolve_serially(move_refs, limit)
+
+    picker = MovePicker(limit)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {name: executor.submit(get_move, name, url) for name, url in missing}
+    try:
+        for name, _ in move_refs:
+            if picker.add(name, pending[name].result() if name in pending else _move_index[name]):
+                break
+    finally:
+        # Cancel the fetches that are not needed anymore, running ones still fill the index
+        for future in pending.values():
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return picker.moves()
+
+def _resolve_serially(move_refs, limit):
+    """Fetches the moves one by one until the first limit moves with power are found"""
+
+    picker = MovePicker(limit)
+    for name, url in move_refs:
+        if picker.add(name, get_move(name, url)):
+            break
+    return picker.moves()
@@ -0,0 +1,140 @@
+"""Battle odds
+
+This module estimates how likely a pokemon is to beat another by simulating many battles at once
+Every battle follows the rules of the /battle route and Pokemon.attack: the faster pokemon attacks first,
+moves are picked at random, damage varies randomly, type advantages apply
+and the pokemon with the highest remaining hitpoints after 6 turns wins
+The battles are simulated as NumPy arrays, one element per battle, instead of one Python loop per battle
+
+Functions:
+    simulate_battles: simulates n battles between two species and returns the remaining hitpoints and damage dealt
+    simulate_odds: simulates n battles between two species and returns the win, loss and draw probabilities
+    move_tables: returns the base damage and type multiplier of each move of an attacker against a defender
+    summarize: returns a summary of a distribution
+"""
+
+import numpy as np
+from pokemon import BATTLE_TURNS, DAMAGE_ROLL, calculate_base_damage
+from type_chart import get_damage_multiplier
+
+def move_tables(attacker, defender):
+    """Returns the base damage and type multiplier of each move of an attacker against a defender
+
+    Args:
+        attacker (Species): the attacking species
+        defender (Species): the defending species
+
+    Returns:
+        tuple: A tuple with an array of base damages and an array of type multipliers
+    """
+
+    moves = list(attacker.moves.values())
+    base_damage = np.array([
+        calculate_base_damage(move['power'], attacker.stats['attack'], defender.stats['defense'])
+        for move in moves
+    ])
+    multiplier = np.array([
+        get_damage_multiplier(move['type']['name'], defender.types)
+        for move in moves
+    ])
+    return base_damage, multiplier
+
+def simulate_battles(species1, species2, n, rng=None):
+    """Simulates n battles between two species
+
+    Args:
+        species1 (Species): the first pokemon
+        species2 (Species): the second pokemon
+        n (int): number of battles to simulate
+        rng (numpy.random.Generator): random generator, a new one is created if None
+
+    Returns:
+        tuple: A tuple with the remaining hitpoints of each pokemon and the damage dealt by each pokemon, one array element per battle
+    """
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    species = (species1, species2)
+    tables = (move_tables(species1, species2), move_tables(species2, species1))
+    hp = [np.full(n, s.stats['hp'], dtype=np.int64) for s in species]
+    damage_dealt = [np.zeros(n, dtype=np.int64) for _ in species]
+
+    # Decide who attacks first in each battle, at random if speeds are equal
+    if species1.stats['speed'] > species2.stats['speed']:
+        first_attacks = np.ones(n, dtype=bool)
+    elif species1.stats['speed'] < species2.stats['speed']:
+        first_attacks = np.zeros(n, dtype=bool)
+    else:
+        first_attacks = rng.random(n) < 0.5
+
+    over = np.zeros(n, dtype=bool)
+    for turn in range(BATTLE_TURNS):
+        pokemon1_attacks = first_attacks if turn % 2 == 0 else ~first_attacks
+        for side, attacking in ((0, pokemon1_attacks), (1, ~pokemon1_attacks)):
+            battles = np.flatnonzero(attacking & ~over)
+            if battles.size == 0:
+                continue
+
+            base_damage, multiplier = tables[side]
+            move = rng.integers(len(base_damage), size=battles.size)
+            damage = base_damage[move] * rng.uniform(*DAMAGE_ROLL, size=battles.size)
+            damage = np.rint(damage * multiplier[move]).astype(np.int64)
+
+            defender_hp = hp[1 - side]
+            defender_hp[battles] -= damage
+            damage_dealt[side][battles] += damage
+            # A battle ends when the defender hitpoints reach 0
+            over[battles] = defender_hp[battles] <= 0
+
+    return hp[0], hp[1], damage_dealt[0], damage_dealt[1]
+
+def simulate_odds(species1, species2, n, rng=None):
+    """Simulates n battles between two species and returns the win, loss and draw probabilities
+
+    Args:
+        species1 (Species): the first pokemon
+        species2 (Species): the second pokemon
+        n (int): number of battles to simulate
+        rng (numpy.random.Generator): random generator, a new one is created if None
+
+    Returns:
+        dict: dict with the probabilities of each outcome and a summary of the damage dealt by each pokemon
+    """
+
+    hp1, hp2, damage_dealt1, damage_dealt2 = simulate_battles(species1, species2, n, rng)
+    pokemon1_wins = np.count_nonzero(hp1 > hp2)
+    pokemon2_wins = np.count_nonzero(hp2 > hp1)
+    return {
+        "pokemon1": species1.name,
+        "pokemon2": species2.name,
+        "n": n,
+        "pokemon1_wins": pokemon1_wins / n,
+        "pokemon2_wins": pokemon2_wins / n,
+        "draws": (n - pokemon1_wins - pokemon2_wins) / n,
+        "damage_dealt": {
+            "pokemon1": summarize(damage_dealt1),
+            "pokemon2": summarize(damage_dealt2),
+        },
+    }
+
+def summarize(values):
+    """Returns a summary of a distribution
+
+    Args:
+        values (numpy.ndarray): the values of the distribution
+
+    Returns:
+        dict: dict with the mean, standard deviation, minimum, maximum and 5th, 50th and 95th percentiles
+    """
+
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": int(values.min()),
+        "p5": float(p5),
+        "p50": float(p50),
+        "p95": float(p95),
+        "max": int(values.max()),
+    }
@@ -0,0 +1,287 @@
+"""PokeAPI client
+
+This module sends every request made to PokeAPI through a single shared client
+The client keeps connections alive in a pool, retries transient failures with a jittered exponential backoff
+and revalidates the responses it already received with ETag and Last-Modified headers,
+so unchanged data is not transferred again
+It counts the requests, cache hits and bytes transferred of each endpoint (pokemon, move, type, ...)
+in process wide counters, shared with the async client of async_pokemon.py and exposed in metrics.py
+
+Classes:
+    EndpointCounters: Counts the requests, cache hits, retries, errors and bytes of each PokeAPI endpoint
+    ResponseCache: Keeps PokeAPI responses with their ETag and Last-Modified headers for revalidation
+    PokeAPIClient: A pooled http client for PokeAPI
+
+Functions:
+    get_client: returns the shared client configured in config.py
+    get_json: fetches the json data of an url with the shared client
+    endpoint_name: returns the PokeAPI endpoint of an url
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import config
+from metrics import FunctionCounter
+
+# Status codes worth retrying, the others are returned straight away
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class EndpointCounters:
+    """Counts the requests, cache hits, retries, errors and bytes of each PokeAPI endpoint
+
+    Functions:
+        count(str, **int)
+        stats() -> dict
+    """
+
+    def __init__(self):
+        self._counters = defaultdict(lambda: {'requests': 0, 'cache_hits': 0, 'retries': 0, 'errors': 0, 'bytes': 0})
+        self._lock = threading.Lock()
+
+    def count(self, endpoint, **counts):
+        """Adds to the counters of an endpoint
+
+        Args:
+            endpoint (str): the endpoint name, see endpoint_name
+            counts (int): the values added to each counter, e.g. requests=1
+        """
+
+        with self._lock:
+            counters = self._counters[endpoint]
+            for name, value in counts.items():
+                counters[name] += value
+
+    def stats(self):
+        """Returns the counters of each endpoint
+
+        Returns:
+            dict: dict with endpoint names as keys and dicts with the requests, cache hits, retries, errors and bytes as values
+        """
+
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._counters.items()}
+
+# Counters of every client of the process, read by the pokeapi_*_total metrics
+endpoint_counters = EndpointCounters()
+
+class ResponseCache:
+    """Keeps PokeAPI responses with their ETag and Last-Modified headers for revalidation
+
+    The least recently used responses are dropped past size
+
+    Atribues:
+        size(int): maximum number of responses kept
+
+    Functions:
+        get(str) -> tuple
+        revalidated(str)
+        put(str, Mapping, dict)
+    """
+
+    def __init__(self, size=5000):
+        self.size = size
+        # url -> (etag, last modified, json data) of the responses that can be revalidated
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns the conditional request headers and the data of a cached response
+
+        Args:
+            url (str): the url of the response
+
+        Returns:
+            tuple: the If-None-Match and If-Modified-Since headers and the json data, None if the response is not cached
+        """
+
+        with self._lock:
+            cached = self._responses.get(url)
+        if cached is None:
+            return None
+        etag, last_modified, data = cached
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers, data
+
+    def revalidated(self, url):
+        """Marks a cached response as recently used after PokeAPI answered 304 Not Modified
+
+        Args:
+            url (str): the url of the response
+        """
+
+        with self._lock:
+            if url in self._responses:
+                self._responses.move_to_end(url)
+
+    def put(self, url, headers, data):
+        """Caches a response that can be revalidated, i.e. with an ETag or Last-Modified header
+
+        Args:
+            url (str): the url of the response
+            headers (Mapping): the response headers
+            data (dict): the json data of the response
+        """
+
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._responses[url] = (etag, last_modified, data)
+            self._responses.move_to_end(url)
+            while len(self._responses) > self.size:
+                self._responses.popitem(last=False)
+
+class PokeAPIClient:
+    """A pooled http client for PokeAPI
+
+    Args:
+        pool_size (int): maximum number of connections kept alive to each host
+        retries (int): number of times a failed request is retried
+        backoff (float): seconds waited before the first retry, doubled on every retry and randomly jittered
+        timeout (float): seconds before a request times out
+        cache_size (int): maximum number of responses kept for revalidation
+        counters (EndpointCounters): the counters of the requests, counters of the client alone when None
+
+    Functions:
+        get_json(str) -> dict
+        stats() -> dict
+    """
+
+    def __init__(self, pool_size=20, retries=3, backoff=0.2, timeout=10.0, cache_size=5000, counters=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cache = ResponseCache(cache_size)
+        self.counters = counters if counters is not None else EndpointCounters()
+
+    def get_json(self, url):
+        """Fetches the json data of an url
+
+        Args:
+            url (str): the url to fetch
+
+        Raises:
+            requests.exceptions.ConnectionError: when PokeAPI can not be reached after all the retries
+            requests.exceptions.Timeout: when PokeAPI does not answer in time after all the retries
+            requests.exceptions.HTTPError: when PokeAPI returns an error
+
+        Returns:
+            dict: the json data of the response
+        """
+
+        endpoint = endpoint_name(url)
+        cached = self.cache.get(url)
+        response = self._send(endpoint, url, cached[0] if cached is not None else {})
+
+        if response.status_code == 304 and cached is not None:
+            self.counters.count(endpoint, cache_hits=1)
+            self.cache.revalidated(url)
+            return cached[1]
+
+        response.raise_for_status() # Raise an exception for HTTP errors
+        data = response.json()
+        self.cache.put(url, response.headers, data)
+        return data
+
+    def _send(self, endpoint, url, headers):
+        """Sends a request, retrying connection errors, timeouts and transient status codes"""
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.counters.count(endpoint, requests=1, errors=1)
+                if last_attempt:
+                    raise
+            else:
+                self.counters.count(endpoint, requests=1, bytes=len(response.content))
+                if response.status_code not in RETRY_STATUS or last_attempt:
+                    return response
+                self.counters.count(endpoint, errors=1)
+
+            self.counters.count(endpoint, retries=1)
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def stats(self):
+        """Returns the counters of each endpoint
+
+        Returns:
+            dict: dict with endpoint names as keys and dicts with the requests, cache hits, retries, errors and bytes as values
+        """
+
+        return self.counters.stats()
+
+def endpoint_name(url):
+    """Returns the PokeAPI endpoint of an url, e.g. move for https://pokeapi.co/api/v2/move/33/
+
+    Args:
+        url (str): the url
+
+    Returns:
+        str: the endpoint name
+    """
+
+    parts = urlsplit(url).path.strip('/').split('/')
+    if 'v2' in parts[:-1]:
+        return parts[parts.index('v2') + 1]
+    return parts[0]
+
+@lru_cache(maxsize=1)
+def get_client():
+    """Returns the shared client configured in config.py
+
+    Returns:
+        PokeAPIClient: the shared client
+    """
+
+    return PokeAPIClient(
+        pool_size=config.HTTP_POOL_SIZE,
+        retries=config.HTTP_RETRIES,
+        backoff=config.HTTP_RETRY_BACKOFF,
+        timeout=config.HTTP_TIMEOUT,
+        cache_size=config.HTTP_CACHE_SIZE,
+        counters=endpoint_counters,
+    )
+
+def _client_counter(name):
+    """Returns a function reading a counter of every endpoint from the process wide counters"""
+
+    return lambda: {(endpoint,): counters[name] for endpoint, counters in endpoint_counters.stats().items()}
+
+for _name, _documentation in (
+    ('requests', "Requests sent to PokeAPI, retries included"),
+    ('cache_hits', "PokeAPI responses revalidated without transferring them again"),
+    ('retries', "PokeAPI requests retried"),
+    ('errors', "PokeAPI requests failed with a connection error or a transient status"),
+    ('bytes', "Bytes received from PokeAPI"),
+):
+    FunctionCounter(f'pokeapi_{_name}_total', _documentation, ('endpoint',), _client_counter(_name))
+
+def get_json(url):
+    """Fetches the json data of an url with the shared client
+
+    Args:
+        url (str): the url to fetch
+
+    Returns:
+        dict: the json data of the response
+    """
+
+    return get_client().get_json(url)
@@ -4,23 +4,68 @@ This module simulates a pokkemoon
 Tt retrives their data from PokeAPI. 
 It calculates the damage of each attack damage based on a version of the Generation 1 formula
 It uses cache memory to load pokemon that were search before in order to reduce the API call
+Parsed pokemon are also kept in a persistent cache on disk shared by all worker processes
+Cached pokemon are immutable species shared by every battle, each battle gets its own lightweight combatants
+Unknown names are rejected against a local index of the valid names, with suggestions, without calling PokeAPI
+Fetching, parsing the moves and the type multiplier lookups are timed as phases in metrics.py
 
 Classes:
     Pokemon: A class representing a pokemon with its attributes
+    Species: An immutable pokemon species cached and shared between battles
+    Combatant: A pokemon taking part in a single battle
 
 Functions:
+    get_species: returns the cached species of a pokemon name
+    data_version: returns the tag of the data a battle between two species depends on
+    not_found_message: returns the error message of an unknown pokemon name
+    load_species: loads the species of a pokemon name
+    parse_types_and_stats: parses the types and stats of the PokeAPI data of a pokemon
+    calculate_base_damage: calculates the damage of a move before the random variation and type advantage
+    load_data: loads pokemon data from the data pack, the persistent cache or from pokeapi
     fetch_data: Fetched pokemon data from pokeapi given a pokemon name
     parse_data: parses data and fills the pokemoon class attributes
-    parse_moves: parse pokemon moves and retains 4 that do damage
+    parse_moves: parse pokemon moves and retains 4 that do damage using the shared move index
     select_attacker_defender: decides who attacks and who defends based on speed
-    attack: simulates a pokemon attack to another pokemon
-    get_damage_multiplier_by_type: calculates the damage multiplier based on pokemon types
+    strike: simulates a pokemon attack to another pokemon, returning the move, damage and multiplier
+    attack: simulates a pokemon attack to another pokemon, returning its description
+    get_damage_multiplier_by_type: calculates the damage multiplier based on pokemon types using the in memory type chart
     get_pokemon_info: returns pokemon info
 """
 
+import hashlib
+import json
 import random
 from functools import lru_cache
+from types import MappingProxyType
 import requests
+from type_chart import get_damage_multiplier, type_chart_version
+from moves import resolve_moves
+from species_cache import get_species_cache
+from pokeapi_client import get_json
+from datapack import get_data_pack
+from singleflight import SingleFlight
+from species_names import get_name_index, negative_cache
+from metrics import CACHE_LOOKUPS, PHASE_SECONDS, FunctionCounter, timed
+import config
+
+# Number of turns of a battle, 3 attacks from each pokemon
+BATTLE_TURNS = 6
+# Version of the battle rules, increase it when a change makes replayed battles differ from the stored ones
+RULES_VERSION = 1
+# Range of the random damage variation of an attack
+DAMAGE_ROLL = (0.85, 1.00)
+# Move used by pokemon without attacking moves
+STRUGGLE = {
+    'damage_class': {
+        'name': "physical",
+        'url': "https://pokeapi.co/api/v2/move-damage-class/2/"
+    },
+    'type': {
+        'name': "normal",
+        'url': "https://pokeapi.co/api/v2/type/1/"
+    },
+    'power': 50
+}
 
 class connection_error(Exception):
     """Class handling connection errors when fetching data from pokepi. pass the error to flask
@@ -36,7 +81,13 @@ class http_error(Exception):
         Exception (str): Error description
     """
 
-@lru_cache(maxsize=100)
+class species_not_found(http_error):
+    """Class handling pokemon names that do not exist. pass the error to flask
+
+    Args:
+        Exception (str): Error description
+    """
+
 class Pokemon:
     """A class representing a pokemon with its attributes
 
@@ -48,9 +99,11 @@ class Pokemon:
         current_hp(int): pokemon's current hitpoints
 
     Functions:
+        load_data()
         fetch_data()
         parse_data(dict)
         parse_moves(dict)
+        strike(object) -> tuple
         attack(object)
         attack_type_advantage(str) -> int
         display_stats()
@@ -62,23 +115,54 @@ class Pokemon:
         self.stats = {}
         self.moves = {}
         self.current_hp = 0
+        self.load_data()
+
+    def load_data(self):
+        """Loads pokemon data from the persistent species cache, or fetches it from PokeAPI and caches it
+
+        When a data pack is configured the data is read from the pack instead and PokeAPI is never called
+        """
+
+        data_pack = get_data_pack()
+        if data_pack is not None:
+            data = data_pack.species_data(self.name)
+            if data is None:
+                raise species_not_found(not_found_message(self.name))
+            self.types = data['types']
+            self.stats = data['stats']
+            self.moves = data['moves'] or {'struggle': STRUGGLE}
+            return
+
+        species_cache = get_species_cache()
+        cached = species_cache.get(self.name) if species_cache else None
+        if cached is not None:
+            CACHE_LOOKUPS.labels('species_disk', 'hit').inc()
+            self.types = cached['types']
+            self.stats = cached['stats']
+            self.moves = cached['moves']
+            return
+
+        if species_cache:
+            CACHE_LOOKUPS.labels('species_disk', 'miss').inc()
         self.fetch_data()
+        if species_cache:
+            species_cache.put(self.name, {'types': self.types, 'stats': self.stats, 'moves': self.moves})
 
     def fetch_data(self):
         """Fetches data from PokeAPI given a pokemon name"""
 
         try:
-            url = f"https://pokeapi.co/api/v2/pokemon/{self.name.lower()}"
-            response = requests.get(url)
-            response.raise_for_status() # Raise an exception for HTTP errors
-
-            data = response.json()
+            url = f"{config.POKEAPI_URL}/pokemon/{self.name.lower()}"
+            with PHASE_SECONDS.labels('fetch_data').time():
+                data = get_json(url)
             #Check if no data were returned
             self.parse_data(data)
 
-        except requests.exceptions.ConnectionError as e:
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             raise connection_error(f'Connection error when requesting data for pokemon {self.name}: {e}') from e
         except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                raise species_not_found(not_found_message(self.name)) from e
             raise http_error(f'Pokemon {self.name} was not found. Probably the name is written incorectly') from e
 
 
@@ -89,24 +173,17 @@ class Pokemon:
             data (dict): dictionary with pokemon information
         """
 
-        self.stats['Height'] = data['height'] / 10.0
-        self.stats['Weight'] = data['weight'] / 10.0
-        # Get all element tupes
-        self.types= [
-            type['type']['name']
-            for type in data['types']
-        ]
-        #Get hitpoints, attack, defense, special-attack, special-defense and speed
-        for stat in data['stats']:
-            name = stat['stat']['name']
-            value = stat['base_stat']
-            self.stats[name] = value
+        self.types, stats = parse_types_and_stats(data)
+        self.stats.update(stats)
         self.parse_moves(data['moves'])
 
+    @timed('parse_moves')
     def parse_moves(self, moves_dictionary):
         """Parses the moves dictionary to find moves with attacking power
 
         It finds the first 4 moves with power to fill pokemon moves
+        Move info comes from the process wide move index, so each move is fetched from PokeAPI only once
+        Moves missing from the index are fetched in parallel, see moves.resolve_moves
         If a pokemon has no attacking moves it takes the move struggle
 
 
@@ -114,47 +191,28 @@ class Pokemon:
             moves_dictionary (dict): dictionary with all pokemon's available moves
         """
 
-        for move in moves_dictionary:
-            move_name = move['move']['name']
-            move_url = move['move']['url']
-            try:
-                response = requests.get(move_url)
-                response.raise_for_status() # Raise an exception for HTTP errors
-                move_info = response.json()
-
-                if move_info['power'] is not None and  move_info['power']> 0:
-                    self.moves[move_name] = {
-                        'damage_class': move_info['damage_class'],
-                        'type': move_info['type'],
-                        'power': move_info['power'],
-                    }
-                    if len(self.moves) == 4:
-                        break  # Stop fetching moves after finding four
-
-            except requests.exceptions.ConnectionError as e:
-                raise connection_error(f'Connection error when searching for pokemon moves: {e}') from e
-            except requests.exceptions.HTTPError as e:
-                raise http_error(f'HTTP error when searching for pokemon moves: {e}') from e
+        move_refs = [
+            (move['move']['name'], move['move']['url'])
+            for move in moves_dictionary
+        ]
+        try:
+            self.moves = resolve_moves(move_refs)
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise connection_error(f'Connection error when searching for pokemon moves: {e}') from e
+        except requests.exceptions.HTTPError as e:
+            raise http_error(f'HTTP error when searching for pokemon moves: {e}') from e
 
         if len(self.moves) == 0:
-            self.moves['struggle'] = {
-                'damage_class': {
-                    'name': "physical",
-                    'url': "https://pokeapi.co/api/v2/move-damage-class/2/"
-                },
-                'type': {
-                    'name': "normal",
-                    'url': "https://pokeapi.co/api/v2/type/1/"
-                },
-                'power': 50
-            }
-
-    def select_attacker_defender(self, pokemon2):
+            self.moves['struggle'] = STRUGGLE
+
+    def select_attacker_defender(self, pokemon2, rng=random):
         """Decides who is the attacker and who is the defender between two pokemon based on their speed
 
         Args:
             self (Pokemon): The first Pokemon
             pokemon2 (Pokemon): The Second Pokemon
+            rng (random.Random): random generator of the battle, the global one if not given
 
         Returns:
             tuple: A tuple with the attacker and defender
@@ -168,10 +226,10 @@ class Pokemon:
             defender = self
         else:
             # If speeds are equal, randomly select the attacker
-            attacker, defender = random.choice([(self, pokemon2), (pokemon2, self)])
+            attacker, defender = rng.choice([(self, pokemon2), (pokemon2, self)])
         return attacker, defender
 
-    def attack(self, defender):
+    def strike(self, defender, rng=random):
         """Simulates an attack of pokemon to another. 
         
         The damage of the attack is calculated based on simplified formula from generation 1
@@ -180,62 +238,60 @@ class Pokemon:
 
         Args:
             defender (Pokemon): the pokemon defending the attack
+            rng (random.Random): random generator of the battle, the global one if not given
 
         Returns:
-            str: Description with damage done to the defending pokemon and its remaining hitpoints
+            tuple: A tuple with the index of the move used in the pokemon moves, the damage done and the type multiplier
         """
 
-        move_name = random.choice(list(self.moves.keys()))
-        move = self.moves[move_name]
+        # Draws the same random number as choosing from the list of moves
+        move_names = list(self.moves)
+        move_index = rng.randrange(len(move_names))
+        move = self.moves[move_names[move_index]]
 
         # Calculate damage using Generation 1 formula
-        LEVEL = 1
-        CRITICAL = 1
-        damage = ((2 * LEVEL * CRITICAL) / 5) + 2 # assuming pokemon are level 1 and no critical
-        damage *= move['power'] * (self.stats['attack'] / defender.stats['defense']) / 50
-        damage += 2
-        damage *= random.uniform(0.85, 1.00)  # Apply random damage variation
+        damage = calculate_base_damage(move['power'], self.stats['attack'], defender.stats['defense'])
+        damage *= rng.uniform(*DAMAGE_ROLL)  # Apply random damage variation
 
         # Check for type advantage
-        type_advantage_modifier = self.get_damage_multiplier_by_type(move['type']['url'], defender)
+        type_advantage_modifier = self.get_damage_multiplier_by_type(move['type']['name'], defender)
         damage =  round(damage * type_advantage_modifier)
 
         # Subtract damage from defender's hitpoint
         defender.current_hp -= int(damage)
+        return move_index, damage, type_advantage_modifier
+
+    def attack(self, defender, rng=random):
+        """Simulates an attack of pokemon to another, see strike
+
+        Args:
+            defender (Pokemon): the pokemon defending the attack
+            rng (random.Random): random generator of the battle, the global one if not given
 
+        Returns:
+            str: Description with damage done to the defending pokemon and its remaining hitpoints
+        """
+
+        move_index, damage, _ = self.strike(defender, rng)
+        move_name = list(self.moves)[move_index]
         attack_info = f"{self.name} attacks {defender.name} with {move_name}. It does {damage} damage and {defender.name} has {defender.current_hp} hitpoints remaining"
         return attack_info
 
-    def get_damage_multiplier_by_type(self, move_type_url, defender):
+    @timed('type_multiplier')
+    def get_damage_multiplier_by_type(self, move_type, defender):
         """Calculates if an attack has type advantage over defending pokemon types
 
+        The multiplier is looked up in the type chart held in memory, no API call is made
+
         Args:
-            move_type_url (str): url pointing to move type advantages over other pokemon types
+            move_type (str): name of the move type
             defender (Pokemon): Pokemon defending the attack
 
         Returns:
-            int: damage multiplier
+            float: damage multiplier
         """
 
-        try:
-            response = requests.get(move_type_url)
-            response.raise_for_status() # Raise an exception for HTTP errors
-            move_type_data = response.json()
-            type_advantage = 1.0
-
-            for defender_type in defender.types:
-                if defender_type in move_type_data['damage_relations']['double_damage_to']:
-                    type_advantage *= 2.0
-                elif defender_type in move_type_data['damage_relations']['half_damage_to']:
-                    type_advantage *= 0.5
-                elif defender_type in move_type_data['damage_relations']['no_damage_to']:
-                    type_advantage *= 0.0
-            return type_advantage
-
-        except requests.exceptions.ConnectionError as e:
-            raise connection_error(f'HTTP error when searching for damage multiplier by type: {e}') from e
-        except requests.exceptions.HTTPError as e:
-            raise http_error(f'HTTP error when searching for damage multiplier by type: {e}') from e
+        return get_damage_multiplier(move_type, defender.types)
 
     def get_pokemon_info(self):
         """Creates a pokemon ID with the pokemon information
@@ -252,3 +308,254 @@ class Pokemon:
             "stats":self.stats,
         }
         return pokemon_info
+
+def calculate_base_damage(power, attack, defense):
+    """Calculates the damage of a move before the random variation and type advantage
+
+    Uses a simplified Generation 1 formula, assuming pokemon are level 1 and no critical hit
+
+    Args:
+        power (int): power of the move
+        attack (int): attack stat of the attacking pokemon
+        defense (int): defense stat of the defending pokemon
+
+    Returns:
+        float: base damage of the move
+    """
+
+    LEVEL = 1
+    CRITICAL = 1
+    damage = ((2 * LEVEL * CRITICAL) / 5) + 2
+    damage *= power * (attack / defense) / 50
+    damage += 2
+    return damage
+
+class Species:
+    """An immutable pokemon species cached and shared between battles
+
+    Atribues:
+        name(str): name of the pokemon
+        types(tuple<str>): types of the pokemon
+        stats(mappingproxy): read only dictionary with pokemon's info
+        moves(mappingproxy): read only dictionary with pokemon's moves
+        fingerprint(str): hash of the types, stats and moves, in order, that battles depend on
+
+    Functions:
+        from_pokemon(Pokemon) -> Species
+    """
+
+    __slots__ = ('name', 'types', 'stats', 'moves', 'fingerprint')
+
+    def __init__(self, name, types, stats, moves):
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'types', tuple(types))
+        object.__setattr__(self, 'stats', MappingProxyType(dict(stats)))
+        object.__setattr__(self, 'moves', MappingProxyType(dict(moves)))
+        battle_data = [
+            self.types,
+            sorted(self.stats.items()),
+            [(move_name, move['power'], move['type']['name']) for move_name, move in self.moves.items()],
+        ]
+        object.__setattr__(self, 'fingerprint', hashlib.sha1(json.dumps(battle_data).encode()).hexdigest())
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Species {self.name} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'Species {self.name} is immutable')
+
+    def __reduce__(self):
+        # mappingproxy can not be pickled, rebuild the species from plain dicts
+        return (Species, (self.name, list(self.types), dict(self.stats), dict(self.moves)))
+
+    @classmethod
+    def from_pokemon(cls, pokemon):
+        """Creates a species from a loaded pokemon
+
+        Args:
+            pokemon (Pokemon): pokemon with its data loaded
+
+        Returns:
+            Species: the species of the pokemon
+        """
+
+        return cls(pokemon.name, pokemon.types, pokemon.stats, pokemon.moves)
+
+class Combatant:
+    """A pokemon taking part in a single battle
+
+    Only the name and the hitpoints belong to the battle, everything else is read from the shared species
+
+    Atribues:
+        name(str): name of the pokemon in the battle
+        current_hp(int): pokemon's current hitpoints
+        species(Species): the species of the pokemon
+
+    Functions:
+        select_attacker_defender(object) -> tuple
+        strike(object) -> tuple
+        attack(object) -> str
+        get_damage_multiplier_by_type(str, object) -> float
+        get_pokemon_info() -> dict
+    """
+
+    __slots__ = ('name', 'current_hp', 'species')
+
+    def __init__(self, species, name=None):
+        self.species = species
+        self.name = name if name is not None else species.name
+        self.current_hp = species.stats['hp']
+
+    @property
+    def types(self):
+        return self.species.types
+
+    @property
+    def stats(self):
+        return self.species.stats
+
+    @property
+    def moves(self):
+        return self.species.moves
+
+    # The battle rules are the same as for Pokemon
+    select_attacker_defender = Pokemon.select_attacker_defender
+    strike = Pokemon.strike
+    attack = Pokemon.attack
+    get_damage_multiplier_by_type = Pokemon.get_damage_multiplier_by_type
+
+    def get_pokemon_info(self):
+        """Creates a pokemon ID with the pokemon information
+
+        Returns:
+            dict: dict with pokemon info
+        """
+        pokemon_info = {
+            "name":self.name,
+            'types':list(self.types),
+            "stats":dict(self.stats),
+        }
+        return pokemon_info
+
+_species_flight = SingleFlight()
+
+@lru_cache(maxsize=config.SPECIES_MEMORY_CACHE_SIZE)
+def get_species(name):
+    """Returns the species of a pokemon name, loading it the first time it is requested
+
+    Names are matched without case like PokeAPI does, every spelling shares the species of the lowercase name
+
+    Args:
+        name (str): name of the pokemon
+
+    Raises:
+        connection_error: when PokeAPI can not be reached
+        species_not_found: when the pokemon does not exist
+        http_error: when PokeAPI returns an error
+
+    Returns:
+        Species: the shared species of the pokemon
+    """
+
+    if name != name.lower():
+        return get_species(name.lower())
+
+    # Unknown names are rejected locally, PokeAPI is only asked about names it may know
+    message = negative_cache.get(name)
+    if message is not None:
+        CACHE_LOOKUPS.labels('negative_names', 'hit').inc()
+        raise species_not_found(message)
+    name_index = get_name_index()
+    if name_index is not None and name_index.rejects(name):
+        message = not_found_message(name)
+        negative_cache.add(name, message)
+        raise species_not_found(message)
+
+    try:
+        # Concurrent first requests of a name wait for a single load instead of each fetching it
+        return _species_flight.do(name, load_species, name)
+    except species_not_found as e:
+        negative_cache.add(name, str(e))
+        raise
+
+def data_version(species1, species2):
+    """Returns the tag of the data a battle between two species depends on
+
+    A battle replayed from its seed repeats the stored one only if the tag did not change
+
+    Args:
+        species1 (Species): the first species
+        species2 (Species): the second species
+
+    Returns:
+        str: the rules version and a hash of the type chart and of both species
+    """
+
+    digest = hashlib.sha1(f"{type_chart_version()}:{species1.fingerprint}:{species2.fingerprint}".encode())
+    return f"{RULES_VERSION}-{digest.hexdigest()[:12]}"
+
+def _species_memory_lookups():
+    """Returns the hits and misses of the in memory species cache"""
+
+    info = get_species.cache_info()
+    return {('hit',): info.hits, ('miss',): info.misses}
+
+FunctionCounter(
+    'pokemon_species_memory_cache_lookups_total',
+    "Lookups of the in memory species cache by result",
+    ('result',),
+    _species_memory_lookups,
+)
+
+def not_found_message(name):
+    """Returns the error message of an unknown pokemon name, suggesting the closest valid names
+
+    Args:
+        name (str): the unknown name
+
+    Returns:
+        str: the error message
+    """
+
+    message = f'Pokemon {name} was not found. Probably the name is written incorectly'
+    name_index = get_name_index()
+    suggestions = name_index.suggest(name) if name_index is not None else []
+    if suggestions:
+        message += f". Did you mean {', '.join(suggestions)}?"
+    return message
+
+def parse_types_and_stats(data):
+    """Parses the types and stats of the PokeAPI data of a pokemon
+
+    Args:
+        data (dict): dictionary with pokemon information
+
+    Returns:
+        tuple: A tuple with the list of types and the dict of stats, height and weight included
+    """
+
+    stats = {
+        'Height': data['height'] / 10.0,
+        'Weight': data['weight'] / 10.0,
+    }
+    # Get all element tupes
+    types = [
+        type['type']['name']
+        for type in data['types']
+    ]
+    #Get hitpoints, attack, defense, special-attack, special-defense and speed
+    for stat in data['stats']:
+        stats[stat['stat']['name']] = stat['base_stat']
+    return types, stats
+
+def load_species(name):
+    """Loads the species of a pokemon name
+
+    Args:
+        name (str): name of the pokemon
+
+    Returns:
+        Species: the species of the pokemon
+    """
+
+    return Species.from_pokemon(Pokemon(name))
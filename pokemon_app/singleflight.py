@@ -0,0 +1,70 @@
+"""Singleflight
+
+This module coalesces concurrent calls doing the same work
+The first caller for a key runs the work, the callers arriving while it runs wait for it
+and get the same result, or the same error, instead of repeating the work
+
+Classes:
+    SingleFlight: A group of calls coalesced by key
+"""
+
+import threading
+
+class _Call:
+    """A call in flight, with its result or error once it is done"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """A group of calls coalesced by key
+
+    Functions:
+        do(object, callable, *args) -> object
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args):
+        """Runs function(*args) unless a call with the same key is already running, in which case waits for it
+
+        Args:
+            key (object): key of the work, calls with equal keys are coalesced
+            function (callable): the work to run
+            *args: arguments of the function
+
+        Raises:
+            Exception: the error raised by the function, shared by every waiting caller
+
+        Returns:
+            object: the result of the function
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,124 @@
+"""Persistent species cache
+
+This module stores parsed pokemon data in a SQLite file keyed by lowercase pokemon name
+The file survives restarts and is shared by every worker process on the host,
+so a pokemon fetched by any worker is available to all the others
+Entries expire after a time to live and the oldest entries are evicted when the cache is full
+SQLite runs in WAL mode, so readers in different processes never block each other
+
+Classes:
+    SpeciesCache: A SQLite backed cache of pokemon data
+
+Functions:
+    get_species_cache: returns the species cache configured in config.py
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+import config
+
+class SpeciesCache:
+    """A SQLite backed cache of pokemon data
+
+    Atribues:
+        path(str): path of the SQLite file
+        ttl(float): seconds before an entry expires
+        max_entries(int): maximum number of entries kept
+
+    Functions:
+        get(str) -> dict
+        put(str, dict)
+        delete(str)
+        clear()
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=2000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS species ("
+            "name TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS species_fetched_at ON species (fetched_at)")
+        conn.commit()
+
+    def _connection(self):
+        """Returns the connection of the current thread, sqlite connections can not be shared between threads"""
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, name):
+        """Returns the cached data of a pokemon
+
+        Args:
+            name (str): name of the pokemon
+
+        Returns:
+            dict: dict with the pokemon types, stats and moves or None if it is not cached or expired
+        """
+
+        row = self._connection().execute(
+            "SELECT data FROM species WHERE name = ? AND fetched_at > ?",
+            (name.lower(), time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, name, data):
+        """Stores the data of a pokemon and evicts the oldest entries if the cache is full
+
+        Args:
+            name (str): name of the pokemon
+            data (dict): dict with the pokemon types, stats and moves
+        """
+
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO species (name, data, fetched_at) VALUES (?, ?, ?)",
+                (name.lower(), json.dumps(data), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM species WHERE name IN ("
+                "SELECT name FROM species ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, name):
+        """Removes a pokemon from the cache"""
+
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM species WHERE name = ?", (name.lower(),))
+
+    def clear(self):
+        """Removes every pokemon from the cache"""
+
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM species")
+
+@lru_cache(maxsize=1)
+def get_species_cache():
+    """Returns the species cache configured in config.py
+
+    Returns:
+        SpeciesCache: the species cache or None if SPECIES_CACHE_PATH is empty
+    """
+
+    if not config.SPECIES_CACHE_PATH:
+        return None
+    return SpeciesCache(config.SPECIES_CACHE_PATH, config.SPECIES_CACHE_TTL, config.SPECIES_CACHE_SIZE)
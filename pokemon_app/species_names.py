@@ -0,0 +1,286 @@
+"""Pokemon names
+
+This module rejects unknown pokemon names without calling PokeAPI
+The valid names are loaded once, from the data pack, a bundled list of names or a single bulk request to PokeAPI,
+into an index that also suggests the closest names to a misspelled one
+Names found unknown are kept in a negative cache for a while, so repeated requests for them cost nothing
+
+A list of names can be bundled by running:
+
+    python species_names.py <output_file>
+
+Classes:
+    NameIndex: An index of valid pokemon names suggesting corrections
+    NegativeCache: A cache of unknown names expiring after a time to live
+
+Functions:
+    get_name_index: returns the name index, loading it the first time and refreshing it once it is old
+    reset_name_index: forgets the loaded name index
+    load_species_names: loads every valid pokemon name
+    fetch_species_names: fetches every pokemon name from PokeAPI
+    deletes: returns the variants of a word with up to n characters deleted
+    edit_distance: returns the Levenshtein distance between two words
+"""
+
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+import config
+from datapack import get_data_pack
+from pokeapi_client import get_json
+
+logger = logging.getLogger(__name__)
+
+class NameIndex:
+    """An index of valid pokemon names suggesting corrections
+
+    Suggestions come from names within max_distance edits, found through an index of their deleted
+    character variants, and from names starting with the misspelled name
+    Numeric ids are not indexed, PokeAPI resolves them like names
+
+    Atribues:
+        names(frozenset): the valid names, in lowercase
+        max_distance(int): maximum number of edits between a name and its suggestions
+
+    Functions:
+        rejects(str) -> bool
+        suggest(str) -> list<str>
+    """
+
+    def __init__(self, names, max_distance=2):
+        self.names = frozenset(name.lower() for name in names)
+        self.max_distance = max_distance
+        self._sorted = sorted(self.names)
+        self._longest = max((len(name) for name in self.names), default=0)
+        self._deletes = defaultdict(list)
+        for name in self.names:
+            for variant in deletes(name, max_distance):
+                self._deletes[variant].append(name)
+
+    def __contains__(self, name):
+        return name.lower() in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def rejects(self, name):
+        """Returns whether a name is surely not a pokemon, numeric ids are left for PokeAPI to resolve
+
+        Args:
+            name (str): the requested name or id
+
+        Returns:
+            bool: True if the name is not an id and is not indexed
+        """
+
+        return not (name.isascii() and name.isdigit()) and name not in self
+
+    def suggest(self, name, limit=3):
+        """Suggests valid names close to a misspelled one
+
+        Args:
+            name (str): the misspelled name
+            limit (int): maximum number of suggestions
+
+        Returns:
+            list<str>: the closest names first, then the names starting with name
+        """
+
+        name = name.lower()
+        # Finding the close names costs the cube of the length, a name this long is close to none and starts none
+        if len(name) > self._longest + self.max_distance:
+            return []
+        candidates = set()
+        for variant in deletes(name, self.max_distance):
+            candidates.update(self._deletes.get(variant, ()))
+        scored = sorted(
+            (distance, candidate)
+            for candidate, distance in ((candidate, edit_distance(name, candidate)) for candidate in candidates)
+            if distance <= self.max_distance
+        )
+        suggestions = [candidate for _, candidate in scored]
+
+        position = bisect_left(self._sorted, name)
+        while len(suggestions) < limit and position < len(self._sorted) and self._sorted[position].startswith(name):
+            if self._sorted[position] not in suggestions:
+                suggestions.append(self._sorted[position])
+            position += 1
+        return suggestions[:limit]
+
+class NegativeCache:
+    """A cache of unknown names expiring after a time to live
+
+    Atribues:
+        ttl(float): seconds a name is remembered
+        max_entries(int): maximum number of names remembered, the oldest are forgotten first
+
+    Functions:
+        add(str, str)
+        get(str) -> str
+        __contains__(str) -> bool
+        clear()
+    """
+
+    def __init__(self, ttl=300, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._expiries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, name, message):
+        """Remembers an unknown name with its error message, so the message is not computed again
+
+        Args:
+            name (str): the unknown name
+            message (str): the error message of the name
+        """
+
+        with self._lock:
+            self._expiries[name.lower()] = (time.monotonic() + self.ttl, message)
+            self._expiries.move_to_end(name.lower())
+            while len(self._expiries) > self.max_entries:
+                self._expiries.popitem(last=False)
+
+    def get(self, name):
+        """Returns the error message of a remembered unknown name
+
+        Args:
+            name (str): the name
+
+        Returns:
+            str: the error message, None if the name is not remembered
+        """
+
+        with self._lock:
+            entry = self._expiries.get(name.lower())
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._expiries[name.lower()]
+                return None
+            return entry[1]
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def clear(self):
+        """Forgets every name"""
+
+        with self._lock:
+            self._expiries.clear()
+
+negative_cache = NegativeCache(config.NEGATIVE_CACHE_TTL, config.NEGATIVE_CACHE_SIZE)
+
+_name_index = None
+_next_load = 0.0
+_lock = threading.Lock()
+
+def get_name_index():
+    """Returns the name index, loading it the first time and refreshing it once it is old
+
+    Names come from the data pack if one is configured, else from SPECIES_NAMES_PATH if set, else from PokeAPI
+    The index is reloaded after NAME_INDEX_TTL seconds, a single caller reloads it while the others keep using the old one
+    If the names can not be loaded another attempt is made after NAME_INDEX_RETRY seconds
+
+    Returns:
+        NameIndex: the name index or None if the names could not be loaded yet
+    """
+
+    global _name_index, _next_load
+    if time.monotonic() < _next_load:
+        return _name_index
+
+    # The first load is waited for, refreshes are skipped while another caller does them
+    if not _lock.acquire(blocking=_name_index is None):
+        return _name_index
+    try:
+        if time.monotonic() >= _next_load:
+            try:
+                _name_index = NameIndex(load_species_names())
+                _next_load = time.monotonic() + config.NAME_INDEX_TTL
+            except Exception:
+                logger.exception("Could not load the pokemon names")
+                _next_load = time.monotonic() + config.NAME_INDEX_RETRY
+    finally:
+        _lock.release()
+    return _name_index
+
+def reset_name_index():
+    """Forgets the loaded name index, the next get_name_index call loads it again"""
+
+    global _name_index, _next_load
+    with _lock:
+        _name_index = None
+        _next_load = 0.0
+
+def load_species_names():
+    """Loads every valid pokemon name
+
+    Returns:
+        list<str>: the pokemon names
+    """
+
+    data_pack = get_data_pack()
+    if data_pack is not None:
+        return data_pack.species_names()
+    if config.SPECIES_NAMES_PATH:
+        with open(config.SPECIES_NAMES_PATH, encoding='utf-8') as file:
+            return [line.strip() for line in file if line.strip()]
+    return fetch_species_names()
+
+def fetch_species_names():
+    """Fetches every pokemon name from PokeAPI with a single request
+
+    Returns:
+        list<str>: the pokemon names
+    """
+
+    return [pokemon['name'] for pokemon in get_json(f"{config.POKEAPI_URL}/pokemon?limit=100000")['results']]
+
+def deletes(word, n):
+    """Returns the variants of a word with up to n characters deleted, including the word itself
+
+    Args:
+        word (str): the word
+        n (int): maximum number of characters deleted
+
+    Returns:
+        set<str>: the variants
+    """
+
+    variants = {word}
+    frontier = {word}
+    for _ in range(n):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+def edit_distance(first, second):
+    """Returns the Levenshtein distance between two words
+
+    Args:
+        first (str): the first word
+        second (str): the second word
+
+    Returns:
+        int: the minimum number of insertions, deletions and substitutions turning first into second
+    """
+
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        current = [i]
+        for j, second_char in enumerate(second, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (first_char != second_char),
+            ))
+        previous = current
+    return previous[-1]
+
+if __name__ == "__main__":
+    with open(sys.argv[1], 'w', encoding='utf-8') as output:
+        output.write('\n'.join(sorted(fetch_species_names())) + '\n')
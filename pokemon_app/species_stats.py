@@ -0,0 +1,123 @@
+"""Species stats backfill
+
+This module rebuilds the species_stats table from every battle stored in the database
+The table is kept up to date by the battle writer, the backfill is only needed once for the battles
+stored before the table existed, or to repair it. It must run while no battles are being written
+
+Battles are read in id order a page at a time. Their outcome is read from the stored remaining hitpoints,
+from the packed turn events for battles stored without them, or parsed from the winner and battle log sentences
+of the oldest battles
+
+    python species_stats.py
+
+Functions:
+    battle_outcome: returns the outcome of a stored battle
+    backfill: rebuilds the species_stats table from the stored battles
+"""
+
+import json
+import re
+from battle_events import decode_events
+from database import get_database, species_stats_deltas, upsert_species_stats
+
+# A sentence of the battle logs stored before the turn events
+LOG_SENTENCE = re.compile(
+    r"^(?P<attacker>.+) attacks (?P<defender>.+) with .+\. "
+    r"It does -?\d+ damage and (?P=defender) has (?P<remaining_hp>-?\d+) hitpoints remaining$"
+)
+WINNER_SUFFIX = ' is the winner'
+
+def battle_outcome(winner, pokemon1, pokemon2, events, remaining_hp1, remaining_hp2, battle_log):
+    """Returns the outcome of a stored battle
+
+    Args:
+        winner (str): the stored winner description
+        pokemon1 (str): name of the first pokemon or None for the oldest battles
+        pokemon2 (str): name of the second pokemon or None for the oldest battles
+        events (bytes): the packed turn events or None
+        remaining_hp1 (int): remaining hitpoints of the first pokemon or None
+        remaining_hp2 (int): remaining hitpoints of the second pokemon or None
+        battle_log (str): the json battle log of the oldest battles or None
+
+    Returns:
+        tuple: A tuple with the names of both species, the outcome and the remaining hitpoints of both like
+            database.species_stats_deltas expects, or None if the battle can not be read
+    """
+
+    if pokemon1 is not None and remaining_hp1 is not None:
+        outcome = (remaining_hp1 > remaining_hp2) - (remaining_hp1 < remaining_hp2)
+        return pokemon1, pokemon2, outcome, remaining_hp1, remaining_hp2
+
+    if pokemon1 is not None and events is not None:
+        # The hitpoints of a pokemon are known once it has been attacked
+        remaining = [None, None]
+        for event in decode_events(events):
+            remaining[1 - event.attacker] = event.remaining_hp
+        names = (pokemon1, pokemon2)
+        # Mirror matches were told apart by a 2 after the second name
+        displayed = (pokemon1, f'{pokemon2}2' if pokemon1 == pokemon2 else pokemon2)
+    else:
+        sentences = [LOG_SENTENCE.match(sentence) for sentence in json.loads(battle_log or '[]')]
+        if not sentences or not all(sentences):
+            return None
+        displayed = (sentences[0]['attacker'], sentences[0]['defender'])
+        names = (displayed[0], displayed[0] if displayed[1] == f'{displayed[0]}2' else displayed[1])
+        remaining = [None, None]
+        for sentence in sentences:
+            remaining[displayed.index(sentence['defender'])] = int(sentence['remaining_hp'])
+
+    if winner == "It's a draw":
+        outcome = 0
+    else:
+        # Winners are stored as "<pokemon> is the winner by ..."
+        outcome = {displayed[0]: 1, displayed[1]: -1}.get(winner.split(WINNER_SUFFIX)[0])
+    return names[0], names[1], outcome, remaining[0], remaining[1]
+
+def backfill(database, page_size=1000):
+    """Rebuilds the species_stats table from the stored battles
+
+    Args:
+        database (Database): the battles database
+        page_size (int): number of battles read at a time
+
+    Returns:
+        dict: dict with the number of battles counted and skipped
+    """
+
+    deltas = {}
+    counted = skipped = 0
+    after_id = 0
+    with database.connection() as conn:
+        while True:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, winner, pokemon1, pokemon2, events, remaining_hp1, remaining_hp2, battle_log FROM battles "
+                f"WHERE id > {database.placeholder} ORDER BY id LIMIT {int(page_size)}",
+                [after_id],
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+
+            results = [battle_outcome(*row[1:]) for row in rows]
+            counted += sum(result is not None for result in results)
+            skipped += sum(result is None for result in results)
+            for species, delta in species_stats_deltas(result for result in results if result is not None).items():
+                total = deltas.setdefault(species, [0] * len(delta))
+                for index, value in enumerate(delta):
+                    total[index] += value
+
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM species_stats")
+        cursor.close()
+        names = sorted(deltas)
+        for start in range(0, len(names), page_size):
+            upsert_species_stats(database, conn, {name: deltas[name] for name in names[start:start + page_size]})
+        conn.commit()
+
+    return {'counted': counted, 'skipped': skipped}
+
+if __name__ == "__main__":
+    print(backfill(get_database()))
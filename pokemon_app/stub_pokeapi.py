@@ -0,0 +1,297 @@
+"""Stub PokeAPI server
+
+This module runs a local http server that answers like PokeAPI from fixtures held in memory
+It is used by the tests and the benchmark to load pokemon without reaching pokeapi.co and to count the requests made
+Like PokeAPI it keeps connections alive and sends ETag headers, answering 304 when the data did not change
+
+Fixtures can be built in the tests or loaded from responses recorded from PokeAPI (pokeapi_fixtures.json),
+which are recorded again by running this module
+
+    python stub_pokeapi.py <output_file> <pokemon_name>...
+
+Classes:
+    StubPokeAPI: A local server serving PokeAPI fixtures
+
+Functions:
+    species_fixture: builds the PokeAPI data of a pokemon
+    move_fixture: builds the PokeAPI data of a move
+    record_fixtures: records the PokeAPI responses needed to load some pokemon
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECORDED_URL = 'https://pokeapi.co/api/v2'
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pokeapi_fixtures.json')
+# Pokemon names are listed by a single request, like species_names.fetch_species_names does
+NAMES_PATH = '/pokemon?limit=100000'
+
+class StubPokeAPI:
+    """A local server serving PokeAPI fixtures
+
+    Atribues:
+        fixtures(dict): dictionary with url paths as keys (e.g. /api/v2/move/tackle) and json data as values
+        delay(float): seconds to wait before answering each request
+        requests(Counter): number of requests made for each path
+        failures(Counter): number of 503 errors still to answer for each path before answering normally
+        connections(set): client addresses of the connections opened
+
+    Functions:
+        start()
+        stop()
+        add(str, dict)
+        add_species(str, dict, list<dict>)
+        load_recording(str) -> StubPokeAPI
+        move_url(str) -> str
+        stub_url(str) -> str
+    """
+
+    def __init__(self, delay=0.0):
+        self.fixtures = {}
+        self.delay = delay
+        self.requests = Counter()
+        self.failures = Counter()
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        """str: base url of the stub api, to use in place of config.POKEAPI_URL"""
+        return f"http://127.0.0.1:{self._server.server_port}/api/v2"
+
+    def start(self):
+        """Starts the server in a background thread on a free port"""
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stops the server"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, handler):
+        """Answers a request with the fixture of its path or a 404"""
+
+        path = handler.path.rstrip('/')
+        with self._lock:
+            self.requests[path] += 1
+            self.connections.add(handler.client_address)
+            failing = self.failures[path] > 0
+            if failing:
+                self.failures[path] -= 1
+        if self.delay:
+            time.sleep(self.delay)
+
+        data = self.fixtures.get(path)
+        if failing or data is None:
+            handler.send_response(503 if failing else 404)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        body = json.dumps(data).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if handler.headers.get('If-None-Match') == etag:
+            handler.send_response(304)
+            handler.send_header('ETag', etag)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('ETag', etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def add(self, path, data):
+        """Adds the fixture of an url path"""
+        self.fixtures[path.rstrip('/')] = data
+
+    def load_recording(self, path=FIXTURES_PATH):
+        """Adds the responses recorded by record_fixtures, the server must be started
+
+        The urls the application follows, to moves and to pokemon, are changed to point to the stub
+
+        Args:
+            path (str): path of the recorded responses
+
+        Returns:
+            StubPokeAPI: the stub itself
+        """
+
+        with open(path, encoding='utf-8') as file:
+            recording = json.load(file)
+        for path, data in recording['responses'].items():
+            for move in data.get('moves', ()):
+                move['move']['url'] = self.stub_url(move['move']['url'])
+            for result in data.get('results', ()):
+                result['url'] = self.stub_url(result['url'])
+            self.add(f"/api/v2{path}", data)
+        return self
+
+    def stub_url(self, url):
+        """Returns the stub url of a PokeAPI url"""
+        return self.url + url[len(RECORDED_URL):] if url.startswith(RECORDED_URL) else url
+
+    def move_url(self, move_name):
+        """Returns the stub url of a move"""
+        return f"{self.url}/move/{move_name}/"
+
+    def add_species(self, name, stats, moves, types=('normal',)):
+        """Adds a pokemon and its moves
+
+        Args:
+            name (str): name of the pokemon
+            stats (dict): dict with the base stats of the pokemon
+            moves (list<dict>): move fixtures in the listed order of the pokemon
+            types (tuple<str>): names of the pokemon types
+        """
+
+        for move in moves:
+            self.add(f"/api/v2/move/{move['name']}", move)
+        self.add(f"/api/v2/pokemon/{name}", species_fixture(name, stats, [
+            (move['name'], self.move_url(move['name']))
+            for move in moves
+        ], types))
+
+def species_fixture(name, stats, move_refs, types=('normal',), height=10, weight=100):
+    """Builds the PokeAPI data of a pokemon
+
+    Args:
+        name (str): name of the pokemon
+        stats (dict): dict with the base stats of the pokemon
+        move_refs (list<tuple>): list with the (name, url) of every move of the pokemon
+        types (tuple<str>): names of the pokemon types
+        height (int): height in decimetres
+        weight (int): weight in hectograms
+
+    Returns:
+        dict: dict shaped like the PokeAPI pokemon endpoint
+    """
+
+    return {
+        'name': name,
+        'height': height,
+        'weight': weight,
+        'types': [
+            {'slot': slot, 'type': {'name': type_name, 'url': ''}}
+            for slot, type_name in enumerate(types, start=1)
+        ],
+        'stats': [
+            {'stat': {'name': stat_name, 'url': ''}, 'base_stat': value}
+            for stat_name, value in stats.items()
+        ],
+        'moves': [
+            {'move': {'name': move_name, 'url': move_url}}
+            for move_name, move_url in move_refs
+        ],
+    }
+
+def move_fixture(name, power, type_name='normal', damage_class='physical', move_id=0):
+    """Builds the PokeAPI data of a move
+
+    Args:
+        name (str): name of the move
+        power (int): power of the move, None for moves that do no damage
+        type_name (str): name of the move type
+        damage_class (str): name of the move damage class
+        move_id (int): PokeAPI id of the move
+
+    Returns:
+        dict: dict shaped like the PokeAPI move endpoint
+    """
+
+    return {
+        'id': move_id,
+        'name': name,
+        'power': power,
+        'type': {'name': type_name, 'url': ''},
+        'damage_class': {'name': damage_class, 'url': ''},
+    }
+
+def record_fixtures(names, path, max_moves=20):
+    """Records the PokeAPI responses needed to load some pokemon, without the fields the application does not read
+
+    The moves of each pokemon are cut to their first max_moves, the recording also holds every type
+    and the list of the recorded pokemon names
+
+    Args:
+        names (list<str>): names of the pokemon
+        path (str): path of the json file written
+        max_moves (int): maximum number of moves recorded for each pokemon
+    """
+
+    # Imported here so the stub server does not depend on the application
+    from pokeapi_client import get_json
+    from type_chart import TYPES
+
+    def ref(data):
+        return {'name': data['name'], 'url': data['url']}
+
+    responses = {}
+    listed = []
+    for name in names:
+        data = get_json(f"{RECORDED_URL}/pokemon/{name.lower()}")
+        responses[f"/pokemon/{data['name']}"] = {
+            'id': data['id'],
+            'name': data['name'],
+            'height': data['height'],
+            'weight': data['weight'],
+            'types': [{'slot': type['slot'], 'type': ref(type['type'])} for type in data['types']],
+            'stats': [{'base_stat': stat['base_stat'], 'stat': ref(stat['stat'])} for stat in data['stats']],
+            'moves': [{'move': ref(move['move'])} for move in data['moves'][:max_moves]],
+        }
+        listed.append({'name': data['name'], 'url': f"{RECORDED_URL}/pokemon/{data['id']}/"})
+
+        for move in data['moves'][:max_moves]:
+            move_path = move['move']['url'][len(RECORDED_URL):].rstrip('/')
+            if move_path not in responses:
+                move_data = get_json(move['move']['url'])
+                responses[move_path] = {
+                    'id': move_data['id'],
+                    'name': move_data['name'],
+                    'power': move_data['power'],
+                    'type': ref(move_data['type']),
+                    'damage_class': ref(move_data['damage_class']),
+                }
+
+    for type_name in TYPES:
+        data = get_json(f"{RECORDED_URL}/type/{type_name}")
+        responses[f"/type/{type_name}"] = {
+            'id': data['id'],
+            'name': data['name'],
+            'damage_relations': {
+                relation: [ref(type) for type in data['damage_relations'][relation]]
+                for relation in ('double_damage_to', 'half_damage_to', 'no_damage_to')
+            },
+        }
+    responses[NAMES_PATH] = {'count': len(listed), 'results': listed}
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'url': RECORDED_URL, 'responses': responses}, file, indent=1, sort_keys=True)
+
+if __name__ == "__main__":
+    record_fixtures(sys.argv[2:], sys.argv[1])
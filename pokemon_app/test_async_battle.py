@@ -0,0 +1,155 @@
+"""Unnitest for async_battle.py
+
+The application runs against a stub PokeAPI serving recorded responses and a SQLite file standing in for mysql
+
+Functions:
+    get_application: AioHTTPTestCase method creating the application of each test
+    test_battle: unittest for /battle answering like battle.py
+    test_battle_errors: unittest for the 400 and 404 answers of /battle
+    test_concurrent_battles: unittest for many concurrent battles sharing the pokemon loads
+    test_show_previous_battles: unittest for the pages and the stream of /show_previous_battles
+    test_pokeapi_counters: unittest for the PokeAPI requests of the async client counted in /metrics
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from aiohttp.test_utils import AioHTTPTestCase
+import config
+import moves
+from async_battle import LOADER, WRITER, create_app
+from async_database import ThreadedDatabase
+from battle import app as flask_app
+from database import Database
+from pokeapi_client import endpoint_counters
+from pokemon import get_species
+from species_names import negative_cache, reset_name_index
+from stub_pokeapi import StubPokeAPI
+
+DB_INIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_init.sql')
+
+class TestAsyncBattle(AioHTTPTestCase):
+    async def get_application(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'battles.sqlite3')
+        conn = sqlite3.connect(path)
+        with open(DB_INIT) as file:
+            conn.executescript(file.read().replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT'))
+        conn.close()
+        self.database = Database(lambda: sqlite3.connect(path, check_same_thread=False), placeholder='?', dialect='sqlite')
+
+        moves._move_index.clear()
+        get_species.cache_clear()
+        negative_cache.clear()
+        reset_name_index()
+        self.stub = StubPokeAPI(delay=0.05).start().load_recording()
+        self.addCleanup(self.stub.stop)
+        for patch in (
+            mock.patch.object(config, 'POKEAPI_URL', self.stub.url),
+            mock.patch('async_pokemon.get_species_cache', return_value=None),
+            mock.patch('pokemon.get_species_cache', return_value=None),
+            mock.patch.object(config, 'WARMUP_ON_START', False),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(reset_name_index)
+        self.addCleanup(negative_cache.clear)
+        return create_app(ThreadedDatabase(self.database), warm_names=[])
+
+    def battles(self):
+        with self.database.connection() as conn:
+            return conn.execute("SELECT winner, pokemon1, pokemon2, seed FROM battles ORDER BY id").fetchall()
+
+    async def test_battle(self):
+        response = await self.client.get('/battle', params={'pokemon1': 'pikachu', 'pokemon2': 'squirtle', 'seed': '5'})
+        self.assertEqual(response.status, 200)
+        result = await response.json()
+        self.assertEqual(result['seed'], 5)
+        self.assertEqual(result['pokemon1']['name'], 'pikachu')
+        self.assertTrue(result['battle_log'])
+
+        # The sync server fights the same battle and answers the same json
+        with mock.patch('battle.store_battle_to_db'):
+            expected = flask_app.test_client().get('/battle?pokemon1=pikachu&pokemon2=squirtle&seed=5')
+        self.assertEqual(await response.text(), expected.get_data(as_text=True))
+
+        await self.app[WRITER].close()
+        self.assertEqual(self.battles(), [(result['winner'], 'pikachu', 'squirtle', 5)])
+
+    async def test_battle_errors(self):
+        response = await self.client.get('/battle', params={'pokemon1': 'pikachu'})
+        self.assertEqual(response.status, 400)
+        self.assertEqual(await response.json(), {'Error': '/battle requires two pokemon names'})
+
+        response = await self.client.get('/battle', params={'pokemon1': 'pikachu', 'pokemon2': 'squirtle', 'seed': '-1'})
+        self.assertEqual(response.status, 400)
+
+        response = await self.client.get('/battle', params={'pokemon1': 'pikachuu', 'pokemon2': 'squirtle'})
+        self.assertEqual(response.status, 404)
+        self.assertTrue((await response.json())['Error'].startswith('Pokemon pikachuu was not found'))
+
+    async def test_concurrent_battles(self):
+        responses = await asyncio.gather(*(
+            self.client.get('/battle', params={'pokemon1': 'pikachu', 'pokemon2': 'squirtle', 'seed': str(seed)})
+            for seed in range(200)
+        ))
+        self.assertEqual([response.status for response in responses], [200] * 200)
+
+        # Each pokemon and move was fetched once
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/pikachu'], 1)
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/squirtle'], 1)
+        self.assertEqual(max(count for path, count in self.stub.requests.items() if '/move/' in path), 1)
+
+        await self.app[WRITER].close()
+        self.assertEqual(len(self.battles()), 200)
+
+    async def test_show_previous_battles(self):
+        for seed in range(3):
+            await self.client.get('/battle', params={'pokemon1': 'eevee', 'pokemon2': 'onix', 'seed': str(seed)})
+        await self.app[WRITER].close()
+
+        response = await self.client.get('/show_previous_battles', params={'limit': '2'})
+        self.assertEqual(response.status, 200)
+        page = await response.json()
+        self.assertEqual([row[0] for row in page], [1, 2])
+        self.assertEqual(response.headers['X-Next-After-Id'], '2')
+
+        response = await self.client.get('/show_previous_battles', params={'after_id': '2', 'format': 'ndjson'})
+        lines = (await response.text()).splitlines()
+        self.assertEqual([json.loads(line)[0] for line in lines], [3])
+        self.assertNotIn('X-Next-After-Id', response.headers)
+
+        for params in ({'limit': '0'}, {'limit': 'abc'}, {'after_id': 'x'}):
+            response = await self.client.get('/show_previous_battles', params=params)
+            self.assertEqual(response.status, 400)
+            # The sync server rejects the same parameters
+            with mock.patch('battle.get_database', return_value=self.database):
+                self.assertEqual(flask_app.test_client().get('/show_previous_battles', query_string=params).status_code, 400)
+
+    async def test_pokeapi_counters(self):
+        before = endpoint_counters.stats()
+        response = await self.client.get('/battle', params={'pokemon1': 'pikachu', 'pokemon2': 'squirtle'})
+        self.assertEqual(response.status, 200)
+        stats = endpoint_counters.stats()
+        # Every request the stub received was counted, the name index and both pokemon
+        sent = sum(count for path, count in self.stub.requests.items() if path.startswith('/api/v2/pokemon'))
+        self.assertEqual(stats['pokemon']['requests'] - before.get('pokemon', {}).get('requests', 0), sent)
+        self.assertGreater(stats['move']['bytes'], before.get('move', {}).get('bytes', 0))
+        # The moves went to the shared move index
+        self.assertIsNotNone(moves.find_move(next(iter(moves._move_index))))
+
+        text = await (await self.client.get('/metrics')).text()
+        self.assertIn(f'pokeapi_requests_total{{endpoint="pokemon"}} {stats["pokemon"]["requests"]}', text)
+
+        # A response fetched again is revalidated
+        client = self.app[LOADER].client
+        await client.get_json(f'{self.stub.url}/pokemon/pikachu')
+        self.assertEqual(endpoint_counters.stats()['pokemon']['cache_hits'], stats['pokemon']['cache_hits'] + 1)
+
+if __name__ == "__main__":
+    unittest.main()
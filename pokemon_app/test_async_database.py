@@ -0,0 +1,98 @@
+"""Unnitest for async_database.py
+
+The aiomysql pool is replaced by a fake pool recording what is done with its connections
+
+Functions:
+    setUp: unnitest method called before each test
+    test_fetch_all: unittest for AsyncDatabase.fetch_all
+    test_execute: unittest for AsyncDatabase.execute committing a transaction
+    test_execute_error: unittest for AsyncDatabase.execute rolling back a failed transaction
+    test_stream_closed: unittest for AsyncDatabase.stream released by aclose
+    test_create_database: unittest for create_database opening an autocommit pool
+"""
+
+import unittest
+from unittest import mock
+import aiomysql
+from async_database import AsyncDatabase, create_database
+
+class FakeCursor:
+    """A cursor returning rows and recording the statements executed"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, query, parameters=None):
+        if query == 'FAIL':
+            raise RuntimeError("failed statement")
+        self.connection.statements.append((query, parameters))
+
+    async def fetchall(self):
+        return list(self.connection.rows)
+
+    async def fetchmany(self, size):
+        rows, self.connection.rows = self.connection.rows[:size], self.connection.rows[size:]
+        return rows
+
+class FakeConnection:
+    """A connection recording its statements and transactions"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.begin = mock.AsyncMock()
+        self.commit = mock.AsyncMock()
+        self.rollback = mock.AsyncMock()
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.conn = FakeConnection([(1,), (2,), (3,)])
+        self.pool = mock.Mock(acquire=mock.AsyncMock(return_value=self.conn))
+        self.database = AsyncDatabase(self.pool)
+
+    async def test_fetch_all(self):
+        self.assertEqual(await self.database.fetch_all('SELECT id FROM battles', []), [(1,), (2,), (3,)])
+        self.pool.release.assert_called_once_with(self.conn)
+        # Reads open no transaction, the pool keeps the connection
+        self.conn.begin.assert_not_called()
+
+    async def test_execute(self):
+        await self.database.execute([('INSERT 1', [1]), ('INSERT 2', [2])])
+        self.conn.begin.assert_awaited_once()
+        self.conn.commit.assert_awaited_once()
+        self.conn.rollback.assert_not_called()
+        self.assertEqual(self.conn.statements, [('INSERT 1', [1]), ('INSERT 2', [2])])
+        self.pool.release.assert_called_once_with(self.conn)
+
+    async def test_execute_error(self):
+        with self.assertRaises(RuntimeError):
+            await self.database.execute([('INSERT 1', [1]), ('FAIL',)])
+        self.conn.begin.assert_awaited_once()
+        self.conn.rollback.assert_awaited_once()
+        self.conn.commit.assert_not_called()
+        self.pool.release.assert_called_once_with(self.conn)
+
+    async def test_stream_closed(self):
+        batches = self.database.stream('SELECT id FROM battles', [], 2)
+        self.assertEqual(await batches.__anext__(), [(1,), (2,)])
+        self.pool.release.assert_not_called()
+        await batches.aclose()
+        self.pool.release.assert_called_once_with(self.conn)
+
+    async def test_create_database(self):
+        with mock.patch.object(aiomysql, 'create_pool', mock.AsyncMock(return_value=self.pool)) as create_pool:
+            database = await create_database()
+        self.assertIs(database.pool, self.pool)
+        self.assertTrue(create_pool.call_args.kwargs['autocommit'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,236 @@
+"""Unnitest for battle.py
+
+A SQLite file stands in for the mysql database
+
+Functions:
+    setUp: unnitest method called before each test
+    test_battles_query: unittest for battles_query
+    test_parse_date: unittest for parse_date
+    test_parse_int: unittest for parse_int
+    test_parse_seed: unittest for parse_seed
+    test_batch_battles: unittest for /battles
+    test_replay_battle: unittest for /battle/<id>/replay
+    test_log_formats: unittest for the text and events formats of the battle logs
+    test_leaderboard: unittest for /leaderboard and /stats/<pokemon>
+    test_odds_samples: unittest for the n parameter of /battle/odds
+    test_stream_closed: unittest for stream_battles left by its client mid-stream
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+import config
+from battle import MAX_SEED, app, battles_query, parse_date, parse_int, parse_seed, stream_battles
+from database import Database
+from pokemon import Species, species_not_found
+
+TACKLE = {'damage_class': {'name': 'physical', 'url': ''}, 'type': {'name': 'normal', 'url': ''}, 'power': 40}
+SPECIES = {
+    'rattata': Species('rattata', ['normal'], {'hp': 30, 'attack': 56, 'defense': 35, 'special-attack': 25, 'special-defense': 35, 'speed': 72}, {'tackle': TACKLE}),
+    'pidgey': Species('pidgey', ['normal', 'flying'], {'hp': 40, 'attack': 45, 'defense': 40, 'special-attack': 35, 'special-defense': 35, 'speed': 56}, {'tackle': TACKLE}),
+}
+
+DB_INIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_init.sql')
+
+class TestBattle(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'battles.sqlite3')
+        conn = sqlite3.connect(path)
+        with open(DB_INIT) as file:
+            conn.executescript(file.read().replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT'))
+        conn.close()
+        self.inserts = []
+
+        def connect():
+            conn = sqlite3.connect(path, check_same_thread=False)
+            # Record the inserts executed
+            conn.set_trace_callback(lambda sql: sql.startswith("INSERT INTO battles") and self.inserts.append(sql))
+            return conn
+
+        self.database = Database(connect, placeholder='?', dialect='sqlite')
+        self.loads = []
+
+        def get_species(name):
+            self.loads.append(name)
+            if name not in SPECIES:
+                raise species_not_found(f'Pokemon {name} was not found')
+            return SPECIES[name]
+
+        for patch in (
+            mock.patch('battle.get_species', get_species),
+            mock.patch('battle.get_database', return_value=self.database),
+            mock.patch.object(config, 'WARMUP_ON_START', False),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_battles_query(self):
+        query, parameters = battles_query('%s', after_id=10, limit=50)
+        self.assertEqual(query, "SELECT * FROM battles WHERE id > %s ORDER BY id LIMIT 50")
+        self.assertEqual(parameters, [10])
+
+        since = datetime(2024, 1, 1)
+        query, parameters = battles_query('?', winner='mr_mime', since=since)
+        self.assertEqual(query, "SELECT * FROM battles WHERE id > ? AND winner LIKE ? ESCAPE '!' AND battle_date >= ? ORDER BY id")
+        self.assertEqual(parameters, [0, 'mr!_mime is the winner%', since])
+
+    def test_parse_date(self):
+        self.assertIsNone(parse_date(None))
+        self.assertEqual(parse_date('2024-01-02T03:04:05'), datetime(2024, 1, 2, 3, 4, 5))
+        with self.assertRaises(ValueError):
+            parse_date('yesterday')
+
+    def test_parse_int(self):
+        self.assertEqual(parse_int('n', '42', 10), 42)
+        self.assertEqual(parse_int('n', None, 10), 10)
+        with self.assertRaisesRegex(ValueError, 'n must be an integer'):
+            parse_int('n', 'abc', 10)
+
+    def test_parse_seed(self):
+        self.assertEqual(parse_seed('42'), 42)
+        self.assertEqual(parse_seed(42), 42)
+        self.assertTrue(0 <= parse_seed(None) <= MAX_SEED)
+        for seed in ('-1', 'abc', 1.5, True, MAX_SEED + 1):
+            with self.assertRaises(ValueError):
+                parse_seed(seed)
+
+    def test_batch_battles(self):
+        client = app.test_client()
+        response = client.post('/battles', json=[
+            {'pokemon1': 'rattata', 'pokemon2': 'pidgey'},
+            {'pokemon1': 'rattata', 'pokemon2': 'pikachuu'},
+            {'pokemon1': 'pidgey'},
+            {'pokemon1': 'pidgey', 'pokemon2': 'pidgey'},
+            {'pokemon1': 'pikachuu', 'pokemon2': 'rattata'},
+            {'pokemon1': 'pidgey', 'pokemon2': 'rattata', 'seed': 'abc'},
+        ])
+        self.assertEqual(client.post('/battles', json={}).status_code, 400)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()
+        self.assertEqual(results[0]['pokemon1']['name'], 'rattata')
+        self.assertEqual(results[0]['pokemon2']['name'], 'pidgey')
+        self.assertEqual(results[1], {'Error': 'Pokemon pikachuu was not found', 'status': 404})
+        self.assertEqual(results[2]['status'], 400)
+        self.assertEqual(results[3]['pokemon2']['name'], 'pidgey2')
+        self.assertEqual(results[4]['status'], 404)
+        self.assertEqual(results[5]['status'], 400)
+
+        # Each pokemon is loaded once and the battles are stored by a single insert
+        self.assertEqual(sorted(self.loads), ['pidgey', 'pikachuu', 'rattata'])
+        self.assertEqual(len(self.inserts), 1)
+        with self.database.connection() as conn:
+            winners = [row[0] for row in conn.execute("SELECT winner FROM battles ORDER BY id")]
+        self.assertEqual(winners, [results[0]['winner'], results[3]['winner']])
+
+    def test_replay_battle(self):
+        client = app.test_client()
+        matchups = [{'pokemon1': 'rattata', 'pokemon2': 'pidgey', 'seed': seed} for seed in (1, 2, 1)]
+        results = client.post('/battles', json=matchups).get_json()
+        # The same seed fights the same battle
+        self.assertEqual(results[0]['battle_log'], results[2]['battle_log'])
+        self.assertNotEqual(results[0]['battle_log'], results[1]['battle_log'])
+
+        with self.database.connection() as conn:
+            row = conn.execute("SELECT pokemon1, pokemon2, seed, data_version, battle_log FROM battles WHERE id = 2").fetchone()
+        self.assertEqual(row, ('rattata', 'pidgey', 2, results[1]['data_version'], None))
+
+        replay = client.get('/battle/2/replay').get_json()
+        self.assertEqual(replay['battle_log'], results[1]['battle_log'])
+        self.assertEqual(replay['winner'], results[1]['winner'])
+        self.assertTrue(replay['verified'])
+        self.assertEqual(client.get('/battle/10/replay').status_code, 404)
+
+    def test_log_formats(self):
+        client = app.test_client()
+        matchup = [{'pokemon1': 'rattata', 'pokemon2': 'pidgey', 'seed': 7}]
+        text = client.post('/battles', json=matchup).get_json()[0]
+        events = client.post('/battles?format=events', json=matchup).get_json()[0]
+        self.assertEqual(events['moves'], [['tackle'], ['tackle']])
+        self.assertEqual(len(events['battle_log']), len(text['battle_log']))
+        first = events['battle_log'][0]
+        names = ('rattata', 'pidgey')
+        self.assertEqual(
+            text['battle_log'][0],
+            f"{names[first['attacker']]} attacks {names[1 - first['attacker']]} with tackle. "
+            f"It does {first['damage']} damage and {names[1 - first['attacker']]} has {first['remaining_hp']} hitpoints remaining",
+        )
+        self.assertEqual(client.post('/battles?format=html', json=matchup).status_code, 400)
+
+        # The history shows the stored events as lists of their fields
+        history = client.get('/show_previous_battles').get_json()
+        fields = ('attacker', 'move', 'damage', 'multiplier', 'remaining_hp')
+        self.assertEqual(history[0][6], [[event[field] for field in fields] for event in events['battle_log']])
+
+    def test_leaderboard(self):
+        client = app.test_client()
+        results = client.post('/battles', json=[
+            {'pokemon1': 'rattata', 'pokemon2': 'pidgey', 'seed': seed} for seed in range(10)
+        ]).get_json()
+        rattata_wins = sum(result['winner'].startswith('rattata is the winner') for result in results)
+        pidgey_wins = sum(result['winner'].startswith('pidgey is the winner') for result in results)
+
+        stats = client.get('/stats/Rattata').get_json()
+        self.assertEqual(stats['battles'], 10)
+        self.assertEqual(stats['wins'], rattata_wins)
+        self.assertEqual(stats['losses'], pidgey_wins)
+        self.assertEqual(stats['draws'], 10 - rattata_wins - pidgey_wins)
+        self.assertEqual(stats['win_rate'], rattata_wins / 10)
+        self.assertEqual(client.get('/stats/pikachu').status_code, 404)
+
+        leaderboard = client.get('/leaderboard?limit=1').get_json()
+        self.assertEqual(len(leaderboard), 1)
+        self.assertEqual(leaderboard[0]['wins'], max(rattata_wins, pidgey_wins))
+        self.assertEqual(client.get('/leaderboard?limit=0').status_code, 400)
+        self.assertEqual(client.get('/leaderboard?limit=abc').status_code, 400)
+
+        # Database errors are answered like in /show_previous_battles
+        with mock.patch.object(self.database, 'connection', side_effect=ConnectionError('database unreachable')):
+            for route in ('/leaderboard', '/stats/rattata', '/show_previous_battles', '/battle/1/replay'):
+                response = client.get(route)
+                self.assertEqual(response.get_data(as_text=True), 'An error occurred: database unreachable')
+
+    def test_odds_samples(self):
+        client = app.test_client()
+        response = client.get('/battle/odds?pokemon1=rattata&pokemon2=pidgey&n=50')
+        self.assertEqual(response.status_code, 200)
+        for n in ('abc', '0', '1.5'):
+            response = client.get(f'/battle/odds?pokemon1=rattata&pokemon2=pidgey&n={n}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Error', response.get_json())
+
+    def test_stream_closed(self):
+        class Cursor:
+            # Like an unbuffered mysql cursor, closing it with unread rows fails
+            rows = [(1, 'a'), (2, 'b'), (3, 'c')]
+
+            def execute(self, query, parameters):
+                pass
+
+            def fetchmany(self, size):
+                rows, self.rows = self.rows[:size], self.rows[size:]
+                return rows
+
+            def close(self):
+                if self.rows:
+                    raise RuntimeError("Unread result found")
+
+        conn = mock.Mock(cursor=Cursor)
+        pooled = mock.Mock()
+        database = Database(pooled, pool_size=1, connect_dedicated=lambda: conn)
+        with mock.patch('battle.get_database', return_value=database), mock.patch.object(config, 'BATTLES_STREAM_BATCH_SIZE', 1):
+            lines = stream_battles("SELECT * FROM battles", [])
+            self.assertEqual(next(lines), '[1, "a"]\n')
+            lines.close()
+
+        # The dedicated connection is closed with its unread rows, the pool is never used
+        conn.close.assert_called_once_with()
+        pooled.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
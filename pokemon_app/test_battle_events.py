@@ -0,0 +1,51 @@
+"""Unnitest for battle_events.py
+
+Functions:
+    test_encode_decode: unittest for encode_events and decode_events
+    test_render_text: unittest for render_text against the sentences of Pokemon.attack
+"""
+
+import random
+import unittest
+from battle import create_combatants, simulate_battle
+from battle_events import EVENT_RECORD, TurnEvent, decode_events, encode_events, render_events, render_text
+from pokemon import BATTLE_TURNS, Species
+
+TACKLE = {'damage_class': {'name': 'physical', 'url': ''}, 'type': {'name': 'normal', 'url': ''}, 'power': 40}
+THUNDER_SHOCK = {'damage_class': {'name': 'special', 'url': ''}, 'type': {'name': 'electric', 'url': ''}, 'power': 40}
+PIKACHU = Species('pikachu', ['electric'], {'hp': 35, 'attack': 55, 'defense': 40, 'speed': 90}, {'thunder-shock': THUNDER_SHOCK, 'tackle': TACKLE})
+PIDGEY = Species('pidgey', ['normal', 'flying'], {'hp': 40, 'attack': 45, 'defense': 40, 'speed': 56}, {'tackle': TACKLE})
+
+class TestBattleEvents(unittest.TestCase):
+    def test_encode_decode(self):
+        events = [TurnEvent(0, 1, 24, 2.0, 16), TurnEvent(1, 0, 11, 1.0, 24), TurnEvent(0, 0, 37, 0.25, -21)]
+        data = encode_events(events)
+        self.assertEqual(len(data), 1 + 3 * EVENT_RECORD.size)
+        self.assertEqual(decode_events(data), events)
+        self.assertEqual(decode_events(bytearray(data)), events)
+        self.assertEqual(render_events(events[:1]), [{'attacker': 0, 'move': 1, 'damage': 24, 'multiplier': 2.0, 'remaining_hp': 16}])
+        with self.assertRaises(ValueError):
+            decode_events(data[:-1])
+
+    def test_render_text(self):
+        for seed in range(20):
+            # The sentences of Pokemon.attack
+            pokemon1, pokemon2 = create_combatants(PIKACHU, PIDGEY, False)
+            rng = random.Random(seed)
+            attacker, defender = pokemon1.select_attacker_defender(pokemon2, rng)
+            sentences = []
+            for turn in range(BATTLE_TURNS):
+                sentences.append(attacker.attack(defender, rng))
+                if defender.current_hp <= 0:
+                    break
+                attacker, defender = defender, attacker
+
+            pokemon1, pokemon2 = create_combatants(PIKACHU, PIDGEY, False)
+            _, events = simulate_battle(pokemon1, pokemon2, random.Random(seed))
+            self.assertEqual(
+                render_text(events, ('pikachu', 'pidgey'), (list(PIKACHU.moves), list(PIDGEY.moves))),
+                sentences,
+            )
+
+if __name__ == "__main__":
+    unittest.main()
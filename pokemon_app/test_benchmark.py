@@ -0,0 +1,75 @@
+"""Unnitest for benchmark.py
+
+Functions:
+    test_percentile: unittest for percentile
+    test_summarize: unittest for summarize
+    test_run_benchmark: unittest for a small run_benchmark of each server
+    test_async_server_cold: unittest for AsyncServer starting without a warm-up like SyncServer
+    test_cold_without_species_cache: unittest for the cold scenario of each server not reading the persistent species cache
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import config
+from benchmark import AsyncServer, percentile, run_benchmark, stub_database, summarize
+from species_cache import SpeciesCache, get_species_cache
+from warmup import Warmup
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarize(self):
+        summary = summarize([0.002, 0.001, 0.004, 0.003], 1, 0.5)
+        self.assertEqual(summary, {
+            'requests': 4, 'errors': 1, 'seconds': 0.5, 'throughput': 8.0,
+            'p50_ms': 2.0, 'p95_ms': 4.0, 'p99_ms': 4.0, 'max_ms': 4.0,
+        })
+
+    def test_run_benchmark(self):
+        for server in ('sync', 'async'):
+            with self.subTest(server=server):
+                results = run_benchmark(requests_count=20, concurrency=4, upstream_delay=0, history_limit=10, server=server)
+                self.assertEqual(results['settings']['requests'], 20)
+                cold, warm = results['scenarios']['cold'], results['scenarios']['warm']
+                for scenario in (cold, warm):
+                    for route in ('battle', 'show_previous_battles'):
+                        self.assertEqual(scenario[route]['requests'], 20)
+                        self.assertEqual(scenario[route]['errors'], 0)
+                        self.assertLessEqual(scenario[route]['p50_ms'], scenario[route]['p99_ms'])
+
+                # Only the cold battles load pokemon from PokeAPI
+                self.assertGreater(cold['upstream_requests']['pokemon'], 0)
+                self.assertNotIn('pokemon', warm['upstream_requests'])
+                self.assertIn('warmup_seconds', warm)
+
+    def test_async_server_cold(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(Warmup, 'start') as start:
+            server = AsyncServer(stub_database(os.path.join(directory, 'battles.sqlite3')))
+            server.stop()
+        start.assert_not_called()
+
+    def test_cold_without_species_cache(self):
+        # A configured cache knowing every pokemon would answer the cold battles without PokeAPI
+        cached = mock.patch.object(SpeciesCache, 'get', return_value={'types': ['normal'], 'stats': {}, 'moves': {}})
+        with tempfile.TemporaryDirectory() as directory, cached as get, \
+                mock.patch.object(config, 'SPECIES_CACHE_PATH', os.path.join(directory, 'species.sqlite3')):
+            get_species_cache.cache_clear()
+            self.addCleanup(get_species_cache.cache_clear)
+            for server in ('sync', 'async'):
+                with self.subTest(server=server):
+                    results = run_benchmark(requests_count=10, concurrency=2, upstream_delay=0, history_limit=10, server=server)
+                    cold = results['scenarios']['cold']['upstream_requests']
+                    self.assertGreater(cold['pokemon'], 1)
+                    self.assertGreater(cold['move'], 0)
+        get.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
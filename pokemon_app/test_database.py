@@ -0,0 +1,127 @@
+"""Unnitest for database.py
+
+A SQLite file stands in for the mysql database
+
+Functions:
+    setUp: unnitest method called before each test
+    test_connection: unittest for Database.connection
+    test_writer_batches: unittest for BattleLogWriter writing full batches
+    test_writer_deadline: unittest for BattleLogWriter writing after flush_interval
+    test_writer_backpressure: unittest for BattleLogWriter with a full queue
+    test_writer_retry: unittest for BattleLogWriter retrying a batch the database failed to store
+    test_writer_drop: unittest for BattleLogWriter counting the battles dropped after every retry
+"""
+
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from database import BattleLogWriter, Database
+from metrics import BATTLES_DROPPED
+
+DB_INIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_init.sql')
+
+def battle(i):
+    """Returns the values of a battle won by pikachu when i is even and a draw when it is odd"""
+    remaining_hp = (10, -3) if i % 2 == 0 else (5, 5)
+    return (f'battle{i}', 'pikachu', 'Squirtle', i, '1-0', b'\x01', *remaining_hp)
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'battles.sqlite3')
+        conn = sqlite3.connect(path)
+        with open(DB_INIT) as file:
+            conn.executescript(file.read().replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT'))
+        conn.close()
+        self.inserts = []
+
+        def connect():
+            conn = sqlite3.connect(path, check_same_thread=False)
+            # Record the inserts executed
+            conn.set_trace_callback(lambda sql: sql.startswith("INSERT INTO battles") and self.inserts.append(sql))
+            return conn
+
+        self.connect = connect
+        self.database = Database(connect, pool_size=2, placeholder='?', dialect='sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def count_battles(self):
+        with self.database.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM battles").fetchone()[0]
+
+    def test_connection(self):
+        borrowed = threading.Event()
+
+        def borrow():
+            with self.database.connection():
+                borrowed.set()
+
+        # Only pool_size connections are lent at the same time
+        with self.database.connection(), self.database.connection():
+            thread = threading.Thread(target=borrow)
+            thread.start()
+            self.assertFalse(borrowed.wait(0.1))
+        thread.join()
+        self.assertTrue(borrowed.is_set())
+
+    def test_writer_batches(self):
+        writer = BattleLogWriter(self.database, batch_size=3, flush_interval=10).start()
+        for i in range(7):
+            writer.submit(battle(i))
+        writer.close()
+        # Two full batches and the rest when the writer is closed, each with the results of its species
+        self.assertEqual(self.count_battles(), 7)
+        self.assertEqual(len(self.inserts), 3)
+        with self.database.connection() as conn:
+            stats = conn.execute("SELECT * FROM species_stats ORDER BY species").fetchall()
+        # The first pokemon wins the even battles, the odd ones are draws
+        self.assertEqual(stats, [('pikachu', 7, 4, 0, 3, 4 * 10 + 3 * 5, 7), ('squirtle', 7, 0, 4, 3, 3 * 5, 7)])
+
+    def test_writer_deadline(self):
+        writer = BattleLogWriter(self.database, batch_size=100, flush_interval=0.05).start()
+        writer.submit(battle(1))
+        time.sleep(0.3)
+        self.assertEqual(self.count_battles(), 1)
+        writer.close()
+
+    def test_writer_backpressure(self):
+        # Without a running writer the queue fills up
+        writer = BattleLogWriter(self.database, max_queue=1, put_timeout=0.01)
+        writer.submit(battle(1))
+        with self.assertRaises(queue.Full):
+            writer.submit(battle(2))
+
+    def test_writer_retry(self):
+        # The first connection fails like a database restarting
+        failures = iter([ConnectionError('database unreachable')])
+
+        def flaky_connect():
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return self.connect()
+
+        writer = BattleLogWriter(Database(flaky_connect, placeholder='?', dialect='sqlite'), retry_backoff=0.01).start()
+        writer.submit(battle(1))
+        writer.submit(battle(2))
+        writer.close()
+        self.assertEqual(self.count_battles(), 2)
+
+    def test_writer_drop(self):
+        dropped = BATTLES_DROPPED.labels().value
+        connect = mock.Mock(side_effect=ConnectionError('database unreachable'))
+        writer = BattleLogWriter(Database(connect, placeholder='?', dialect='sqlite'), retries=2, retry_backoff=0.01).start()
+        writer.submit(battle(1))
+        writer.close()
+        self.assertEqual(connect.call_count, 3)
+        self.assertEqual(BATTLES_DROPPED.labels().value, dropped + 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Unnitest for datapack.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_species_data: unittest for DataPack.species_data
+    test_type_chart: unittest for DataPack.type_chart
+    test_pokemon_from_data_pack: unittest for loading a Pokemon from the data pack
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import config
+from datapack import DataPack, build_data_pack, get_data_pack
+from pokemon import Pokemon
+from stub_pokeapi import move_fixture, species_fixture
+from type_chart import get_damage_multiplier
+
+TYPES = {
+    'normal': {'double_damage_to': [], 'half_damage_to': [], 'no_damage_to': []},
+    'water': {'double_damage_to': ['ground'], 'half_damage_to': ['water'], 'no_damage_to': []},
+    'electric': {'double_damage_to': ['water'], 'half_damage_to': ['electric'], 'no_damage_to': ['ground']},
+    'ground': {'double_damage_to': ['electric'], 'half_damage_to': [], 'no_damage_to': []},
+}
+
+class TestDataPack(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        dump = os.path.join(self.directory.name, 'dump')
+
+        def write(endpoint, resource_id, data):
+            os.makedirs(os.path.join(dump, endpoint, str(resource_id)))
+            with open(os.path.join(dump, endpoint, str(resource_id), 'index.json'), 'w', encoding='utf-8') as file:
+                json.dump(dict(data, id=resource_id), file)
+
+        for type_id, (name, relations) in enumerate(TYPES.items(), start=1):
+            write('type', type_id, {'name': name, 'damage_relations': {
+                relation: [{'name': type_name} for type_name in type_names]
+                for relation, type_names in relations.items()
+            }})
+        moves = [
+            move_fixture('growl', None, damage_class='status'),
+            move_fixture('thunder-shock', 40, 'electric', 'special'),
+            move_fixture('quick-attack', 40),
+            move_fixture('water-gun', 40, 'water', 'special'),
+            move_fixture('thunderbolt', 90, 'electric', 'special'),
+            move_fixture('slam', 80),
+            move_fixture('thunder', 110, 'electric', 'special'),
+        ]
+        for move_id, move in enumerate(moves, start=1):
+            write('move', move_id, move)
+
+        stats = {'hp': 35, 'attack': 55, 'defense': 40, 'special-attack': 50, 'special-defense': 50, 'speed': 90}
+        pikachu_moves = ['growl', 'thunder-shock', 'quick-attack', 'thunderbolt', 'slam', 'thunder']
+        write('pokemon', 25, species_fixture('pikachu', stats, [(name, '') for name in pikachu_moves], ('electric',), 4, 60))
+        write('pokemon', 7, species_fixture('squirtle', dict(stats, hp=44), [('water-gun', '')], ('water',)))
+        write('pokemon', 132, species_fixture('ditto', dict(stats, hp=48), [('growl', '')], ('normal', 'ground')))
+
+        self.path = os.path.join(self.directory.name, 'pokemon.pack')
+        self.assertEqual(build_data_pack(dump, self.path), {'types': 4, 'moves': 7, 'pokemon': 3})
+        self.pack = DataPack(self.path)
+
+    def tearDown(self):
+        self.pack.close()
+        self.directory.cleanup()
+
+    def test_species_data(self):
+        pikachu = self.pack.species_data('Pikachu')
+        self.assertEqual(pikachu['types'], ['electric'])
+        self.assertEqual(pikachu['stats'], {'Height': 0.4, 'Weight': 6.0, 'hp': 35, 'attack': 55, 'defense': 40, 'special-attack': 50, 'special-defense': 50, 'speed': 90})
+        # The first four moves with power, in the listed order
+        self.assertEqual(list(pikachu['moves']), ['thunder-shock', 'quick-attack', 'thunderbolt', 'slam'])
+        self.assertEqual(pikachu['moves']['thunderbolt']['power'], 90)
+        self.assertEqual(pikachu['moves']['thunderbolt']['type']['name'], 'electric')
+        self.assertEqual(pikachu['moves']['thunderbolt']['damage_class']['name'], 'special')
+
+        self.assertEqual(self.pack.species_data('ditto')['types'], ['normal', 'ground'])
+        self.assertEqual(self.pack.species_data('ditto')['moves'], {})
+        self.assertIsNone(self.pack.species_data('pikachuu'))
+
+    def test_type_chart(self):
+        type_index, matrix = self.pack.type_chart()
+        self.assertEqual(matrix[type_index['electric']][type_index['water']], 2.0)
+        self.assertEqual(matrix[type_index['electric']][type_index['ground']], 0.0)
+        self.assertEqual(matrix[type_index['water']][type_index['water']], 0.5)
+        self.assertEqual(matrix[type_index['normal']][type_index['water']], 1.0)
+
+    def test_pokemon_from_data_pack(self):
+        get_data_pack.cache_clear()
+        try:
+            with mock.patch.object(config, 'DATA_PACK_PATH', self.path), mock.patch('pokemon.get_json') as get_json:
+                squirtle = Pokemon('Squirtle')
+                ditto = Pokemon('Ditto')
+                self.assertEqual(squirtle.stats['hp'], 44)
+                self.assertEqual(list(squirtle.moves), ['water-gun'])
+                self.assertEqual(list(ditto.moves), ['struggle'])
+                self.assertEqual(get_damage_multiplier('water', ditto.types), 2.0)
+                get_json.assert_not_called()
+                get_data_pack().close()
+        finally:
+            get_data_pack.cache_clear()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Unnitest for metrics.py
+
+Functions:
+    test_counter: unittest for Counter and FunctionCounter samples
+    test_histogram: unittest for Histogram buckets
+    test_timed: unittest for the timed decorator
+    test_metrics_route: unittest for localhost:5000/metrics
+"""
+
+import unittest
+from unittest import mock
+import config
+from battle import app
+from metrics import PHASE_SECONDS, Counter, FunctionCounter, Histogram, Registry, timed
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        registry = Registry()
+        counter = Counter('lookups_total', "Lookups", ('cache', 'result'), registry=registry)
+        counter.labels('moves', 'hit').inc()
+        counter.labels('moves', 'hit').inc(2)
+        FunctionCounter('calls_total', "Calls", (), lambda: {(): 7}, registry=registry)
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP lookups_total Lookups',
+            '# TYPE lookups_total counter',
+            'lookups_total{cache="moves",result="hit"} 3',
+            '# HELP calls_total Calls',
+            '# TYPE calls_total counter',
+            'calls_total 7',
+        ]) + '\n')
+        with self.assertRaises(ValueError):
+            counter.labels('moves')
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = Histogram('latency_seconds', "Latency", buckets=(0.1, 1.0), registry=registry)
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(registry.render().splitlines()[2:], [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1.0"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            'latency_seconds_sum 2.65',
+            'latency_seconds_count 4',
+        ])
+
+    def test_timed(self):
+        child = PHASE_SECONDS.labels('test_phase')
+        before = sum(child.counts)
+
+        @timed('test_phase')
+        def work():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            work()
+        self.assertEqual(sum(child.counts), before + 1)
+
+    def test_metrics_route(self):
+        with mock.patch.object(config, 'WARMUP_ON_START', False):
+            response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE pokemon_phase_seconds histogram', text)
+        self.assertIn('# TYPE pokemon_species_memory_cache_lookups_total counter', text)
+
+if __name__ == "__main__":
+    unittest.main()
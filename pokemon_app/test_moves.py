@@ -0,0 +1,96 @@
+"""Unnitest for moves.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_get_move: unittest for get_move
+    test_damaging_moves: unittest for damaging_moves
+    test_index_move: unittest for find_move, index_move and missing_moves
+    test_resolve_moves_in_parallel: unittest for resolve_moves against a slow stub PokeAPI
+    test_resolve_moves_cancels_remaining: unittest for resolve_moves stopping after four moves
+"""
+
+import time
+import unittest
+from unittest import mock
+import moves
+from stub_pokeapi import StubPokeAPI, move_fixture
+
+def move_info(power, type_name='normal'):
+    return {
+        'damage_class': {'name': 'physical', 'url': 'https://pokeapi.co/api/v2/move-damage-class/2/'},
+        'type': {'name': type_name, 'url': 'https://pokeapi.co/api/v2/type/1/'},
+        'power': power,
+    }
+
+class TestMoves(unittest.TestCase):
+    def setUp(self):
+        moves._move_index.clear()
+
+    def test_get_move(self):
+        with mock.patch('moves.get_json', return_value=dict(move_info(40), name='tackle', accuracy=100)) as get:
+            self.assertEqual(moves.get_move('tackle', 'https://pokeapi.co/api/v2/move/33/'), move_info(40))
+            self.assertEqual(moves.get_move('tackle', 'https://pokeapi.co/api/v2/move/33/'), move_info(40))
+        # The move is fetched only once
+        get.assert_called_once_with('https://pokeapi.co/api/v2/move/33/')
+
+    def test_damaging_moves(self):
+        moves.add_moves({
+            'growl': move_info(None),
+            'tackle': move_info(40),
+            'ember': move_info(40, 'fire'),
+            'headbutt': move_info(70),
+            'sonic-boom': move_info(None),
+            'take-down': move_info(90),
+            'hyper-beam': move_info(150),
+        })
+        move_names = ['growl', 'tackle', 'not-indexed', 'ember', 'sonic-boom', 'headbutt', 'take-down', 'hyper-beam']
+        self.assertEqual(list(moves.damaging_moves(move_names)), ['tackle', 'ember', 'headbutt', 'take-down'])
+        self.assertEqual(list(moves.damaging_moves(move_names, limit=2)), ['tackle', 'ember'])
+
+    def test_index_move(self):
+        self.assertIsNone(moves.find_move('tackle'))
+        self.assertEqual(moves.index_move('tackle', move_info(40)), move_info(40))
+        # A move indexed by another fetch first is kept
+        self.assertEqual(moves.index_move('tackle', move_info(50)), move_info(40))
+        self.assertEqual(moves.find_move('tackle'), move_info(40))
+        self.assertEqual(moves.missing_moves([('tackle', 'url1'), ('ember', 'url2')]), [('ember', 'url2')])
+
+class TestResolveMoves(unittest.TestCase):
+    def setUp(self):
+        moves._move_index.clear()
+        self.stub = StubPokeAPI(delay=0.05).start()
+        # 12 status moves before the 4 damaging ones, then moves that should never be needed
+        self.move_names = [f'status-{i}' for i in range(12)] + ['tackle', 'ember', 'headbutt', 'surf'] + [f'extra-{i}' for i in range(12)]
+        for name in self.move_names:
+            power = None if name.startswith('status') else 50
+            self.stub.add(f'/api/v2/move/{name}', move_fixture(name, power))
+        self.move_refs = [(name, self.stub.move_url(name)) for name in self.move_names]
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_resolve_moves_in_parallel(self):
+        start = time.perf_counter()
+        serial = moves.resolve_moves(self.move_refs, max_workers=1)
+        serial_time = time.perf_counter() - start
+
+        moves._move_index.clear()
+        start = time.perf_counter()
+        concurrent = moves.resolve_moves(self.move_refs, max_workers=8)
+        concurrent_time = time.perf_counter() - start
+
+        # Same moves in the same order, in a fraction of the time
+        self.assertEqual(list(serial), ['tackle', 'ember', 'headbutt', 'surf'])
+        self.assertEqual(list(concurrent), list(serial))
+        self.assertLess(concurrent_time, serial_time / 2)
+
+    def test_resolve_moves_cancels_remaining(self):
+        move_refs = self.move_refs[12:]
+        result = moves.resolve_moves(move_refs, max_workers=2)
+        self.assertEqual(list(result), ['tackle', 'ember', 'headbutt', 'surf'])
+        time.sleep(0.1)
+        # The extra moves still queued were cancelled once the four moves were found
+        self.assertLess(sum(self.stub.requests.values()), len(move_refs))
+
+if __name__ == "__main__":
+    unittest.main()
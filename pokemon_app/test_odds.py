@@ -0,0 +1,77 @@
+"""Unnitest for odds.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_simulate_odds: unittest for simulate_odds
+    test_simulate_odds_matches_battle: unittest comparing simulate_odds with battles fought one by one
+    test_simulate_odds_speed: unittest for the time taken by 100000 battles
+"""
+
+import time
+import unittest
+import numpy as np
+from odds import simulate_odds
+from pokemon import BATTLE_TURNS, Combatant, Species
+
+def move(power, type_name):
+    return {'damage_class': {'name': 'physical', 'url': ''}, 'type': {'name': type_name, 'url': ''}, 'power': power}
+
+def fight(species1, species2):
+    """Fights a battle with the same rules as the /battle route and returns the remaining hitpoints"""
+    pokemon1 = Combatant(species1)
+    pokemon2 = Combatant(species2, f'{species2.name}2')
+    attacker, defender = pokemon1.select_attacker_defender(pokemon2)
+    for turn in range(BATTLE_TURNS):
+        attacker.attack(defender)
+        if defender.current_hp <= 0:
+            break
+        attacker, defender = defender, attacker
+    return pokemon1.current_hp, pokemon2.current_hp
+
+class TestOdds(unittest.TestCase):
+    def setUp(self):
+        self.Pikachu = Species(
+            "pikachu", ["electric"],
+            {'hp': 35, 'attack': 55, 'defense': 40, 'speed': 90},
+            {'thunder-shock': move(40, 'electric'), 'quick-attack': move(40, 'normal')},
+        )
+        self.Squirtle = Species(
+            "squirtle", ["water"],
+            {'hp': 44, 'attack': 48, 'defense': 65, 'speed': 90},
+            {'tackle': move(40, 'normal'), 'water-gun': move(40, 'water')},
+        )
+        self.Onix = Species(
+            "onix", ["rock", "ground"],
+            {'hp': 35, 'attack': 45, 'defense': 160, 'speed': 70},
+            {'rock-throw': move(50, 'rock')},
+        )
+
+    def test_simulate_odds(self):
+        odds = simulate_odds(self.Pikachu, self.Squirtle, 1000, np.random.default_rng(1))
+        self.assertEqual(odds['n'], 1000)
+        self.assertAlmostEqual(odds['pokemon1_wins'] + odds['pokemon2_wins'] + odds['draws'], 1.0)
+        self.assertGreater(odds['damage_dealt']['pokemon1']['mean'], 0)
+
+        # Electric moves do no damage to Onix and it resists normal moves
+        odds = simulate_odds(self.Pikachu, self.Onix, 1000, np.random.default_rng(1))
+        self.assertEqual(odds['pokemon2_wins'], 1.0)
+
+    def test_simulate_odds_matches_battle(self):
+        battles = 4000
+        wins = draws = 0
+        for _ in range(battles):
+            hp1, hp2 = fight(self.Pikachu, self.Squirtle)
+            wins += hp1 > hp2
+            draws += hp1 == hp2
+
+        odds = simulate_odds(self.Pikachu, self.Squirtle, 100000, np.random.default_rng(2))
+        self.assertAlmostEqual(odds['pokemon1_wins'], wins / battles, delta=0.03)
+        self.assertAlmostEqual(odds['draws'], draws / battles, delta=0.03)
+
+    def test_simulate_odds_speed(self):
+        start = time.perf_counter()
+        simulate_odds(self.Pikachu, self.Squirtle, 100000)
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
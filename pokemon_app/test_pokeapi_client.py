@@ -0,0 +1,74 @@
+"""Unnitest for pokeapi_client.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_get_json: unittest for get_json with kept alive connections
+    test_revalidation: unittest for get_json revalidating cached responses
+    test_retry: unittest for get_json retrying transient errors
+    test_not_found: unittest for get_json with an unknown url
+    test_endpoint_name: unittest for endpoint_name
+"""
+
+import unittest
+import requests
+from pokeapi_client import PokeAPIClient, endpoint_name
+from stub_pokeapi import StubPokeAPI, move_fixture
+
+class TestPokeAPIClient(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubPokeAPI().start()
+        self.stub.add('/api/v2/move/tackle', move_fixture('tackle', 40))
+        self.stub.add('/api/v2/move/ember', move_fixture('ember', 40, 'fire'))
+        self.client = PokeAPIClient(backoff=0.01)
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_get_json(self):
+        self.assertEqual(self.client.get_json(self.stub.move_url('tackle'))['power'], 40)
+        self.assertEqual(self.client.get_json(self.stub.move_url('ember'))['type']['name'], 'fire')
+        # Both requests went through the same kept alive connection
+        self.assertEqual(len(self.stub.connections), 1)
+        stats = self.client.stats()['move']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_revalidation(self):
+        first = self.client.get_json(self.stub.move_url('tackle'))
+        bytes_transferred = self.client.stats()['move']['bytes']
+        second = self.client.get_json(self.stub.move_url('tackle'))
+        self.assertEqual(first, second)
+        stats = self.client.stats()['move']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['cache_hits'], 1)
+        # The unchanged data was not transferred again
+        self.assertEqual(stats['bytes'], bytes_transferred)
+
+        # Changed data is fetched again
+        self.stub.add('/api/v2/move/tackle', move_fixture('tackle', 50))
+        self.assertEqual(self.client.get_json(self.stub.move_url('tackle'))['power'], 50)
+        self.assertEqual(self.client.stats()['move']['cache_hits'], 1)
+
+    def test_retry(self):
+        self.stub.failures['/api/v2/move/tackle'] = 2
+        self.assertEqual(self.client.get_json(self.stub.move_url('tackle'))['power'], 40)
+        self.assertEqual(self.client.stats()['move']['retries'], 2)
+
+        self.stub.failures['/api/v2/move/tackle'] = 10
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.get_json(self.stub.move_url('tackle'))
+        self.assertEqual(self.client.stats()['move']['retries'], 5)
+
+    def test_not_found(self):
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.get_json(f'{self.stub.url}/pokemon/pikachuu')
+        # Errors other than transient ones are not retried
+        self.assertEqual(self.client.stats()['pokemon']['requests'], 1)
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name('https://pokeapi.co/api/v2/move/33/'), 'move')
+        self.assertEqual(endpoint_name('https://pokeapi.co/api/v2/pokemon/pikachu'), 'pokemon')
+        self.assertEqual(endpoint_name('https://pokeapi.co/api/v2/pokemon?limit=100000'), 'pokemon')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,30 +1,67 @@
 """Unnitest for pokemon.py
 
+Pokemon are loaded from a stub PokeAPI serving recorded responses
+
 Functions:
     setUp: unnitest method called before each test
+    tearDown: unnitest method called after each test
     test_fetch_data: unittest for fetch_data
+    test_fetch_data_timeout: unittest for fetch_data when PokeAPI does not answer in time
     test_parse_data: unittest for parse_data
     test_parse_moves: unittest for parse_moves
     test_select_attacker_defender: unittest for select_attacker_defender
     test_attack: unittest for attack
     test_get_damage_multiplier_by_type: unittest for get_damage_multiplier_by_type
     test_get_pokemon_info: unittest for get_pokemon_info
+    test_species_is_immutable: unittest for Species
+    test_combatants_share_species: unittest for Combatant
 """
 
+import pickle
 import unittest
-from pokemon import Pokemon
+from unittest import mock
+import config
+import moves
+from pokeapi_client import get_client
+from pokemon import Pokemon, Species, Combatant, connection_error
+from stub_pokeapi import StubPokeAPI
 
 class TestPokemon(unittest.TestCase):
     def setUp(self):
+        moves._move_index.clear()
+        self.stub = StubPokeAPI().start().load_recording()
+        self.patches = [
+            mock.patch.object(config, 'POKEAPI_URL', self.stub.url),
+            mock.patch('pokemon.get_species_cache', return_value=None),
+        ]
+        for patch in self.patches:
+            patch.start()
         self.Electrode = Pokemon("Electrode")
         self.Diglett = Pokemon("Diglett")
 
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        moves._move_index.clear()
+        self.stub.stop()
+
     def test_fetch_data(self):
         self.Electrode.fetch_data()
         self.assertEqual(len(self.Electrode.types), 1)
         self.assertEqual(len(self.Electrode.stats), 8)
         self.assertEqual(self.Electrode.current_hp, 0)
 
+    def test_fetch_data_timeout(self):
+        # A slow PokeAPI is reported as a connection error, like the async server does
+        self.stub.delay = 0.5
+        get_client.cache_clear()
+        try:
+            with mock.patch.object(config, 'HTTP_TIMEOUT', 0.1), mock.patch.object(config, 'HTTP_RETRIES', 0):
+                with self.assertRaises(connection_error):
+                    self.Electrode.fetch_data()
+        finally:
+            get_client.cache_clear()
+
     def test_parse_data(self):
         data = {
             'height': 12,
@@ -61,11 +98,13 @@ class TestPokemon(unittest.TestCase):
                 {"move": {"name": "hyper-beam", "url": "https://pokeapi.co/api/v2/move/63/"}},
                 {"move": {"name": "thunderbolt","url": "https://pokeapi.co/api/v2/move/85/"}},
                 {"move": {"name": "take-down","url": "https://pokeapi.co/api/v2/move/36/"}}]
+        for move in data:
+            move['move']['url'] = self.stub.stub_url(move['move']['url'])
         self.Electrode.parse_moves(data)
 
         expected_result = {'headbutt': {'damage_class': {'name': 'physical', 'url': 'https://pokeapi.co/api/v2/move-damage-class/2/'}, 'type': {'name': 'normal', 'url': 'https://pokeapi.co/api/v2/type/1/'}, 'power': 70},
                   'tackle': {'damage_class': {'name': 'physical', 'url': 'https://pokeapi.co/api/v2/move-damage-class/2/'}, 'type': {'name': 'normal', 'url': 'https://pokeapi.co/api/v2/type/1/'}, 'power': 40}, 
-                  'take-down': {'damage_class': {'name': 'physical', 'url': 'https://pokeapi.co/api/v2/move-damage-class/2/'}, 'type': {'name': 'normal', 'url': 'https://pokeapi.co/api/v2/type/1/'}, 'power': 90}, 
+                  'thunderbolt': {'damage_class': {'name': 'special', 'url': 'https://pokeapi.co/api/v2/move-damage-class/3/'}, 'type': {'name': 'electric', 'url': 'https://pokeapi.co/api/v2/type/13/'}, 'power': 90},
                   'hyper-beam': {'damage_class': {'name': 'special', 'url': 'https://pokeapi.co/api/v2/move-damage-class/3/'}, 'type': {'name': 'normal', 'url': 'https://pokeapi.co/api/v2/type/1/'}, 'power': 150}}
 
         self.assertEqual(self.Electrode.moves, expected_result)
@@ -110,6 +149,35 @@ class TestPokemon(unittest.TestCase):
         }
         self.assertEqual(self.Electrode.get_pokemon_info(), excpected_outcome)
 
+class TestCombatant(unittest.TestCase):
+    def setUp(self):
+        self.Electrode = Species(
+            "Electrode",
+            ["electric"],
+            {'Height': 1.2, 'Weight': 66.6, 'hp': 60, 'attack': 50, 'defense': 70, 'special-attack': 80, 'special-defense': 80, 'speed': 150},
+            {'headbutt': {'damage_class': {'name': 'physical', 'url': 'https://pokeapi.co/api/v2/move-damage-class/2/'}, 'type': {'name': 'normal', 'url': 'https://pokeapi.co/api/v2/type/1/'}, 'power': 70}},
+        )
+
+    def test_species_is_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.Electrode.name = "Diglett"
+        with self.assertRaises(TypeError):
+            self.Electrode.stats['hp'] = 1
+        self.assertEqual(pickle.loads(pickle.dumps(self.Electrode)).stats, self.Electrode.stats)
+
+    def test_combatants_share_species(self):
+        electrode1 = Combatant(self.Electrode)
+        electrode2 = Combatant(self.Electrode, "Electrode2")
+        self.assertIs(electrode1.species, electrode2.species)
+        self.assertEqual(electrode1.current_hp, 60)
+
+        electrode1.attack(electrode2)
+        # Only the combatant loses hitpoints, the species is untouched
+        self.assertLess(electrode2.current_hp, 60)
+        self.assertEqual(electrode1.current_hp, 60)
+        self.assertEqual(self.Electrode.stats['hp'], 60)
+        self.assertEqual(electrode2.get_pokemon_info()['name'], "Electrode2")
+
 if __name__ == "__main__":
     unittest.main()
     
\ No newline at end of file
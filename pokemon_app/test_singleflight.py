@@ -0,0 +1,101 @@
+"""Unnitest for singleflight.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_do: unittest for SingleFlight.do
+    test_concurrent_species_loads: unittest for concurrent get_species calls against a slow stub PokeAPI
+    test_concurrent_unknown_species: unittest for concurrent get_species calls sharing an error
+"""
+
+import threading
+import unittest
+from unittest import mock
+import config
+import moves
+from pokemon import get_species, http_error
+from singleflight import SingleFlight
+from species_names import negative_cache, reset_name_index
+from stub_pokeapi import StubPokeAPI, move_fixture
+
+CALLERS = 20
+
+def run_concurrently(function, *args):
+    """Calls function(*args) from CALLERS threads at the same time and returns their results or errors"""
+    barrier = threading.Barrier(CALLERS)
+    results = [None] * CALLERS
+
+    def call(index):
+        barrier.wait()
+        try:
+            results[index] = function(*args)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        moves._move_index.clear()
+        get_species.cache_clear()
+        negative_cache.clear()
+        reset_name_index()
+        self.stub = StubPokeAPI(delay=0.2).start()
+        self.stub.add_species(
+            'pikachu',
+            {'hp': 35, 'attack': 55, 'defense': 40, 'special-attack': 50, 'special-defense': 50, 'speed': 90},
+            [move_fixture('growl', None), move_fixture('thunder-shock', 40, 'electric'), move_fixture('quick-attack', 40)],
+            ('electric',),
+        )
+        self.patches = [
+            mock.patch.object(config, 'POKEAPI_URL', self.stub.url),
+            mock.patch('pokemon.get_species_cache', return_value=None),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        get_species.cache_clear()
+        negative_cache.clear()
+        reset_name_index()
+        self.stub.stop()
+
+    def test_do(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait()
+            return 'pikachu'
+
+        threading.Timer(0.2, release.set).start()
+        self.assertEqual(run_concurrently(flight.do, 'key', work), ['pikachu'] * CALLERS)
+        self.assertEqual(len(calls), 1)
+        # Once done the next call runs the work again
+        self.assertEqual(flight.do('key', work), 'pikachu')
+        self.assertEqual(len(calls), 2)
+
+    def test_concurrent_species_loads(self):
+        results = run_concurrently(get_species, 'pikachu')
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(list(results[0].moves), ['thunder-shock', 'quick-attack'])
+        # Exactly one upstream fetch of the pokemon and of each of its moves
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/pikachu'], 1)
+        for move in ('growl', 'thunder-shock', 'quick-attack'):
+            self.assertEqual(self.stub.requests[f'/api/v2/move/{move}'], 1)
+
+    def test_concurrent_unknown_species(self):
+        results = run_concurrently(get_species, 'pikachuu')
+        self.assertTrue(all(isinstance(result, http_error) for result in results))
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/pikachuu'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Unnitest for species_cache.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_put_get: unittest for put and get
+    test_ttl: unittest for expired entries
+    test_eviction: unittest for evicting the oldest entries
+    test_shared_between_processes: unittest for reading entries stored by another process
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from species_cache import SpeciesCache
+
+ELECTRODE = {
+    'types': ['electric'],
+    'stats': {'Height': 1.2, 'Weight': 66.6, 'hp': 60, 'attack': 50, 'defense': 70, 'special-attack': 80, 'special-defense': 80, 'speed': 150},
+    'moves': {'headbutt': {'damage_class': {'name': 'physical', 'url': ''}, 'type': {'name': 'normal', 'url': ''}, 'power': 70}},
+}
+
+def store_electrode(path):
+    SpeciesCache(path).put('electrode', ELECTRODE)
+
+class TestSpeciesCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'species.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_put_get(self):
+        cache = SpeciesCache(self.path)
+        self.assertIsNone(cache.get('Electrode'))
+        cache.put('Electrode', ELECTRODE)
+        self.assertEqual(cache.get('electrode'), ELECTRODE)
+        self.assertEqual(cache.get('ELECTRODE'), ELECTRODE)
+
+    def test_ttl(self):
+        cache = SpeciesCache(self.path, ttl=0.05)
+        cache.put('electrode', ELECTRODE)
+        self.assertEqual(cache.get('electrode'), ELECTRODE)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('electrode'))
+
+    def test_eviction(self):
+        cache = SpeciesCache(self.path, max_entries=2)
+        for name in ('electrode', 'diglett', 'pikachu'):
+            cache.put(name, ELECTRODE)
+            time.sleep(0.01)
+        self.assertIsNone(cache.get('electrode'))
+        self.assertEqual(cache.get('diglett'), ELECTRODE)
+        self.assertEqual(cache.get('pikachu'), ELECTRODE)
+
+    def test_shared_between_processes(self):
+        cache = SpeciesCache(self.path)
+        process = multiprocessing.Process(target=store_electrode, args=(self.path,))
+        process.start()
+        process.join()
+        self.assertEqual(cache.get('electrode'), ELECTRODE)
+
+if __name__ == "__main__":
+    unittest.main()
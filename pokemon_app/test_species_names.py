@@ -0,0 +1,126 @@
+"""Unnitest for species_names.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_suggest: unittest for NameIndex.suggest
+    test_edit_distance: unittest for edit_distance
+    test_negative_cache: unittest for NegativeCache expiry and eviction
+    test_reject_unknown_names: unittest for get_species rejecting unknown names without calling PokeAPI
+    test_numeric_ids: unittest for get_species leaving ids for PokeAPI to resolve
+    test_names_without_case: unittest for get_species sharing the species of every spelling of a name
+    test_negative_cache_without_index: unittest for get_species remembering names PokeAPI does not know
+"""
+
+import time
+import unittest
+from unittest import mock
+import config
+import moves
+from pokemon import get_species, species_not_found
+from species_names import NameIndex, NegativeCache, edit_distance, negative_cache, reset_name_index
+from stub_pokeapi import StubPokeAPI, move_fixture
+
+NAMES = ['pikachu', 'raichu', 'pichu', 'pidgey', 'pidgeotto', 'squirtle', 'bulbasaur']
+
+class TestSpeciesNames(unittest.TestCase):
+    def setUp(self):
+        moves._move_index.clear()
+        get_species.cache_clear()
+        negative_cache.clear()
+        reset_name_index()
+        self.stub = StubPokeAPI().start()
+        self.stub.add_species(
+            'pikachu',
+            {'hp': 35, 'attack': 55, 'defense': 40, 'special-attack': 50, 'special-defense': 50, 'speed': 90},
+            [move_fixture('thunder-shock', 40, 'electric')],
+            ('electric',),
+        )
+        self.patches = [
+            mock.patch.object(config, 'POKEAPI_URL', self.stub.url),
+            mock.patch('pokemon.get_species_cache', return_value=None),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        get_species.cache_clear()
+        negative_cache.clear()
+        reset_name_index()
+        self.stub.stop()
+
+    def test_suggest(self):
+        index = NameIndex(NAMES)
+        self.assertIn('Pikachu', index)
+        self.assertNotIn('pikachuu', index)
+        self.assertEqual(index.suggest('pikachuu'), ['pikachu'])
+        self.assertEqual(index.suggest('Picachu'), ['pikachu', 'pichu'])
+        self.assertEqual(index.suggest('pidg'), ['pidgey', 'pidgeotto'])
+        self.assertEqual(index.suggest('mewtwo'), [])
+        self.assertEqual(index.suggest('pikachu' * 100), [])
+        self.assertEqual(index.suggest('squirtle12'), ['squirtle'])
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance('pikachu', 'pikachu'), 0)
+        self.assertEqual(edit_distance('pikachu', 'pikachuu'), 1)
+        self.assertEqual(edit_distance('pikachu', 'pichu'), 2)
+        self.assertEqual(edit_distance('', 'pichu'), 5)
+
+    def test_negative_cache(self):
+        cache = NegativeCache(ttl=60, max_entries=2)
+        cache.add('Pikachuu', 'Pokemon Pikachuu was not found')
+        self.assertIn('pikachuu', cache)
+        self.assertEqual(cache.get('pikachuu'), 'Pokemon Pikachuu was not found')
+        cache.add('raichuu', '')
+        cache.add('pichuu', '')
+        self.assertNotIn('pikachuu', cache)
+
+        with mock.patch('species_names.time.monotonic', return_value=time.monotonic() + 120):
+            self.assertNotIn('pichuu', cache)
+
+    def test_reject_unknown_names(self):
+        self.stub.add('/api/v2/pokemon?limit=100000', {'results': [{'name': name, 'url': ''} for name in NAMES]})
+
+        with self.assertRaises(species_not_found) as error:
+            get_species('pikachuu')
+        self.assertIn('Did you mean pikachu?', str(error.exception))
+        # The message, suggestions included, is remembered with the name
+        with mock.patch('pokemon.not_found_message') as not_found_message, self.assertRaises(species_not_found) as cached:
+            get_species('pikachuu')
+        not_found_message.assert_not_called()
+        self.assertEqual(str(cached.exception), str(error.exception))
+        self.assertEqual(get_species('pikachu').name, 'pikachu')
+
+        # The names are fetched once and unknown names never reach PokeAPI
+        self.assertEqual(self.stub.requests['/api/v2/pokemon?limit=100000'], 1)
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/pikachuu'], 0)
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/pikachu'], 1)
+
+    def test_numeric_ids(self):
+        self.stub.add('/api/v2/pokemon?limit=100000', {'results': [{'name': name, 'url': ''} for name in NAMES]})
+        self.stub.add('/api/v2/pokemon/25', self.stub.fixtures['/api/v2/pokemon/pikachu'])
+
+        self.assertEqual(get_species('25').types, ('electric',))
+        with self.assertRaises(species_not_found):
+            get_species('100000')
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/25'], 1)
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/100000'], 1)
+
+    def test_names_without_case(self):
+        species = get_species('pikachu')
+        self.assertIs(get_species('Pikachu'), species)
+        self.assertIs(get_species('PIKACHU'), species)
+        self.assertEqual(species.name, 'pikachu')
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/pikachu'], 1)
+
+    def test_negative_cache_without_index(self):
+        # Without the list of names PokeAPI is asked once and its answer remembered
+        for _ in range(3):
+            with self.assertRaises(species_not_found):
+                get_species('pikachuu')
+        self.assertEqual(self.stub.requests['/api/v2/pokemon/pikachuu'], 1)
+        self.assertEqual(self.stub.requests['/api/v2/pokemon?limit=100000'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Unnitest for species_stats.py
+
+A SQLite file stands in for the mysql database
+
+Functions:
+    setUp: unnitest method called before each test
+    test_battle_outcome: unittest for battle_outcome with each kind of stored battle
+    test_backfill: unittest for backfill matching the incrementally updated table
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from battle_events import TurnEvent, encode_events
+from database import Database, record_battles
+from species_stats import backfill, battle_outcome
+
+DB_INIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_init.sql')
+
+LEGACY_LOG = [
+    "pikachu attacks squirtle with thunder-shock. It does 20 damage and squirtle has 24 hitpoints remaining",
+    "squirtle attacks pikachu with tackle. It does 9 damage and pikachu has 26 hitpoints remaining",
+]
+MIRROR_LOG = [
+    "pikachu attacks pikachu2 with thunder-shock. It does 5 damage and pikachu2 has 30 hitpoints remaining",
+]
+
+class TestSpeciesStats(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'battles.sqlite3')
+        conn = sqlite3.connect(path)
+        with open(DB_INIT) as file:
+            conn.executescript(file.read().replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT'))
+        conn.close()
+        self.database = Database(lambda: sqlite3.connect(path, check_same_thread=False), placeholder='?', dialect='sqlite')
+
+    def stats(self):
+        with self.database.connection() as conn:
+            return conn.execute("SELECT * FROM species_stats ORDER BY species").fetchall()
+
+    def test_battle_outcome(self):
+        self.assertEqual(
+            battle_outcome('pikachu is the winner by having the highest remaining hp after 6 turns', None, None, None, None, None, json.dumps(LEGACY_LOG)),
+            ('pikachu', 'squirtle', 1, 26, 24),
+        )
+        self.assertEqual(
+            battle_outcome('pikachu2 is the winner by having the highest remaining hp after 6 turns', None, None, None, None, None, json.dumps(MIRROR_LOG)),
+            ('pikachu', 'pikachu', -1, None, 30),
+        )
+        events = encode_events([TurnEvent(1, 0, 40, 1.0, -5)])
+        self.assertEqual(
+            battle_outcome('squirtle is the winner by having the highest remaining hp after 6 turns', 'pikachu', 'squirtle', events, None, None, None),
+            ('pikachu', 'squirtle', -1, -5, None),
+        )
+        self.assertIsNone(battle_outcome("It's a draw", None, None, None, None, None, '["not a sentence"]'))
+
+    def test_backfill(self):
+        rows = [
+            ('pikachu is the winner', 'pikachu', 'squirtle', 1, '1-0', b'\x01', 20, -3),
+            ("It's a draw", 'squirtle', 'squirtle', 2, '1-0', b'\x01', 4, 4),
+        ]
+        with self.database.connection() as conn:
+            record_battles(self.database, conn, rows)
+            conn.commit()
+        incremental = self.stats()
+
+        self.assertEqual(backfill(self.database, page_size=1), {'counted': 2, 'skipped': 0})
+        self.assertEqual(self.stats(), incremental)
+        self.assertEqual(incremental, [('pikachu', 1, 1, 0, 0, 20, 1), ('squirtle', 3, 0, 1, 2, 8, 3)])
+
+        # The oldest battles only have their log
+        with self.database.connection() as conn:
+            conn.execute(
+                "INSERT INTO battles (winner, battle_log) VALUES (?, ?)",
+                ['pikachu is the winner by having the highest remaining hp after 6 turns', json.dumps(LEGACY_LOG)],
+            )
+            conn.commit()
+        self.assertEqual(backfill(self.database), {'counted': 3, 'skipped': 0})
+        self.assertEqual(self.stats(), [('pikachu', 2, 2, 0, 0, 46, 2), ('squirtle', 4, 0, 2, 2, 32, 4)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Unnitest for tournament.py
+
+Functions:
+    setUp: unnitest method called before each test
+    test_matchup_shards: unittest for matchup_shards
+    test_run_tournament: unittest for run_tournament
+    test_process_pool: unittest for get_process_pool shared by the tournaments
+"""
+
+import unittest
+from unittest import mock
+from pokemon import Species
+from tournament import get_process_pool, matchup_shards, run_tournament
+
+def species(name, hp, attack, speed):
+    return Species(
+        name, ["normal"],
+        {'hp': hp, 'attack': attack, 'defense': 50, 'speed': speed},
+        {'tackle': {'damage_class': {'name': 'physical', 'url': ''}, 'type': {'name': 'normal', 'url': ''}, 'power': 40}},
+    )
+
+class TestTournament(unittest.TestCase):
+    def setUp(self):
+        self.roster = [
+            species("weedle", 40, 35, 50),
+            species("snorlax", 160, 110, 30),
+            species("rattata", 30, 56, 72),
+            species("pidgey", 40, 45, 56),
+        ]
+
+    def test_matchup_shards(self):
+        shards = matchup_shards(4, 4)
+        matchups = sorted(matchup for shard in shards for matchup in shard)
+        self.assertEqual(matchups, [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)])
+        # Empty shards are dropped
+        self.assertEqual(len(matchup_shards(3, 8)), 3)
+
+    def test_run_tournament(self):
+        result = run_tournament(self.roster, 200, workers=2, seed=7)
+        win_rates = result['win_rates']
+        self.assertEqual(result['roster'], ["weedle", "snorlax", "rattata", "pidgey"])
+        self.assertIsNone(win_rates[0][0])
+        for i in range(4):
+            for j in range(i + 1, 4):
+                self.assertLessEqual(win_rates[i][j] + win_rates[j][i], 1.0)
+        self.assertEqual(result['ranking'][0]['name'], "snorlax")
+        self.assertEqual(result['ranking'][0]['wins'] + result['ranking'][0]['losses'] + result['ranking'][0]['draws'], 600)
+
+        # The same seed and workers give the same results, in or out of process
+        self.assertEqual(run_tournament(self.roster, 200, workers=2, seed=7), result)
+        self.assertEqual(run_tournament(self.roster, 200, workers=1, seed=7)['ranking'][0]['name'], "snorlax")
+
+    def test_process_pool(self):
+        pool = get_process_pool(2)
+        self.assertIs(get_process_pool(2), pool)
+        with mock.patch('tournament.ProcessPoolExecutor') as executor:
+            run_tournament(self.roster, 10, workers=2, seed=1)
+            run_tournament(self.roster, 10, workers=2, seed=2)
+        executor.assert_not_called()
+
+        # Workers are spawned, not forked from the threaded server
+        with mock.patch('tournament.ProcessPoolExecutor') as executor:
+            get_process_pool.__wrapped__(3)
+        self.assertEqual(executor.call_args.kwargs['mp_context'].get_start_method(), 'spawn')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+"""Unnitest for type_chart.py
+
+Functions:
+    test_load_type_chart: unittest for load_type_chart
+    test_get_damage_multiplier: unittest for get_damage_multiplier
+"""
+
+import unittest
+from type_chart import TYPES, load_type_chart, get_damage_multiplier
+
+class TestTypeChart(unittest.TestCase):
+    def test_load_type_chart(self):
+        type_index, matrix = load_type_chart()
+        self.assertEqual(tuple(type_index), TYPES)
+        self.assertEqual(len(matrix), 18)
+        self.assertTrue(all(len(row) == 18 for row in matrix))
+
+    def test_get_damage_multiplier(self):
+        self.assertEqual(get_damage_multiplier('electric', ['water']), 2.0)
+        self.assertEqual(get_damage_multiplier('electric', ['ground']), 0.0)
+        self.assertEqual(get_damage_multiplier('fire', ['water', 'rock']), 0.25)
+        self.assertEqual(get_damage_multiplier('ice', ['dragon', 'flying']), 4.0)
+        self.assertEqual(get_damage_multiplier('normal', ['electric']), 1.0)
+        # Types missing from the chart do not change the damage
+        self.assertEqual(get_damage_multiplier('shadow', ['normal']), 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Unnitest for warmup.py
+
+Functions:
+    test_run: unittest for Warmup.run loading the warm set with bounded concurrency
+    test_warm_species_names: unittest for warm_species_names
+    test_ready: unittest for /ready
+    test_ready_on_start: unittest for the warm-up started by the first request of a worker
+"""
+
+import threading
+import time
+import unittest
+from unittest import mock
+import config
+from battle import app
+from pokemon import connection_error, species_not_found
+from warmup import Warmup, get_warmup, warm_species_names
+
+class TestWarmup(unittest.TestCase):
+    def test_run(self):
+        lock = threading.Lock()
+        running = [0]
+        most_running = [0]
+
+        def get_species(name):
+            with lock:
+                running[0] += 1
+                most_running[0] = max(most_running[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            if name == 'pikachuu':
+                raise species_not_found(f'Pokemon {name} was not found')
+            if name == 'mew':
+                raise connection_error('Could not connect to PokeAPI')
+
+        names = ['pikachu', 'squirtle', 'pikachuu', 'mew', 'eevee', 'onix']
+        warmup = Warmup(names, workers=2)
+        self.assertFalse(warmup.is_ready())
+        with mock.patch('warmup.get_species', get_species), mock.patch('warmup.get_name_index'):
+            self.assertTrue(warmup.start().wait(5))
+
+        self.assertEqual(most_running[0], 2)
+        self.assertEqual(warmup.status(), {'ready': True, 'type_chart': True, 'species': 6, 'loaded': 4, 'failed': ['mew']})
+
+    def test_warm_species_names(self):
+        with mock.patch.object(config, 'WARMUP_SPECIES', ' Pikachu, squirtle,'), \
+                mock.patch('warmup.popular_species', return_value=['squirtle', 'eevee']) as popular_species:
+            self.assertEqual(warm_species_names(), ['pikachu', 'squirtle', 'eevee'])
+            popular_species.assert_called_once_with(config.WARMUP_TOP_N)
+
+            # The explicit list is still warmed up without the database
+            popular_species.side_effect = ConnectionError
+            self.assertEqual(warm_species_names(), ['pikachu', 'squirtle'])
+
+    def test_ready(self):
+        client = app.test_client()
+        warmup = Warmup([])
+        with mock.patch('battle.get_warmup', return_value=warmup), mock.patch('warmup.get_name_index'), \
+                mock.patch.object(config, 'WARMUP_ON_START', False):
+            response = client.get('/ready')
+            self.assertEqual(response.status_code, 503)
+            self.assertFalse(response.get_json()['ready'])
+
+            warmup.run()
+            response = client.get('/ready')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.get_json()['ready'])
+
+    def test_ready_on_start(self):
+        # The application imported by a wsgi server warms up without running battle.py as a script
+        get_warmup.cache_clear()
+        self.addCleanup(get_warmup.cache_clear)
+        client = app.test_client()
+        with mock.patch.object(config, 'WARMUP_ON_START', True), mock.patch.object(config, 'WARMUP_SPECIES', 'pikachu'), \
+                mock.patch('warmup.popular_species', return_value=[]), mock.patch('warmup.get_name_index'), \
+                mock.patch('warmup.get_species') as get_species:
+            client.get('/ready')
+            self.assertTrue(get_warmup().wait(5))
+            response = client.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['loaded'], 1)
+        get_species.assert_called_once_with('pikachu')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Round robin tournament
+
+This module makes every pokemon of a roster fight every other one many times
+The species are resolved once, then the matchups are split in shards simulated by a pool of processes
+The pool is started by the first tournament and kept for the next ones, each shard carries only the species it needs
+Workers are spawned rather than forked, so they do not inherit the locks, threads and open connections of the web server
+Each matchup is simulated with odds.simulate_battles, so the battles follow the same rules as /battle
+
+Functions:
+    get_process_pool: returns the shared pool of worker processes
+    run_tournament: runs a round robin tournament between species
+    matchup_shards: splits the matchups of a roster in shards
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import numpy as np
+from odds import simulate_battles
+
+def _play_shard(matchups, species, repetitions, seed):
+    """Simulates a shard of matchups in a worker process
+
+    Args:
+        matchups (list<tuple>): list with the (i, j) roster indexes of each matchup
+        species (dict): dict with the roster indexes of the matchups as keys and their species as values
+        repetitions (int): number of battles of each matchup
+        seed (numpy.random.SeedSequence): seed of the random generator of the shard
+
+    Returns:
+        list<tuple>: list with the (i, j, wins of i, wins of j) of each matchup
+    """
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for i, j in matchups:
+        hp1, hp2, _, _ = simulate_battles(species[i], species[j], repetitions, rng)
+        results.append((i, j, int(np.count_nonzero(hp1 > hp2)), int(np.count_nonzero(hp2 > hp1))))
+    return results
+
+def matchup_shards(roster_size, shards):
+    """Splits the matchups of a roster in shards
+
+    Each pair of pokemon fights once per repetition, the matchups are dealt in turn to each shard
+
+    Args:
+        roster_size (int): number of pokemon in the roster
+        shards (int): number of shards
+
+    Returns:
+        list<list<tuple>>: list with the (i, j) roster indexes of the matchups of each shard
+    """
+
+    matchups = [(i, j) for i in range(roster_size) for j in range(i + 1, roster_size)]
+    return [matchups[shard::shards] for shard in range(shards) if matchups[shard::shards]]
+
+@lru_cache(maxsize=None)
+def get_process_pool(workers):
+    """Returns the shared pool of worker processes, started the first time it is asked for
+
+    The workers are started with spawn, a fork of the threaded web server could copy a lock held by another thread
+
+    Args:
+        workers (int): number of worker processes
+
+    Returns:
+        ProcessPoolExecutor: the pool
+    """
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def run_tournament(roster, repetitions, workers=None, seed=None):
+    """Runs a round robin tournament between species
+
+    Args:
+        roster (list<Species>): the species taking part in the tournament
+        repetitions (int): number of battles of each matchup
+        workers (int): number of worker processes, defaults to the number of cores. 1 runs in this process
+        seed (int): seed of the random generators, random if None. Results repeat for the same seed and number of workers
+
+    Returns:
+        dict: dict with the win rate matrix, where win_rates[i][j] is the rate at which roster[i] beats roster[j],
+        and the ranking of the species by overall win rate
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    size = len(roster)
+    # Several shards per worker keep every worker busy until the end
+    shards = matchup_shards(size, workers * 4)
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+
+    shard_species = [{index: roster[index] for matchup in shard for index in matchup} for shard in shards]
+    if workers == 1:
+        results = list(map(_play_shard, shards, shard_species, [repetitions] * len(shards), seeds))
+    else:
+        try:
+            results = list(get_process_pool(workers).map(_play_shard, shards, shard_species, [repetitions] * len(shards), seeds))
+        except BrokenProcessPool:
+            # A worker died, the next tournament starts a new pool
+            get_process_pool.cache_clear()
+            raise
+
+    wins = np.zeros((size, size), dtype=np.int64)
+    for shard_results in results:
+        for i, j, wins_i, wins_j in shard_results:
+            wins[i, j] = wins_i
+            wins[j, i] = wins_j
+
+    battles = repetitions * (size - 1)
+    total_wins = wins.sum(axis=1)
+    total_losses = wins.sum(axis=0)
+    ranking = [
+        {
+            "name": roster[i].name,
+            "win_rate": float(total_wins[i] / battles) if battles else 0.0,
+            "wins": int(total_wins[i]),
+            "losses": int(total_losses[i]),
+            "draws": int(battles - total_wins[i] - total_losses[i]),
+        }
+        for i in sorted(range(size), key=lambda i: total_wins[i], reverse=True)
+    ]
+
+    win_rates = [
+        [None if i == j else float(wins[i, j] / repetitions) for j in range(size)]
+        for i in range(size)
+    ]
+    return {
+        "roster": [species.name for species in roster],
+        "repetitions": repetitions,
+        "win_rates": win_rates,
+        "ranking": ranking,
+    }
@@ -0,0 +1,155 @@
+"""Type effectiveness chart
+
+This module holds the damage multipliers of every attacking type against every defending type
+The 18x18 matrix is loaded once from the bundled type_chart.json file and kept in memory,
+so calculating a multiplier never makes an API call
+The bundled file can be regenerated from PokeAPI by running this module
+
+When a data pack is configured its type chart is used instead of the bundled file
+
+Functions:
+    get_type_chart: returns the type chart in use
+    load_type_chart: loads the type chart from a json file
+    get_damage_multiplier: calculates the damage multiplier of a move type against defender types
+    type_chart_version: returns a short hash of the type chart in use
+    fetch_type_chart: builds the type chart from PokeAPI
+    save_type_chart: writes a type chart to a json file
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+import config
+from datapack import get_data_pack
+from pokeapi_client import get_json
+from singleflight import SingleFlight
+from metrics import CACHE_LOOKUPS
+
+TYPE_CHART_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'type_chart.json')
+# Move types found in the chart or missing from it
+_type_hits = CACHE_LOOKUPS.labels('types', 'hit')
+_type_misses = CACHE_LOOKUPS.labels('types', 'miss')
+
+# Types in the same order as their ids in PokeAPI
+TYPES = (
+    'normal', 'fighting', 'flying', 'poison', 'ground', 'rock',
+    'bug', 'ghost', 'steel', 'fire', 'water', 'grass',
+    'electric', 'psychic', 'ice', 'dragon', 'dark', 'fairy',
+)
+
+_type_chart_flight = SingleFlight()
+
+@lru_cache(maxsize=None)
+def load_type_chart(path=TYPE_CHART_PATH):
+    """Loads the type chart from a json file
+
+    Args:
+        path (str): path of the json file with the type chart
+
+    Returns:
+        tuple: A tuple with a dict mapping each type name to its index and the matrix as a tuple of rows
+    """
+
+    # Concurrent first lookups wait for a single read of the file
+    return _type_chart_flight.do(path, _read_type_chart, path)
+
+def _read_type_chart(path):
+    """Reads the type chart from a json file"""
+
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+
+    type_index = {type_name: index for index, type_name in enumerate(data['types'])}
+    matrix = tuple(tuple(row) for row in data['matrix'])
+    return type_index, matrix
+
+def get_type_chart():
+    """Returns the type chart of the configured data pack, or the bundled type chart if there is none
+
+    Returns:
+        tuple: A tuple with a dict mapping each type name to its index and the matrix as a tuple of rows
+    """
+
+    data_pack = get_data_pack()
+    if data_pack is not None:
+        return data_pack.type_chart()
+    return load_type_chart()
+
+def get_damage_multiplier(move_type, defender_types):
+    """Calculates the damage multiplier of a move type against the types of the defending pokemon
+
+    Types missing from the chart (e.g. shadow or unknown) do not affect the damage
+
+    Args:
+        move_type (str): name of the move type
+        defender_types (list<str>): names of the defending pokemon types
+
+    Returns:
+        float: damage multiplier
+    """
+
+    type_index, matrix = get_type_chart()
+    attacking = type_index.get(move_type)
+    if attacking is None:
+        _type_misses.inc()
+        return 1.0
+    _type_hits.inc()
+
+    row = matrix[attacking]
+    type_advantage = 1.0
+    for defender_type in defender_types:
+        defending = type_index.get(defender_type)
+        if defending is not None:
+            type_advantage *= row[defending]
+    return type_advantage
+
+def type_chart_version():
+    """Returns a short hash of the type chart in use, it changes whenever a multiplier changes
+
+    Returns:
+        str: 12 hex digits
+    """
+
+    type_index, matrix = get_type_chart()
+    return _chart_version(tuple(sorted(type_index.items(), key=lambda item: item[1])), matrix)
+
+@lru_cache(maxsize=4)
+def _chart_version(types, matrix):
+    return hashlib.sha1(json.dumps([types, matrix]).encode()).hexdigest()[:12]
+
+def fetch_type_chart():
+    """Builds the type chart from the damage relations of every type in PokeAPI
+
+    Returns:
+        dict: dict with the type names and the matrix of damage multipliers
+    """
+
+    type_index = {type_name: index for index, type_name in enumerate(TYPES)}
+    matrix = [[1.0] * len(TYPES) for _ in TYPES]
+
+    for type_name in TYPES:
+        relations = get_json(f"{config.POKEAPI_URL}/type/{type_name}")['damage_relations']
+
+        row = matrix[type_index[type_name]]
+        for relation, multiplier in (('double_damage_to', 2.0), ('half_damage_to', 0.5), ('no_damage_to', 0.0)):
+            for defender_type in relations[relation]:
+                if defender_type['name'] in type_index:
+                    row[type_index[defender_type['name']]] = multiplier
+
+    return {'types': list(TYPES), 'matrix': matrix}
+
+def save_type_chart(chart, path=TYPE_CHART_PATH):
+    """Writes a type chart to a json file, one matrix row per line
+
+    Args:
+        chart (dict): dict with the type names and the matrix of damage multipliers
+        path (str): path of the json file
+    """
+
+    rows = ',\n'.join(f"        {json.dumps(row)}" for row in chart['matrix'])
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f'{{\n    "types": {json.dumps(chart["types"])},\n    "matrix": [\n{rows}\n    ]\n}}\n')
+
+if __name__ == "__main__":
+    save_type_chart(fetch_type_chart())
@@ -0,0 +1,198 @@
+"""Startup warm-up
+
+This module preloads the type chart, the pokemon names and a set of pokemon in the background when the application starts,
+so the first battles after a deploy do not pay for fetching them
+The warm set is the WARMUP_SPECIES list followed by the WARMUP_TOP_N pokemon that fought the most battles,
+it is loaded by at most WARMUP_WORKERS threads so PokeAPI and the database are not flooded
+
+Classes:
+    Warmup: The warm-up of the caches of a worker
+
+Functions:
+    get_warmup: returns the warm-up of this worker
+    popular_species: returns the pokemon that fought the most battles
+    warm_species_names: returns the names of the warm set
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import config
+from database import get_database
+from pokemon import get_species, species_not_found
+from species_names import get_name_index
+from type_chart import get_type_chart
+
+logger = logging.getLogger(__name__)
+
+class Warmup:
+    """The warm-up of the caches of a worker
+
+    The worker is ready once the type chart is loaded and every pokemon of the warm set was loaded or failed to load,
+    pokemon that failed are loaded again by the first battle asking for them
+
+    Atribues:
+        names(list<str>): names of the warm set, None until they are read
+        loaded(int): number of pokemon loaded
+        failed(list<str>): names of the pokemon that could not be loaded
+        type_chart_loaded(bool): whether the type chart is loaded
+
+    Functions:
+        start() -> Warmup
+        run()
+        is_ready() -> bool
+        status() -> dict
+        wait(float) -> bool
+    """
+
+    def __init__(self, names=None, workers=None, load=None):
+        """
+        Args:
+            names (list<str>): names of the warm set, read by warm_species_names when None
+            workers (int): maximum number of pokemon loaded at once, defaults to WARMUP_WORKERS
+            load (callable): loads the species of a name into the cache being warmed up, defaults to get_species
+        """
+        self.names = names
+        self.workers = max(1, workers or config.WARMUP_WORKERS)
+        self.load = load
+        self.loaded = 0
+        self.failed = []
+        self.type_chart_loaded = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Runs the warm-up in a background thread, only the first call starts it
+
+        Returns:
+            Warmup: the warm-up itself
+        """
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='cache-warmup', daemon=True)
+                self._thread.start()
+        return self
+
+    def run(self):
+        """Loads the type chart, the pokemon names and the warm set"""
+
+        try:
+            get_type_chart()
+            self.type_chart_loaded = True
+            # The name index is loaded once here instead of by the first pokemon of the warm set
+            get_name_index()
+            if self.names is None:
+                self.names = warm_species_names()
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for name, error in zip(self.names, executor.map(self._load, self.names)):
+                    if error is not None:
+                        logger.warning("Could not warm up %s: %s", name, error)
+        except Exception:
+            logger.exception("The cache warm-up failed")
+        finally:
+            self._done.set()
+
+    def _load(self, name):
+        """Loads a pokemon of the warm set
+
+        Returns:
+            Exception: the error loading it or None
+        """
+
+        try:
+            (self.load or get_species)(name)
+        except species_not_found as e:
+            # A misspelled name in the warm set does not keep the worker cold
+            error = e
+        except Exception as e:
+            error = e
+            with self._lock:
+                self.failed.append(name)
+        else:
+            error = None
+            with self._lock:
+                self.loaded += 1
+        return error
+
+    def is_ready(self):
+        """Returns whether the type chart is loaded and the warm set was loaded"""
+        return self.type_chart_loaded and self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits for the warm-up to finish
+
+        Args:
+            timeout (float): maximum seconds to wait, None waits until it finishes
+
+        Returns:
+            bool: whether the worker is ready
+        """
+
+        self._done.wait(timeout)
+        return self.is_ready()
+
+    def status(self):
+        """Returns the progress of the warm-up
+
+        Returns:
+            dict: dict with the readiness, whether the type chart is loaded, the size of the warm set,
+                the number of pokemon loaded and the names of those that failed
+        """
+
+        with self._lock:
+            return {
+                'ready': self.is_ready(),
+                'type_chart': self.type_chart_loaded,
+                'species': len(self.names) if self.names is not None else None,
+                'loaded': self.loaded,
+                'failed': list(self.failed),
+            }
+
+@lru_cache(maxsize=1)
+def get_warmup():
+    """Returns the warm-up of this worker, it is not started until start is called
+
+    Returns:
+        Warmup: the warm-up
+    """
+
+    return Warmup()
+
+def popular_species(limit):
+    """Returns the pokemon that fought the most battles
+
+    Args:
+        limit (int): maximum number of pokemon
+
+    Returns:
+        list<str>: names of the pokemon, the most popular first
+    """
+
+    if limit <= 0:
+        return []
+    database = get_database()
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT species FROM species_stats ORDER BY battles DESC, species LIMIT {int(limit)}")
+        rows = cursor.fetchall()
+        cursor.close()
+    return [row[0] for row in rows]
+
+def warm_species_names():
+    """Returns the names of the warm set, WARMUP_SPECIES followed by the WARMUP_TOP_N most popular pokemon
+
+    The popular pokemon are skipped if the database can not be reached
+
+    Returns:
+        list<str>: names of the warm set, without duplicates
+    """
+
+    names = [name.strip().lower() for name in config.WARMUP_SPECIES.split(',') if name.strip()]
+    try:
+        names.extend(popular_species(config.WARMUP_TOP_N))
+    except Exception:
+        logger.exception("Could not read the most popular pokemon")
+    return list(dict.fromkeys(names))